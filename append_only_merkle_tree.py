@@ -1,58 +1,149 @@
-from zero_merkle_tree import ZeroMerkleTree
+import verification
+from zero_merkle_tree import NodeStore, ZeroMerkleTree
 
 
 class AppendOnlyMerkleTree(ZeroMerkleTree):
-    def __init__(self, height: int):
-        super().__init__(height)
-        # create a dummy proof of all zero hashes for initialization
+    __slots__ = ("_last_proof", "last_path")
+
+    def __init__(
+        self,
+        height: int,
+        binary: bool = False,
+        hash_backend=None,
+        node_store: NodeStore = None,
+    ):
+        """
+        Args:
+        - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        - node_store (NodeStore): The store of the tree's nodes, e.g. a `SqliteNodeStore`.
+          Appends write their merkle paths to it, and a tree opened on a non-empty store resumes after its last non-empty leaf.
+        """
+        super().__init__(height, binary, hash_backend, node_store)
+        # the proof of the last appended leaf, None until the first append, see `last_proof`
+        self._last_proof = None
+        # the merkle path of the last appended leaf, from the leaf up to the root.
+        # Together with the last proof's siblings, it is the frontier of the tree:
+        # every non-zero node a new leaf's siblings can be. The dummy path is never read.
+        self.last_path = self.node_store.zero_hashes
+        if self.node_store.get(0, 0) != self.node_store.zero_hashes[height]:
+            self._restore_frontier()
+
+    def _restore_frontier(self):
+        """
+        Restore the frontier of a tree opened on a non-empty node store, from the path of its last non-empty leaf.
+
+        The last leaf is found by walking down from the root, into the right child whenever it isn't empty.
+        Empty leaves appended after the last non-empty leaf don't change any node, so they can't be restored.
+        """
+        height = self.height
+        zero_hashes = self.node_store.zero_hashes
+        index = 0
+        for level in range(1, height + 1):
+            index = 2 * index + 1
+            if self.node(level, index) == zero_hashes[height - level]:
+                index -= 1
+        self.last_path = [
+            self.node(height - level, index >> level) for level in range(height + 1)
+        ]
         self.last_proof = {
-            "root": self.node_store.zero_hashes[self.height],
-            "siblings": self.node_store.zero_hashes[: self.height],
-            "index": -1,
-            "value": self.node_store.zero_hashes[self.height],
+            "root": self.last_path[-1],
+            "siblings": [
+                self.node(height - level, (index >> level) ^ 1)
+                for level in range(height)
+            ],
+            "index": index,
+            "value": self.last_path[0],
         }
 
-    def append_leaf(self, leaf_value: str) -> dict:
-        old_merkle_path = self.compute_merkle_path_from_proof(
-            self.last_proof["siblings"],
-            self.last_proof["index"],
-            self.last_proof["value"],
-        )
-        old_root = self.last_proof["root"]
-        # Old value will aways be empty since it's an append only tree
-        old_value = 0
-        prev_index = self.last_proof["index"]
-        #  append only tree new index is always the previous index + 1
-        new_index = prev_index + 1
+    @property
+    def last_proof(self) -> dict:
+        """
+        The merkle proof of the last appended leaf, or a dummy proof of all zero hashes at index -1 before the first append.
+        """
+        if self._last_proof is None:
+            zero_hashes = self.node_store.zero_hashes
+            self._last_proof = {
+                "root": zero_hashes[self.height],
+                "siblings": zero_hashes[: self.height],
+                "index": -1,
+                "value": zero_hashes[self.height],
+            }
+        return self._last_proof
+
+    @last_proof.setter
+    def last_proof(self, proof: dict):
+        self._last_proof = proof
+
+    def _next_leaf_siblings(self) -> list:
+        """
+        Compute the siblings of the next leaf to append, from the frontier left by the last append.
+
+        Returns:
+        - list: The siblings of the next leaf's merkle path, from the leaf level up.
+        """
+        old_merkle_path = self.last_path
         # keep track of the old siblings so we can use them for our delta merkle proof
         old_siblings = self.last_proof["siblings"]
+        zero_hashes = self.node_store.zero_hashes
         siblings = []
-        multiplier = 1
+        # the indexes of the previous and the new leaf's merkle path nodes on the current level
+        prev_level_index = self.last_proof["index"]
+        #  append only tree new index is always the previous index + 1
+        new_level_index = prev_level_index + 1
 
         for level in range(self.height):
-            # get the index of the previous leaf's merkle path node on the current level
-            prev_level_index = prev_index // multiplier
-            # get the index of the new leaf's merkle path node on the current level
-            new_level_index = new_index // multiplier
-
             if new_level_index == prev_level_index:
                 # if the merkle path node index on this level DID NOT change, we can reuse the old sibling
                 siblings.append(old_siblings[level])
+            elif new_level_index % 2 == 0:
+                # if the new merkle path node index is even, the new merkle path node is a left hand node,
+                # so merkle path node's sibling is a right hand node,
+                # therefore our sibling has an index greater than our merkle path node,
+                # so the sibling must be a zero hash
+                siblings.append(zero_hashes[level])
             else:
-                # if the merkle path node index on this level DID change, we need to check if the new merkle path node index is a left or right hand node
-                if new_level_index % 2 == 0:
-                    # if the new merkle path node index is even, the new merkle path node is a left hand node,
-                    # so merkle path node's sibling is a right hand node,
-                    # therefore our sibling has an index greater than our merkle path node,
-                    # so the sibling must be a zero hash
-                    siblings.append(self.node_store.zero_hashes[level])
-                else:
-                    # if the new merkle path node is odd, then its sibling has an index one less than it, so its sibling must be the previous merkle path node on this level
-                    siblings.append(old_merkle_path[level])
-
-            multiplier *= 2
-
-        new_root = self.compute_merkle_root_from_proof(siblings, new_index, leaf_value)
+                # if the new merkle path node is odd, then its sibling has an index one less than it, so its sibling must be the previous merkle path node on this level
+                siblings.append(old_merkle_path[level])
+
+            prev_level_index //= 2
+            new_level_index //= 2
+
+        return siblings
+
+    def append_leaf(self, leaf_value: str) -> dict:
+        """
+        Append a leaf to the tree.
+
+        The siblings of the new leaf are derived from the frontier left by the previous append,
+        and the new merkle path is computed on the way to the new root, so an append costs `height` hashes.
+
+        Args:
+        - leaf_value (str): The value of the new leaf.
+
+        Returns:
+        - Delta merkle proof
+        """
+        new_index = self.last_proof["index"] + 1
+        if new_index >= 2**self.height:
+            raise ValueError(
+                f"The tree of height {self.height} is full, it has {new_index} leaves"
+            )
+        leaf_value = self.encode_leaf(leaf_value)
+        old_root = self.last_proof["root"]
+        # Old value will aways be empty since it's an append only tree
+        old_value = self.node_store.zero_hashes[0]
+        siblings = self._next_leaf_siblings()
+        merkle_path = self.compute_merkle_path_from_proof(
+            siblings, new_index, leaf_value
+        )
+
+        new_root = merkle_path[-1]
+        for level, node in enumerate(merkle_path):
+            self.node_store.set(self.height - level, new_index >> level, node)
+        self.node_store.commit()
+        self.last_path = merkle_path
         self.last_proof = {
             "root": new_root,
             "siblings": siblings,
@@ -67,3 +158,158 @@ class AppendOnlyMerkleTree(ZeroMerkleTree):
             "newRoot": new_root,
             "newValue": leaf_value,
         }
+
+    def update_leaf(self, index: int, value):
+        raise TypeError(
+            "The leaves of an append only tree can't be updated, use append_leaf"
+        )
+
+    def update_leaves(self, leaves: dict, return_proofs: bool = False):
+        raise TypeError(
+            "The leaves of an append only tree can't be updated, use append_batch"
+        )
+
+    def append_leaves(self, leaf_values):
+        """
+        Append leaves to the tree, lazily yielding the delta merkle proof of every append.
+
+        Leaves are consumed from the iterable one at a time, so it can be a stream of any length.
+
+        Args:
+        - leaf_values (iterable): The values of the new leaves.
+
+        Yields:
+        - The delta merkle proof of each appended leaf, exactly as `append_leaf` returns it.
+        """
+        for leaf_value in leaf_values:
+            yield self.append_leaf(leaf_value)
+
+    def append_batch(self, leaf_values) -> dict:
+        """
+        Append a contiguous batch of leaves to the tree, and prove the whole batch with a single proof.
+
+        The proof carries the siblings of the batch's first leaf, which are the frontier of the old tree,
+        so its size is `height` plus the number of leaves.
+        The new root is computed level by level over the batch, hashing each new node once.
+
+        Args:
+        - leaf_values (iterable): The values of the new leaves.
+
+        Returns:
+        - dict: The batch append proof, containing the start index, siblings, old root, new root and new values.
+        """
+        new_values = [self.encode_leaf(leaf_value) for leaf_value in leaf_values]
+        if not new_values:
+            raise ValueError("A batch must contain at least one leaf")
+
+        start_index = self.last_proof["index"] + 1
+        end_index = start_index + len(new_values) - 1
+        if end_index >= 2**self.height:
+            raise ValueError(
+                f"A batch of {len(new_values)} leaves starting at {start_index} "
+                f"doesn't fit in a tree of height {self.height}"
+            )
+        siblings = self._next_leaf_siblings()
+        new_root, last_siblings, last_path = self._compute_batch_append(
+            start_index, siblings, new_values, self.node_store
+        )
+        self.node_store.commit()
+
+        old_root = self.last_proof["root"]
+        self.last_path = last_path
+        self.last_proof = {
+            "root": new_root,
+            "siblings": last_siblings,
+            "index": end_index,
+            "value": new_values[-1],
+        }
+        return {
+            "startIndex": start_index,
+            "siblings": siblings,
+            "oldRoot": old_root,
+            "newRoot": new_root,
+            "newValues": new_values,
+        }
+
+    def _compute_batch_append(
+        self, start_index: int, siblings: list, new_values: list, node_store=None
+    ):
+        """
+        Compute the root of the tree after appending a batch, level by level.
+
+        On every level the nodes of the batch are contiguous. If the first one is a right hand node,
+        its left hand sibling is the frontier node from `siblings`, and if the last one is a left hand node,
+        its right hand sibling is a zero hash, since nothing was appended after it.
+
+        Args:
+        - start_index (int): The index of the first new leaf.
+        - siblings (list): The siblings of the first new leaf, from the leaf level up.
+        - new_values (list): The new leaves.
+        - node_store (NodeStore): If set, the new nodes of every level are written to it.
+
+        Returns:
+        - tuple: The new root, and the siblings and merkle path of the last new leaf.
+        """
+        zero_hashes = self.node_store.zero_hashes
+        end_index = start_index + len(new_values) - 1
+        nodes = list(new_values)
+        last_siblings = []
+        last_path = [new_values[-1]]
+
+        for level in range(self.height):
+            first_index = start_index >> level
+            if first_index % 2 == 1:
+                nodes.insert(0, siblings[level])
+                first_index -= 1
+            last_index = end_index >> level
+            if last_index % 2 == 0:
+                nodes.append(zero_hashes[level])
+            last_siblings.append(nodes[(last_index ^ 1) - first_index])
+            if node_store is not None:
+                node_store.set_many(
+                    self.height - level,
+                    {first_index + offset: node for offset, node in enumerate(nodes)},
+                )
+
+            nodes = self.hasher.hash_many(zip(nodes[0::2], nodes[1::2]))
+            last_path.append(nodes[(last_index >> 1) - (first_index >> 1)])
+
+        if node_store is not None:
+            node_store.set(0, 0, nodes[0])
+        return nodes[0], last_siblings, last_path
+
+    def verify_batch_append_proof(self, batch_append_proof: dict) -> bool:
+        """
+        Verify a batch append proof.
+
+        The old root is computed from an empty leaf at the start index and the siblings,
+        and the new root from the new leaves and the same siblings, which costs O(height + number of new leaves) hashes.
+        Siblings to the right of the start index must be zero hashes, since an append only tree
+        has no leaves after its last appended leaf.
+
+        Args:
+        - batch_append_proof (dict): The batch append proof.
+
+        Returns:
+        - bool: True if the old tree is extended into the new tree by appending the new values, False otherwise.
+        """
+        start_index = batch_append_proof["startIndex"]
+        siblings = batch_append_proof["siblings"]
+        new_values = batch_append_proof["newValues"]
+        zero_hashes = self.node_store.zero_hashes
+        if start_index < 0 or len(siblings) != self.height or not new_values:
+            return False
+        if start_index + len(new_values) > 2**self.height:
+            return False
+        for level, sibling in enumerate(siblings):
+            if (start_index >> level) % 2 == 0 and sibling != zero_hashes[level]:
+                return False
+
+        old_root = verification.compute_merkle_root_from_proof(
+            self.hasher, siblings, start_index, zero_hashes[0]
+        )
+        new_root, _, _ = self._compute_batch_append(start_index, siblings, new_values)
+        return (
+            old_root == batch_append_proof["oldRoot"]
+            and new_root == batch_append_proof["newRoot"]
+        )
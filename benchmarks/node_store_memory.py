@@ -0,0 +1,43 @@
+"""
+Report the bytes used per stored node by the in-memory NodeStore and the CompactNodeStore.
+
+Usage: python -m benchmarks.node_store_memory [--height 32] [--leaves 20000]
+"""
+
+import argparse
+import random
+
+from compact_node_store import CompactNodeStore, memory_report
+from hashing import NODE_SIZE
+from zero_merkle_tree import ZeroMerkleTree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--height", type=int, default=32)
+    parser.add_argument("--leaves", type=int, default=20_000)
+    args = parser.parse_args()
+
+    leaves = {
+        index: index.to_bytes(NODE_SIZE, "big")
+        for index in random.Random(0).sample(range(2**args.height), args.leaves)
+    }
+    dict_tree = ZeroMerkleTree(args.height, binary=True)
+    compact_tree = ZeroMerkleTree(args.height, node_store=CompactNodeStore(args.height))
+    dict_tree.set_leaves(leaves)
+    compact_tree.set_leaves(leaves)
+    assert dict_tree.root() == compact_tree.root()
+
+    print(f"height {args.height}, {args.leaves} random leaves")
+    report = memory_report(
+        {"NodeStore": dict_tree.node_store, "CompactNodeStore": compact_tree.node_store}
+    )
+    for name, stats in report.items():
+        print(
+            f"{name:>16}: {stats['nodes']} nodes, {stats['bytes']} bytes, "
+            f"{stats['bytes_per_node']:.1f} bytes/node"
+        )
+
+
+if __name__ == "__main__":
+    main()
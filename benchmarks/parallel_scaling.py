@@ -0,0 +1,89 @@
+"""
+Benchmark the scaling of the parallel code paths across 1..N worker processes.
+
+Usage: python -m benchmarks.parallel_scaling [--height 18] [--max-processes N]
+
+Every parallel result is checked to be identical to the serial one.
+"""
+
+import argparse
+import os
+import random
+import time
+
+import parallel
+from merkle_tree import MerkleTree
+from zero_merkle_tree import ZeroMerkleTree
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--height", type=int, default=18)
+    parser.add_argument("--sparse-height", type=int, default=32)
+    parser.add_argument("--sparse-leaves", type=int, default=20_000)
+    parser.add_argument("--proofs", type=int, default=20_000)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    leaves = list(range(2**args.height))
+    sparse_leaves = {
+        index: index
+        for index in random.Random(0).sample(
+            range(2**args.sparse_height), args.sparse_leaves
+        )
+    }
+    proof_indices = random.Random(1).choices(range(len(leaves)), k=args.proofs)
+
+    serial_time, serial_tree = timed(
+        lambda: MerkleTree(args.height, leaves, binary=True)
+    )
+    serial_load_time, _ = timed(
+        lambda: ZeroMerkleTree(args.sparse_height, binary=True).load_leaves(
+            sparse_leaves
+        )
+    )
+    serial_proof_time, serial_proofs = timed(
+        lambda: serial_tree.get_merkle_proofs(args.height, proof_indices)
+    )
+    print(
+        f"serial: build {serial_time:.3f}s, sparse load {serial_load_time:.3f}s, "
+        f"proofs {serial_proof_time:.3f}s"
+    )
+
+    for processes in range(1, args.max_processes + 1):
+        build_time, tree = timed(
+            lambda: MerkleTree(args.height, leaves, binary=True, processes=processes)
+        )
+        assert tree.layers == serial_tree.layers
+
+        sparse_tree = ZeroMerkleTree(args.sparse_height, binary=True)
+        load_time, _ = timed(
+            lambda: sparse_tree.load_leaves(sparse_leaves, processes=processes)
+        )
+        reference = ZeroMerkleTree(args.sparse_height, binary=True)
+        reference.load_leaves(sparse_leaves)
+        assert sparse_tree.root() == reference.root()
+
+        proof_time, proofs = timed(
+            lambda: parallel.get_merkle_proofs(
+                serial_tree, args.height, proof_indices, processes
+            )
+        )
+        assert proofs == serial_proofs
+
+        print(
+            f"{processes:>2} processes: "
+            f"build {build_time:.3f}s ({serial_time / build_time:.2f}x), "
+            f"sparse load {load_time:.3f}s ({serial_load_time / load_time:.2f}x), "
+            f"proofs {proof_time:.3f}s ({serial_proof_time / proof_time:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark the latency and throughput of the ProofService under a local load generator.
+
+Usage: python -m benchmarks.proof_service [--height 32] [--clients 64] [--requests 200] [--write-ratio 0.2]
+
+Every client sends its requests one after the other, so up to `clients` requests are in flight.
+The same load is run with coalescing disabled (batches of 1 request) as a baseline.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from proof_service import ProofService
+from zero_merkle_tree import ZeroMerkleTree
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def client(service, rng, requests, write_ratio, indices, latencies):
+    for _ in range(requests):
+        index = rng.choice(indices)
+        start = time.perf_counter()
+        if rng.random() < write_ratio:
+            await service.set_leaf(index, rng.randrange(1, 2**32))
+        else:
+            await service.get_leaf(index)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args, max_batch_size):
+    rng = random.Random(0)
+    indices = [rng.randrange(2**args.height) for _ in range(args.leaves)]
+    tree = ZeroMerkleTree(args.height, binary=True)
+    tree.load_leaves({index: index for index in indices})
+    latencies = []
+    async with ProofService(
+        tree,
+        batch_window=args.batch_window,
+        max_batch_size=max_batch_size,
+        max_pending=args.max_pending,
+    ) as service:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                client(
+                    service,
+                    random.Random(seed),
+                    args.requests,
+                    args.write_ratio,
+                    indices,
+                    latencies,
+                )
+                for seed in range(args.clients)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        batches = service.batches
+    return latencies, elapsed, batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--height", type=int, default=32)
+    parser.add_argument("--leaves", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--batch-window", type=float, default=0.0)
+    parser.add_argument("--max-batch-size", type=int, default=1024)
+    parser.add_argument("--max-pending", type=int, default=10_000)
+    args = parser.parse_args()
+
+    for name, max_batch_size in (("unbatched", 1), ("coalesced", args.max_batch_size)):
+        latencies, elapsed, batches = asyncio.run(run(args, max_batch_size))
+        print(
+            f"{name:>9}: {len(latencies) / elapsed:,.0f} requests/s, "
+            f"p50 {percentile(latencies, 0.5) * 1000:.2f}ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.2f}ms, "
+            f"{len(latencies) / batches:.1f} requests/batch"
+        )
+
+
+if __name__ == "__main__":
+    main()
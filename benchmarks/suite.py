@@ -0,0 +1,256 @@
+"""
+Benchmark the trees over a matrix of operations, heights, leaf counts and access patterns.
+
+Usage:
+    python -m benchmarks.suite [--quick] [--filter zero_] [--save baseline.json]
+    python -m benchmarks.suite --compare baseline.json [--threshold 0.2]
+
+Every case reports its throughput in operations per second, the hashes per operation, counted by a wrapping
+hash backend, and the peak memory traced while the case builds its tree and runs, in a separate run so that
+tracing doesn't slow the timed run. Access patterns are dense (leaves 0, 1, 2, ...) or sparse (random leaves).
+
+`--save` writes the results as a JSON baseline, and `--compare` runs the same cases and compares them with
+a baseline, exiting with status 1 if a case got slower by more than the threshold or needs more hashes.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from append_only_merkle_tree import AppendOnlyMerkleTree
+from merkle_tree import MerkleTree
+from tests.helpers import CountingBackend
+from verification import first_invalid_delta_proof
+from zero_merkle_tree import ZeroMerkleTree
+
+DENSE_HEIGHTS = (8, 12, 16)
+SPARSE_HEIGHTS = (8, 16, 32, 64)
+LEAF_COUNTS = (100, 1000)
+PATTERNS = ("dense", "sparse")
+
+
+def leaf_indices(height, count, pattern, seed=0):
+    if pattern == "dense":
+        return list(range(count))
+    rng = random.Random(seed)
+    indices = set()
+    while len(indices) < count:
+        indices.add(rng.randrange(2**height))
+    return sorted(indices, key=lambda _: rng.random())
+
+
+# Every case builds its tree and returns the function to time, along with the number of operations it runs.
+
+
+def merkle_build(height, count, pattern, hasher):
+    leaves = list(range(2**height))
+    return lambda: MerkleTree(height, leaves, hash_backend=hasher), 1
+
+
+def merkle_root(height, count, pattern, hasher):
+    tree = MerkleTree(height, list(range(2**height)), hash_backend=hasher)
+    indices = leaf_indices(height, count, pattern)
+
+    def run():
+        for index in indices:
+            tree.update_leaves({index: index + 1})
+            tree.root()
+
+    return run, count
+
+
+def merkle_proof(height, count, pattern, hasher):
+    tree = MerkleTree(height, list(range(2**height)), hash_backend=hasher)
+    indices = leaf_indices(height, count, pattern)
+    return lambda: tree.get_merkle_proofs(height, indices), count
+
+
+def zero_set_leaf(height, count, pattern, hasher):
+    tree = ZeroMerkleTree(height, hash_backend=hasher)
+    indices = leaf_indices(height, count, pattern)
+
+    def run():
+        for index in indices:
+            tree.set_leaf(index, index + 1)
+
+    return run, count
+
+
+def zero_get_leaf(height, count, pattern, hasher):
+    tree = ZeroMerkleTree(height, hash_backend=hasher)
+    indices = leaf_indices(height, count, pattern)
+    tree.load_leaves({index: index + 1 for index in indices})
+
+    def run():
+        for index in indices:
+            tree.get_leaf(index)
+
+    return run, count
+
+
+def append_leaf(height, count, pattern, hasher):
+    tree = AppendOnlyMerkleTree(height, hash_backend=hasher)
+
+    def run():
+        for value in range(1, count + 1):
+            tree.append_leaf(value)
+
+    return run, count
+
+
+def verify_delta(height, count, pattern, hasher):
+    tree = ZeroMerkleTree(height)
+    proofs = [
+        tree.set_leaf(index, index + 1)
+        for index in leaf_indices(height, count, pattern)
+    ]
+    return lambda: first_invalid_delta_proof(proofs, hash_backend=hasher), count
+
+
+def cases(quick=False):
+    """
+    Yield the (name, case, height, count, pattern) tuples of the benchmark matrix.
+    """
+    dense_heights = DENSE_HEIGHTS[:2] if quick else DENSE_HEIGHTS
+    sparse_heights = SPARSE_HEIGHTS[::3] if quick else SPARSE_HEIGHTS
+    counts = LEAF_COUNTS[:1] if quick else LEAF_COUNTS
+    for height in dense_heights:
+        yield f"merkle_build/h{height}", merkle_build, height, 2**height, "dense"
+    for case in (merkle_root, merkle_proof):
+        for height in dense_heights:
+            for count in counts:
+                if count > 2**height:
+                    continue
+                for pattern in PATTERNS:
+                    yield f"{case.__name__}/h{height}/n{count}/{pattern}", case, height, count, pattern
+    for case in (zero_set_leaf, zero_get_leaf, verify_delta):
+        for height in sparse_heights:
+            for count in counts:
+                if count > 2**height:
+                    continue
+                for pattern in PATTERNS:
+                    yield f"{case.__name__}/h{height}/n{count}/{pattern}", case, height, count, pattern
+    for height in sparse_heights:
+        for count in counts:
+            if count <= 2**height:
+                yield f"append_leaf/h{height}/n{count}", append_leaf, height, count, "dense"
+
+
+def measure(case, height, count, pattern, repeat=5) -> dict:
+    """
+    Run a case `repeat` times, timed and counting hashes, keeping the fastest run, then once more traced for its peak memory.
+    """
+    elapsed = float("inf")
+    for _ in range(repeat):
+        hasher = CountingBackend()
+        run, operations = case(height, count, pattern, hasher)
+        hasher.hashes = 0
+        start = time.perf_counter()
+        run()
+        elapsed = min(elapsed, time.perf_counter() - start)
+        hashes = hasher.hashes
+
+    tracemalloc.start()
+    try:
+        run, _ = case(height, count, pattern, CountingBackend())
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_second": operations / elapsed,
+        "hashes_per_op": hashes / operations,
+        "peak_bytes": peak,
+    }
+
+
+def run_suite(quick=False, name_filter=None, repeat=5, output=sys.stdout) -> dict:
+    results = {}
+    for name, case, height, count, pattern in cases(quick):
+        if name_filter and name_filter not in name:
+            continue
+        result = measure(case, height, count, pattern, repeat)
+        results[name] = result
+        print(
+            f"{name:<40} {result['ops_per_second']:>14,.1f} ops/s "
+            f"{result['hashes_per_op']:>10.1f} hashes/op "
+            f"{result['peak_bytes'] / 1024:>10,.0f} KiB peak",
+            file=output,
+        )
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> list:
+    """
+    Compare results with a baseline.
+
+    Args:
+    - results (dict): The results of `run_suite`.
+    - baseline (dict): The results of a previous run.
+    - threshold (float): The fraction of throughput a case may lose before it is a regression.
+
+    Returns:
+    - list: The (name, reason) of every regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        speedup = result["ops_per_second"] / previous["ops_per_second"]
+        print(
+            f"{name:<40} {speedup:>6.2f}x ops/s, "
+            f"hashes/op {previous['hashes_per_op']:.1f} -> {result['hashes_per_op']:.1f}, "
+            f"peak {previous['peak_bytes'] / 1024:,.0f} -> {result['peak_bytes'] / 1024:,.0f} KiB"
+        )
+        if speedup < 1 - threshold:
+            regressions.append((name, f"{speedup:.2f}x throughput"))
+        if result["hashes_per_op"] > previous["hashes_per_op"]:
+            regressions.append((name, "more hashes per operation"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--quick", action="store_true", help="run a smaller matrix")
+    parser.add_argument("--filter", help="only run the cases whose name contains this")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="timed runs per case, the fastest is kept"
+    )
+    parser.add_argument("--save", help="write the results to this JSON baseline")
+    parser.add_argument("--compare", help="compare the results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run_suite(args.quick, args.filter, args.repeat)
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                baseline_file,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        for name, reason in regressions:
+            print(f"REGRESSION {name}: {reason}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import sys
+from array import array
+
+from hashing import NODE_SIZE
+from zero_merkle_tree import NodeStore
+
+_EMPTY = 0
+_DELETED = 2**64 - 1
+# Fibonacci hashing spreads the sequential generalized indexes of a level over the whole table.
+_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK_64 = 2**64 - 1
+
+
+class _NodeTable:
+    """
+    An open-addressing hash table from generalized node indexes to 32 byte digests.
+
+    Keys live in a contiguous array of unsigned 64 bit integers and values in a single bytearray,
+    so a stored node costs 40 bytes divided by the load factor, with no per-node Python objects.
+    Collisions are resolved by linear probing.
+    """
+
+    __slots__ = ("keys", "values", "count", "used", "bits")
+
+    # the table grows when more than 2/3 of its slots are used
+    MAX_LOAD_NUMERATOR, MAX_LOAD_DENOMINATOR = 2, 3
+
+    def __init__(self, bits: int = 10):
+        self.bits = bits
+        self.keys = array("Q", bytes(8 << bits))
+        self.values = bytearray(NODE_SIZE << bits)
+        # number of stored nodes, and of slots that are not empty (stored or deleted)
+        self.count = 0
+        self.used = 0
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, key: int) -> int:
+        return ((key * _MULTIPLIER) & _MASK_64) >> (64 - self.bits)
+
+    def _find(self, key: int) -> int:
+        """
+        Find the slot of a key, or -1 if it isn't stored.
+        """
+        keys, mask = self.keys, (1 << self.bits) - 1
+        slot = self._slot(key)
+        while True:
+            stored = keys[slot]
+            if stored == key:
+                return slot
+            if stored == _EMPTY:
+                return -1
+            slot = (slot + 1) & mask
+
+    def get(self, key: int):
+        slot = self._find(key)
+        if slot < 0:
+            return None
+        offset = slot * NODE_SIZE
+        return bytes(self.values[offset : offset + NODE_SIZE])
+
+    def set(self, key: int, value: bytes):
+        if len(value) != NODE_SIZE:
+            raise ValueError(f"Nodes must be {NODE_SIZE} bytes, got {len(value)}")
+        keys, mask = self.keys, (1 << self.bits) - 1
+        slot = self._slot(key)
+        free_slot = -1
+        while True:
+            stored = keys[slot]
+            if stored == key:
+                break
+            if stored == _EMPTY:
+                if free_slot < 0:
+                    free_slot = slot
+                    self.used += 1
+                keys[free_slot] = key
+                slot = free_slot
+                self.count += 1
+                break
+            if stored == _DELETED and free_slot < 0:
+                free_slot = slot
+            slot = (slot + 1) & mask
+        offset = slot * NODE_SIZE
+        self.values[offset : offset + NODE_SIZE] = value
+        if (
+            self.used * self.MAX_LOAD_DENOMINATOR
+            > (1 << self.bits) * self.MAX_LOAD_NUMERATOR
+        ):
+            self._resize()
+
+    def delete(self, key: int):
+        slot = self._find(key)
+        if slot >= 0:
+            self.keys[slot] = _DELETED
+            self.count -= 1
+
+    def items(self):
+        values = self.values
+        for slot, key in enumerate(self.keys):
+            if key != _EMPTY and key != _DELETED:
+                offset = slot * NODE_SIZE
+                yield key, bytes(values[offset : offset + NODE_SIZE])
+
+    def _resize(self):
+        items = list(self.items())
+        # grow, unless most used slots are deleted ones that rebuilding at the same size reclaims
+        if self.count * 3 > (1 << self.bits):
+            self.bits += 1
+        self.keys = array("Q", bytes(8 << self.bits))
+        self.values = bytearray(NODE_SIZE << self.bits)
+        self.count = 0
+        self.used = 0
+        for key, value in items:
+            self.set(key, value)
+
+    def nbytes(self) -> int:
+        return (
+            sys.getsizeof(self) + sys.getsizeof(self.keys) + sys.getsizeof(self.values)
+        )
+
+
+class CompactNodeStore(NodeStore):
+    """
+    A memory efficient in-memory node store for binary mode trees.
+
+    Nodes are keyed by their generalized index, 2**level + index, a single integer that is unique
+    across levels, and stored in an open-addressing table of contiguous arrays instead of a dict
+    of (level, index) tuples. This makes a stored node cost tens of bytes instead of hundreds.
+
+    Nodes must be 32 byte digests, so the store only supports binary mode, and trees of height up to 62.
+    """
+
+    __slots__ = ()
+
+    # generalized indexes must fit in 64 bits without colliding with the deleted marker
+    MAX_HEIGHT = 62
+
+    def __init__(self, height, hash_backend=None):
+        """
+        Args:
+        - height (int): The height of the tree, at most 62.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        """
+        if height > self.MAX_HEIGHT:
+            raise ValueError(
+                f"CompactNodeStore supports heights up to {self.MAX_HEIGHT}, got {height}"
+            )
+        super().__init__(height, True, hash_backend)
+        self.nodes = _NodeTable()
+
+    def set(self, level: int, index: int, value: bytes):
+        """
+        Set the value of the node in the data store.
+
+        Args:
+        - level (int): Level of the node.
+        - index (int): Index of the node.
+        - value (bytes): 32 byte value to set. A node set to its zero hash is removed.
+        """
+        if value == self.zero_hashes[self.height - level]:
+            self.nodes.delete((1 << level) | index)
+        else:
+            self.nodes.set((1 << level) | index, value)
+
+    def set_many(self, level: int, values: dict):
+        """
+        Set the values of many nodes on the same level of the data store.
+
+        Args:
+        - level (int): Level of the nodes.
+        - values (dict): Mapping of node index to the 32 byte value to set. Nodes set to their zero hash are removed.
+        """
+        level_key = 1 << level
+        zero_hash = self.zero_hashes[self.height - level]
+        for index, value in values.items():
+            if value == zero_hash:
+                self.nodes.delete(level_key | index)
+            else:
+                self.nodes.set(level_key | index, value)
+
+    def get(self, level: int, index: int) -> bytes:
+        """
+        Get the value of the node from the data store or return the correct zero hash if it doesn't exist.
+
+        Args:
+        - level (int): Level of the node.
+        - index (int): Index of the node.
+
+        Returns:
+        - bytes: Node value.
+        """
+        value = self.nodes.get((1 << level) | index)
+        if value is None:
+            return self.zero_hashes[self.height - level]
+        return value
+
+    def level_items(self, level: int):
+        """
+        Get the stored nodes of a level, in ascending index order.
+
+        Args:
+        - level (int): Level of the nodes.
+
+        Returns:
+        - iterable: (index, value) pairs of the stored nodes of the level.
+        """
+        level_key = 1 << level
+        return sorted(
+            (key ^ level_key, value)
+            for key, value in self.nodes.items()
+            if key.bit_length() == level + 1
+        )
+
+
+def node_store_nbytes(node_store: NodeStore) -> int:
+    """
+    Estimate the memory used by the stored nodes of a node store, in bytes.
+
+    For the dict based NodeStore this counts the dict, its (level, index) keys, the index integers and the values.
+    For the CompactNodeStore it counts the arrays of its table.
+    """
+    if isinstance(node_store, CompactNodeStore):
+        return node_store.nodes.nbytes()
+    total = sys.getsizeof(node_store.nodes)
+    for key, value in node_store.nodes.items():
+        # small integers, such as the levels, are shared objects, so only the indexes are counted
+        total += sys.getsizeof(key) + sys.getsizeof(value)
+        if key[1] > 256:
+            total += sys.getsizeof(key[1])
+    return total
+
+
+def memory_report(node_stores: dict) -> dict:
+    """
+    Compare the memory used per stored node by node stores.
+
+    Args:
+    - node_stores (dict): Mapping of a name to a node store.
+
+    Returns:
+    - dict: Mapping of each name to its number of stored nodes, total bytes and bytes per stored node.
+    """
+    report = {}
+    for name, node_store in node_stores.items():
+        nodes = len(node_store.nodes)
+        nbytes = node_store_nbytes(node_store)
+        report[name] = {
+            "nodes": nodes,
+            "bytes": nbytes,
+            "bytes_per_node": nbytes / nodes if nodes else 0.0,
+        }
+    return report
@@ -0,0 +1,266 @@
+from zero_merkle_tree import ZeroMerkleTree
+
+# Fields of a branch node: its value, then the stored descendant and the top node value of each child subtree.
+_VALUE, _LEFT, _LEFT_TOP, _RIGHT, _RIGHT_TOP = range(5)
+
+
+class CompressedZeroMerkleTree(ZeroMerkleTree):
+    """
+    A ZeroMerkleTree that only stores its non-empty leaves and the nodes where two non-empty subtrees meet.
+
+    The nodes between two stored nodes lie above a subtree with a single stored node, Patricia trie style:
+    their siblings are zero hashes, so they are skipped and the stored node points straight to the next stored node.
+    A tree of n leaves stores at most 2n - 1 nodes whatever its height, instead of up to `height` nodes per leaf,
+    and clearing a leaf removes it and merges the branch above it.
+
+    Roots, nodes and proofs are exactly the ones of a ZeroMerkleTree with the same leaves.
+    The nodes are kept in memory in `nodes`. The tree still creates an in-memory NodeStore, which stays empty
+    and is only used for its zero hashes, so it can't be backed by a `SqliteNodeStore`, a `CompactNodeStore`
+    or the versioned stores, and takes no `node_store` argument.
+    """
+
+    def __init__(self, height: int, binary: bool = False, hash_backend=None):
+        """
+        Args:
+        - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        """
+        super().__init__(height, binary, hash_backend)
+        self.zero_hashes = self.node_store.zero_hashes
+        # (level, index) -> leaf value for leaves, or a list of the _VALUE ... _RIGHT_TOP fields for branches
+        self.nodes = {}
+        # the highest stored node, or None if the tree is empty
+        self.top = None
+        self._root = self.zero_hashes[height]
+
+    def root(self):
+        return self._root
+
+    def _stored_value(self, key):
+        if key[0] == self.height:
+            return self.nodes[key]
+        return self.nodes[key][_VALUE]
+
+    def _value_above(self, key, level: int):
+        """
+        Compute the value of the ancestor at the given level of a stored node, with zero hash siblings in between.
+        """
+        node_level, index = key
+        value = self._stored_value(key)
+        for current_level in range(node_level, level, -1):
+            zero_hash = self.zero_hashes[self.height - current_level]
+            if index % 2 == 0:
+                value = self.hasher.hash(value, zero_hash)
+            else:
+                value = self.hasher.hash(zero_hash, value)
+            index //= 2
+        return value
+
+    def node(self, level, index):
+        key = self.top
+        while key is not None:
+            key_level, key_index = key
+            if level <= key_level:
+                # the node is either on the path above the stored node, or in an empty subtree
+                if key_index >> (key_level - level) == index:
+                    return self._value_above(key, level)
+                break
+            if index >> (level - key_level) != key_index:
+                break
+            branch = self.nodes[key]
+            key = branch[_RIGHT if (index >> (level - key_level - 1)) & 1 else _LEFT]
+        return self.zero_hashes[self.height - level]
+
+    def _siblings(self, index: int) -> list:
+        """
+        Get the siblings of a leaf's merkle path, from the leaf level up, walking down the stored nodes.
+        """
+        height = self.height
+        siblings = list(self.zero_hashes[:height])
+        key = self.top
+        while key is not None:
+            key_level, key_index = key
+            path_index = index >> (height - key_level)
+            if path_index != key_index:
+                # the leaf is empty and its path leaves the stored node's path right below level `split_level`,
+                # where the stored node's ancestor is the only non-zero sibling left
+                split_level = key_level - (path_index ^ key_index).bit_length()
+                siblings[height - split_level - 1] = self._value_above(
+                    key, split_level + 1
+                )
+                break
+            if key_level == height:
+                break
+            branch = self.nodes[key]
+            if (index >> (height - key_level - 1)) & 1:
+                key, sibling = branch[_RIGHT], branch[_LEFT_TOP]
+            else:
+                key, sibling = branch[_LEFT], branch[_RIGHT_TOP]
+            siblings[height - key_level - 1] = sibling
+        return siblings
+
+    def get_merkle_proof(self, level, index):
+        if level != self.height:
+            return super().get_merkle_proof(level, index)
+        return {
+            "root": self._root,
+            "siblings": self._siblings(index),
+            "index": index,
+            "value": self.node(level, index),
+        }
+
+    def set_leaf(self, index: int, value: str) -> dict:
+        """
+        Set a leaf in the Merkle tree and update the stored nodes on the path of the leaf.
+
+        The new merkle path is computed once from the siblings, and its nodes become the values of
+        the stored nodes on the path, so a set costs `height` hashes like in a ZeroMerkleTree.
+
+        Args:
+        - index (int): The index of the leaf to set.
+        - value (str): The value to set for the leaf.
+
+        Returns:
+        - Delta merkle proof
+        """
+        self._check_leaf_indices((index,))
+        value = self.encode_leaf(value)
+        old_root = self._root
+        old_value = self.node(self.height, index)
+        siblings = self._siblings(index)
+        path = self.compute_merkle_path_from_proof(siblings, index, value)
+        self.top = self._set(self.top, index, value, siblings, path)
+        self._root = path[-1]
+        return {
+            "index": index,
+            "siblings": siblings,
+            "oldRoot": old_root,
+            "oldValue": old_value,
+            "newValue": value,
+            "newRoot": self._root,
+        }
+
+    def _set(self, key, index: int, value, siblings: list, path: list):
+        """
+        Set a leaf in the subtree of a stored node, and return the highest stored node of the subtree afterwards.
+
+        `path` and `siblings` are the new merkle path and the siblings of the leaf, from the leaf up,
+        so the value of the path node at level `level` is `path[height - level]`.
+        """
+        height = self.height
+        is_zero = value == self.zero_hashes[0]
+        if key is None:
+            if is_zero:
+                return None
+            self.nodes[(height, index)] = value
+            return (height, index)
+
+        key_level, key_index = key
+        path_index = index >> (height - key_level)
+        if path_index != key_index:
+            if is_zero:
+                return key
+            # the leaf joins the subtree: its path meets the stored node's path at a new branch
+            split_level = key_level - (path_index ^ key_index).bit_length()
+            leaf_key = (height, index)
+            self.nodes[leaf_key] = value
+            leaf_top = path[height - split_level - 1]
+            key_top = siblings[height - split_level - 1]
+            if (index >> (height - split_level - 1)) & 1:
+                branch = [path[height - split_level], key, key_top, leaf_key, leaf_top]
+            else:
+                branch = [path[height - split_level], leaf_key, leaf_top, key, key_top]
+            branch_key = (split_level, index >> (height - split_level))
+            self.nodes[branch_key] = branch
+            return branch_key
+
+        if key_level == height:
+            if is_zero:
+                del self.nodes[key]
+                return None
+            self.nodes[key] = value
+            return key
+
+        branch = self.nodes[key]
+        if (index >> (height - key_level - 1)) & 1:
+            child, child_top, other = _RIGHT, _RIGHT_TOP, _LEFT
+        else:
+            child, child_top, other = _LEFT, _LEFT_TOP, _RIGHT
+        new_child = self._set(branch[child], index, value, siblings, path)
+        if new_child is None:
+            # a single subtree is left below the branch, so the branch is merged into the path above it
+            del self.nodes[key]
+            return branch[other]
+        branch[child] = new_child
+        branch[child_top] = path[height - key_level - 1]
+        branch[_VALUE] = path[height - key_level]
+        return key
+
+    def set_leaves(self, leaves: dict, return_proofs: bool = False):
+        """
+        Set many leaves in the Merkle tree.
+
+        Args:
+        - leaves (dict): Mapping of leaf index to the value to set for that leaf.
+        - return_proofs (bool): If True, return the delta merkle proofs of the updates in the order of `leaves`.
+
+        Returns:
+        - List of delta merkle proofs if return_proofs is True, otherwise None.
+        """
+        self._check_leaf_indices(leaves)
+        proofs = [self.set_leaf(index, value) for index, value in leaves.items()]
+        return proofs if return_proofs else None
+
+    def load_leaves(self, leaves: dict, processes: int = None):
+        """
+        Load the leaves of an empty tree.
+
+        Leaves are set one by one in ascending index order, in this process: `processes` is accepted
+        for compatibility with `ZeroMerkleTree.load_leaves` and ignored.
+
+        Args:
+        - leaves (dict): Mapping of leaf index to the value to set for that leaf.
+        - processes (int): Ignored.
+        """
+        if self.top is not None:
+            raise ValueError("Leaves can only be loaded into an empty tree")
+        self.set_leaves(dict(sorted(leaves.items())))
+
+    @classmethod
+    def from_leaves(
+        cls, height: int, sorted_items, binary: bool = False, hash_backend=None
+    ):
+        """
+        Build a tree from its non-empty leaves, e.g. from a dump written by `dump_leaves`.
+
+        The nodes are kept in memory, so unlike `ZeroMerkleTree.from_leaves` there is no `node_store`
+        to write to and no `batch_size`.
+
+        Args:
+        - height (int): The height of the tree.
+        - sorted_items (iterable): (index, value) pairs of the leaves, in strictly ascending index order.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+
+        Returns:
+        - CompressedZeroMerkleTree: The tree.
+        """
+        tree = cls(height, binary, hash_backend)
+        tree._load_sorted_leaves(sorted_items)
+        return tree
+
+    def _load_sorted_leaves(self, sorted_items):
+        last_index = -1
+        for index, value in sorted_items:
+            if not last_index < index < 2**self.height:
+                raise ValueError(
+                    f"Leaf index {index} is out of order or out of range after index {last_index}"
+                )
+            last_index = index
+            self.set_leaf(index, value)
+
+    def iter_leaves(self):
+        height = self.height
+        for level, index in sorted(key for key in self.nodes if key[0] == height):
+            yield index, self.nodes[(level, index)]
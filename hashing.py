@@ -0,0 +1,420 @@
+import hashlib
+import threading
+
+# Size in bytes of a node in binary mode.
+NODE_SIZE = 32
+
+# Keys of the proof dictionaries whose values are nodes, or lists of nodes.
+_NODE_KEYS = ("root", "oldRoot", "newRoot", "value", "oldValue", "newValue")
+_NODE_LIST_KEYS = (
+    "siblings",
+    "values",
+    "newValues",
+    "leftSiblings",
+    "rightSiblings",
+)
+
+
+class HashBackend:
+    """
+    A hash function used to compute the parent of two nodes.
+
+    Subclasses only implement `digest`, which hashes a byte string to a 32 byte digest.
+    The backend turns it into a node hash for the node format of the tree:
+    - in hex mode, both nodes are formatted as text and concatenated, and the parent is the hex digest of the result,
+    - in binary mode, both nodes are 32 byte strings, and the parent is the digest of their concatenation.
+
+    Level-wise builders hash a whole layer with a single `hash_many` call,
+    which lets a backend amortize its per-call overhead.
+    """
+
+    name = None
+
+    def __init__(self, binary=False):
+        """
+        Args:
+        - binary (bool): If True, nodes are raw 32 byte digests, otherwise they are hex strings.
+        """
+        self.binary = binary
+
+    def __repr__(self):
+        return f"{type(self).__name__}(binary={self.binary})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.binary == other.binary
+
+    def __hash__(self):
+        return hash((type(self), self.binary))
+
+    def digest(self, data):
+        """
+        Hash a byte string.
+
+        Args:
+        - data (bytes): The data to hash.
+
+        Returns:
+        - bytes: The 32 byte digest.
+        """
+        raise NotImplementedError
+
+    @property
+    def zero_leaf(self):
+        """
+        The value of an empty leaf: 0 in hex mode and 32 zero bytes in binary mode.
+        """
+        return bytes(NODE_SIZE) if self.binary else 0
+
+    def encode_leaf(self, value):
+        """
+        Encode a leaf value in the backend's node format.
+
+        In binary mode leaves are encoded with `encode_leaf`, in hex mode they are used as they are.
+        """
+        if self.binary:
+            return encode_leaf(value)
+        return value
+
+    def hash(self, left_node, right_node):
+        """
+        Compute the parent of two nodes.
+        """
+        if self.binary:
+            return self.digest(left_node + right_node)
+        return self.digest(f"{left_node}{right_node}".encode("utf-8")).hex()
+
+    def hash_many(self, pairs):
+        """
+        Compute the parents of many pairs of nodes.
+
+        Args:
+        - pairs (iterable): (left node, right node) tuples.
+
+        Returns:
+        - list: The parent of every pair, in order.
+        """
+        digest = self.digest
+        if self.binary:
+            return [digest(left + right) for left, right in pairs]
+        return [digest(f"{left}{right}".encode("utf-8")).hex() for left, right in pairs]
+
+
+class Sha256Backend(HashBackend):
+    """
+    SHA-256, the default backend. In hex mode it computes the same nodes as the original trees.
+    """
+
+    name = "sha256"
+
+    def digest(self, data):
+        return hashlib.sha256(data).digest()
+
+    def hash(self, left_node, right_node):
+        if self.binary:
+            return hashlib.sha256(left_node + right_node).digest()
+        return hashlib.sha256(f"{left_node}{right_node}".encode("utf-8")).hexdigest()
+
+    def hash_many(self, pairs):
+        sha256 = hashlib.sha256
+        if self.binary:
+            return [sha256(left + right).digest() for left, right in pairs]
+        return [
+            sha256(f"{left}{right}".encode("utf-8")).hexdigest()
+            for left, right in pairs
+        ]
+
+
+class Blake2bBackend(HashBackend):
+    """
+    BLAKE2b with a 32 byte digest.
+    """
+
+    name = "blake2b"
+
+    def digest(self, data):
+        return hashlib.blake2b(data, digest_size=NODE_SIZE).digest()
+
+
+class Blake2sBackend(HashBackend):
+    """
+    BLAKE2s, whose digest is 32 bytes.
+    """
+
+    name = "blake2s"
+
+    def digest(self, data):
+        return hashlib.blake2s(data).digest()
+
+
+class Sha3Backend(HashBackend):
+    """
+    SHA3-256, the standardized variant of Keccak-256.
+    """
+
+    name = "sha3_256"
+
+    def digest(self, data):
+        return hashlib.sha3_256(data).digest()
+
+
+class Keccak256Backend(HashBackend):
+    """
+    The original Keccak-256 used by the EVM, which differs from SHA3-256 in its padding.
+
+    hashlib doesn't provide it, so this backend needs the optional pycryptodome package.
+    """
+
+    name = "keccak256"
+
+    def __init__(self, binary=False):
+        try:
+            from Crypto.Hash import keccak
+        except ImportError as error:
+            raise ImportError(
+                "The keccak256 backend requires pycryptodome: pip install pycryptodome"
+            ) from error
+        super().__init__(binary)
+        self._keccak = keccak.new
+
+    def digest(self, data):
+        return self._keccak(data=data, digest_bits=256).digest()
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (
+        Sha256Backend,
+        Blake2bBackend,
+        Blake2sBackend,
+        Sha3Backend,
+        Keccak256Backend,
+    )
+}
+
+
+def get_backend(hash_backend=None, binary=False):
+    """
+    Get a hash backend.
+
+    Args:
+    - hash_backend (str or HashBackend): A backend, or the name of one in BACKENDS. Defaults to sha256.
+    - binary (bool): The node format of the backend. Must match the format of a backend instance.
+
+    Returns:
+    - HashBackend: The backend.
+    """
+    if hash_backend is None:
+        hash_backend = Sha256Backend.name
+    if isinstance(hash_backend, HashBackend):
+        if binary and not hash_backend.binary:
+            raise ValueError(f"{hash_backend!r} doesn't use binary nodes")
+        return hash_backend
+    # the named backends are stateless, so every tree shares one instance per name and node format
+    backend = _NAMED_BACKENDS.get((hash_backend, binary))
+    if backend is None:
+        try:
+            backend = BACKENDS[hash_backend](binary)
+        except KeyError:
+            raise ValueError(
+                f"Unknown hash backend {hash_backend!r}, expected one of {sorted(BACKENDS)}"
+            ) from None
+        _NAMED_BACKENDS[(hash_backend, binary)] = backend
+    return backend
+
+
+_NAMED_BACKENDS = {}
+
+# The longest zero hash table computed for every backend, and the table of every (backend, height) handed out.
+# Backends compare equal when they are of the same class and node format, so equal backends share their tables.
+_zero_hash_tables = {}
+_zero_hashes = {}
+_zero_hashes_lock = threading.Lock()
+
+
+def zero_hashes(hasher, height: int) -> list:
+    """
+    Get the zero hashes of a tree: the values of the empty nodes, from the empty leaf up to the empty root.
+
+    Tables are shared by all the trees of the same backend and height, so they must not be modified.
+    They are computed once per backend, and extended incrementally when a taller tree needs them.
+
+    Args:
+    - hasher (HashBackend): The hash backend of the tree.
+    - height (int): The height of the tree.
+
+    Returns:
+    - list: The `height + 1` zero hashes, where the zero hash of level `level` is at position `height - level`.
+    """
+    key = (hasher, height)
+    table = _zero_hashes.get(key)
+    if table is None:
+        with _zero_hashes_lock:
+            full_table = _zero_hash_tables.setdefault(hasher, [hasher.zero_leaf])
+            while len(full_table) <= height:
+                full_table.append(hasher.hash(full_table[-1], full_table[-1]))
+            table = _zero_hashes[key] = full_table[: height + 1]
+    return table
+
+
+def save_zero_hashes(path, hasher, height: int):
+    """
+    Write the zero hashes of a backend up to a height to a file, to be loaded with `load_zero_hashes`.
+
+    Args:
+    - path (str): Path of the file.
+    - hasher (HashBackend): The hash backend.
+    - height (int): The height of the tallest tree the table is for.
+    """
+    table = zero_hashes(hasher, height)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"{hasher.name} {'binary' if hasher.binary else 'hex'}\n")
+        for value in table[1:]:
+            file.write(f"{value.hex() if hasher.binary else value}\n")
+
+
+def load_zero_hashes(path, hasher) -> int:
+    """
+    Load a table written by `save_zero_hashes`, so that trees of the backend up to its height don't compute their zero hashes.
+
+    Only the first zero hash is checked, so the file must be trusted.
+
+    Args:
+    - path (str): Path of the file.
+    - hasher (HashBackend): The hash backend the table was written for.
+
+    Returns:
+    - int: The height of the table.
+    """
+    with open(path, encoding="utf-8") as file:
+        header = file.readline().split()
+        if header != [str(hasher.name), "binary" if hasher.binary else "hex"]:
+            raise ValueError(f"{path} isn't a zero hash table of {hasher!r}")
+        table = [hasher.zero_leaf]
+        for line in file:
+            value = line.rstrip("\r\n")
+            table.append(bytes.fromhex(value) if hasher.binary else value)
+    if len(table) > 1 and table[1] != hasher.hash(table[0], table[0]):
+        raise ValueError(f"{path} isn't a zero hash table of {hasher!r}")
+    with _zero_hashes_lock:
+        if len(table) > len(_zero_hash_tables.get(hasher, ())):
+            _zero_hash_tables[hasher] = table
+    return len(table) - 1
+
+
+class backend_method:
+    """
+    Decorator of the `hash` and `compute_merkle_root_from_proof` methods of the trees and node stores,
+    which were static methods computing hex mode sha256 nodes before trees had a hash backend.
+
+    Looked up on an instance, the decorated method is an ordinary method that uses the instance's backend.
+    Looked up on the class, it is the deprecated `static` function, which computes hex mode sha256 nodes as before.
+    """
+
+    def __init__(self, static):
+        self.static = static
+        self.method = None
+
+    def __call__(self, method):
+        self.method = method
+        self.__doc__ = method.__doc__
+        return self
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self.static
+        return self.method.__get__(instance, owner)
+
+
+def encode_leaf(value):
+    """
+    Encode a leaf value as a binary mode node.
+
+    Leaves have a fixed width of 32 bytes:
+    - bytes of length 32 are used as they are,
+    - non-negative integers are encoded as 32 byte big-endian numbers.
+
+    Args:
+    - value (bytes or int): The leaf value.
+
+    Returns:
+    - bytes: The 32 byte leaf node.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) != NODE_SIZE:
+            raise ValueError(
+                f"Binary leaves must be {NODE_SIZE} bytes, got {len(value)}"
+            )
+        return bytes(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        if value < 0 or value.bit_length() > NODE_SIZE * 8:
+            raise ValueError(f"Integer leaves must fit in {NODE_SIZE} unsigned bytes")
+        return value.to_bytes(NODE_SIZE, "big")
+    raise TypeError(f"Can't encode a leaf of type {type(value).__name__}")
+
+
+def to_hex(node):
+    """
+    Convert a binary mode node to its hex representation.
+    """
+    if not isinstance(node, (bytes, bytearray)) or len(node) != NODE_SIZE:
+        raise ValueError(f"{node!r} isn't a binary mode node of {NODE_SIZE} bytes")
+    return node.hex()
+
+
+def from_hex(node):
+    """
+    Convert the hex representation of a binary mode node back to bytes.
+    """
+    if isinstance(node, str) and len(node) == 2 * NODE_SIZE:
+        try:
+            return bytes.fromhex(node)
+        except ValueError:
+            pass
+    raise ValueError(f"{node!r} isn't the hex representation of a binary mode node")
+
+
+def _convert_proof(proof, convert):
+    converted = dict(proof)
+    for key in _NODE_KEYS:
+        if key in converted:
+            converted[key] = convert(converted[key])
+    for key in _NODE_LIST_KEYS:
+        if key not in converted:
+            continue
+        nodes = converted[key]
+        if isinstance(nodes, dict):
+            # the values of a range proof, keyed by leaf index
+            converted[key] = {index: convert(node) for index, node in nodes.items()}
+        else:
+            converted[key] = [convert(node) for node in nodes]
+    return converted
+
+
+def proof_to_hex(proof):
+    """
+    Convert a proof of a binary mode tree to hex, e.g. to store it as text.
+
+    Works for merkle proofs, delta merkle proofs, multiproofs, batch append proofs and range proofs.
+    Raises a ValueError if a node isn't 32 bytes, e.g. if the proof is from a hex mode tree.
+
+    Args:
+    - proof (dict): A proof whose nodes are bytes.
+
+    Returns:
+    - dict: A copy of the proof whose nodes are hex strings.
+    """
+    return _convert_proof(proof, to_hex)
+
+
+def proof_from_hex(proof):
+    """
+    Convert a hex proof produced by `proof_to_hex` back to a binary mode proof.
+    Raises a ValueError if a node isn't the hex representation of 32 bytes.
+
+    Args:
+    - proof (dict): A proof whose nodes are hex strings.
+
+    Returns:
+    - dict: A copy of the proof whose nodes are bytes, which a binary mode tree can verify.
+    """
+    return _convert_proof(proof, from_hex)
@@ -0,0 +1,340 @@
+"""
+Opt-in instrumentation of the hot paths of the trees.
+
+`enable()` wraps, in place, the hash functions of the hash backends, the `get`, `set` and `set_many` methods of the
+node stores, and the public operations of the trees, such as `set_leaf`, `get_leaf`, `get_merkle_proof` and `append_leaf`.
+`disable()` restores the original methods, so instrumentation costs nothing while it is disabled.
+
+For every operation it records the number of calls, a latency histogram, and the hashes, node reads,
+node reads that fell back to a zero hash, and node writes done on its behalf. Work done inside an operation called
+by another one, e.g. `get_merkle_proof` called by `get_leaf`, is counted for the outer operation only.
+Work done outside any operation, such as building a MerkleTree, is counted under the operation "other".
+
+Only the classes defined when `enable` is called are wrapped. Counts are not synchronized between threads,
+so they can be slightly off when several threads use the trees.
+
+Usage:
+    instrumentation.enable()
+    tree.set_leaf(3, 10)
+    metrics = instrumentation.to_prometheus()
+
+    with instrumentation.scope() as stats:
+        ...  # one block's worth of work
+    block_stats = stats.snapshot()
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from hashing import BACKENDS, HashBackend
+from merkle_tree import BaseMerkleTree
+from zero_merkle_tree import NodeStore
+
+OPERATIONS = (
+    "get_merkle_proof",
+    "get_merkle_proofs",
+    "get_multiproof",
+    "get_range_proof",
+    "get_leaf",
+    "set_leaf",
+    "set_leaves",
+    "load_leaves",
+    "update_leaf",
+    "update_leaves",
+    "append_leaf",
+    "append_batch",
+    "verify_merkle_proof",
+    "verify_delta_merkle_proof",
+    "verify_multiproof",
+    "verify_range_proof",
+)
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (
+    1e-6,
+    2.5e-6,
+    5e-6,
+    1e-5,
+    2.5e-5,
+    5e-5,
+    1e-4,
+    2.5e-4,
+    5e-4,
+    1e-3,
+    2.5e-3,
+    5e-3,
+    1e-2,
+    2.5e-2,
+    5e-2,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+COUNTERS = ("hashes", "node_gets", "zero_gets", "node_sets")
+
+_OTHER = "other"
+
+
+class Stats:
+    """
+    Counters and latency histograms per operation.
+    """
+
+    def __init__(self):
+        self.operations = {}
+
+    def _operation(self, name):
+        operation = self.operations.get(name)
+        if operation is None:
+            operation = self.operations[name] = {
+                "calls": 0,
+                **{counter: 0 for counter in COUNTERS},
+                "latency_sum": 0.0,
+                "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            }
+        return operation
+
+    def count(self, name, counter, amount=1):
+        self._operation(name)[counter] += amount
+
+    def observe(self, name, seconds):
+        operation = self._operation(name)
+        operation["calls"] += 1
+        operation["latency_sum"] += seconds
+        operation["latency_buckets"][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+        - dict: Mapping of operation name to its calls, counters, total latency in seconds,
+          and latency histogram as a mapping of bucket upper bound to the cumulative count of calls.
+        """
+        snapshot = {}
+        for name, operation in self.operations.items():
+            cumulative = 0
+            histogram = {}
+            for bound, calls in zip(
+                LATENCY_BUCKETS + (float("inf"),), operation["latency_buckets"]
+            ):
+                cumulative += calls
+                histogram[bound] = cumulative
+            snapshot[name] = {
+                "calls": operation["calls"],
+                **{counter: operation[counter] for counter in COUNTERS},
+                "latency_sum": operation["latency_sum"],
+                "latency_histogram": histogram,
+            }
+        return snapshot
+
+    def to_prometheus(self, prefix="merkle") -> str:
+        """
+        Format the stats in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for counter in ("calls",) + COUNTERS:
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            for name, operation in snapshot.items():
+                lines.append(
+                    f'{prefix}_{counter}_total{{operation="{name}"}} {operation[counter]}'
+                )
+        lines.append(f"# TYPE {prefix}_operation_seconds histogram")
+        for name, operation in snapshot.items():
+            if not operation["calls"]:
+                continue
+            for bound, calls in operation["latency_histogram"].items():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f'{prefix}_operation_seconds_bucket{{operation="{name}",le="{le}"}} {calls}'
+                )
+            lines.append(
+                f'{prefix}_operation_seconds_sum{{operation="{name}"}} {operation["latency_sum"]}'
+            )
+            lines.append(
+                f'{prefix}_operation_seconds_count{{operation="{name}"}} {operation["calls"]}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+_stats = Stats()
+# the stats that record events: the global stats and the stats of the open scopes
+_sinks = [_stats]
+_state = threading.local()
+# (class, method name, original method) of the wrapped methods
+_patched = []
+
+
+def _current_operation():
+    return getattr(_state, "operation", None) or _OTHER
+
+
+def _count(counter, amount=1):
+    name = _current_operation()
+    for sink in _sinks:
+        sink.count(name, counter, amount)
+
+
+def _wrap_operation(name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if getattr(_state, "operation", None) is not None:
+            return method(*args, **kwargs)
+        _state.operation = name
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _state.operation = None
+            for sink in _sinks:
+                sink.observe(name, elapsed)
+
+    return wrapper
+
+
+def _wrap_nested(category, method, record):
+    """
+    Wrap a method so that `record(args, result)` is called once, even when the method calls
+    other wrapped methods of the same category, e.g. a `set_many` implemented with `set`.
+    """
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if getattr(_state, category, False):
+            return method(*args, **kwargs)
+        setattr(_state, category, True)
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            setattr(_state, category, False)
+        record(args, result)
+        return result
+
+    return wrapper
+
+
+def _record_hash(args, result):
+    _count("hashes")
+
+
+def _record_hash_many(args, result):
+    _count("hashes", len(result))
+
+
+def _record_get(args, result):
+    node_store, level = args[0], args[1]
+    _count("node_gets")
+    if result is node_store.zero_hashes[node_store.height - level]:
+        _count("zero_gets")
+
+
+def _record_set(args, result):
+    _count("node_sets")
+
+
+def _record_set_many(args, result):
+    _count("node_sets", len(args[2]))
+
+
+def _subclasses(cls):
+    classes = [cls]
+    for subclass in cls.__subclasses__():
+        classes.extend(_subclasses(subclass))
+    return classes
+
+
+def _patch(cls, method_name, wrapper):
+    method = cls.__dict__[method_name]
+    _patched.append((cls, method_name, method))
+    setattr(cls, method_name, wrapper(method))
+
+
+def is_enabled() -> bool:
+    return bool(_patched)
+
+
+def enable():
+    """
+    Wrap the hash backends, node stores and tree operations defined so far. Does nothing if already enabled.
+    """
+    if _patched:
+        return
+    for cls in {HashBackend, *BACKENDS.values()}:
+        if "hash" in cls.__dict__:
+            _patch(cls, "hash", lambda m: _wrap_nested("hashing", m, _record_hash))
+        if "hash_many" in cls.__dict__:
+            _patch(
+                cls,
+                "hash_many",
+                lambda m: _wrap_nested("hashing", m, _record_hash_many),
+            )
+    for cls in _subclasses(NodeStore):
+        if "get" in cls.__dict__:
+            _patch(cls, "get", lambda m: _wrap_nested("reading", m, _record_get))
+        if "set" in cls.__dict__:
+            _patch(cls, "set", lambda m: _wrap_nested("writing", m, _record_set))
+        if "set_many" in cls.__dict__:
+            _patch(
+                cls, "set_many", lambda m: _wrap_nested("writing", m, _record_set_many)
+            )
+    for cls in _subclasses(BaseMerkleTree):
+        for name in OPERATIONS:
+            if name in cls.__dict__:
+                _patch(cls, name, lambda m, name=name: _wrap_operation(name, m))
+
+
+def disable():
+    """
+    Restore the original methods. The recorded stats are kept until `reset`.
+    """
+    while _patched:
+        cls, method_name, method = _patched.pop()
+        setattr(cls, method_name, method)
+
+
+def reset():
+    """
+    Clear the recorded stats.
+    """
+    _stats.operations.clear()
+
+
+def snapshot() -> dict:
+    """
+    Get the stats recorded since the last reset, see `Stats.snapshot`.
+    """
+    return _stats.snapshot()
+
+
+def to_prometheus(prefix="merkle") -> str:
+    """
+    Format the stats recorded since the last reset in the Prometheus text exposition format.
+    """
+    return _stats.to_prometheus(prefix)
+
+
+@contextmanager
+def scope():
+    """
+    Record the work done in a block in separate stats, e.g. to measure one block's worth of updates.
+
+    Instrumentation is enabled for the block if it isn't already.
+
+    Yields:
+    - Stats: The stats of the block.
+    """
+    stats = Stats()
+    was_enabled = is_enabled()
+    enable()
+    _sinks.append(stats)
+    try:
+        yield stats
+    finally:
+        _sinks.remove(stats)
+        if not was_enabled:
+            disable()
@@ -1,17 +1,58 @@
-import hashlib
+import warnings
 
+import parallel
+import verification
+from hashing import backend_method, get_backend, zero_hashes
 
-class MerkleTree:
-    def __init__(self, height, leaves):
-        self.height = height
-        self.leaves = leaves
 
-    @staticmethod
-    def hash(left_node, right_node):
-        hasher = hashlib.sha256()
-        concatenated_nodes = f"{left_node}{right_node}".encode("utf-8")
-        hasher.update(concatenated_nodes)
-        return hasher.hexdigest()
+def _static_hash(left_node, right_node):
+    warnings.warn(
+        "MerkleTree.hash is deprecated, use hashing.get_backend().hash or the hash of a tree",
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    return get_backend().hash(left_node, right_node)
+
+
+def _static_compute_merkle_root_from_proof(siblings, index, value):
+    warnings.warn(
+        "MerkleTree.compute_merkle_root_from_proof is deprecated, "
+        "use verification.compute_merkle_root_from_proof(hasher, siblings, index, value)",
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    return verification.compute_merkle_root_from_proof(
+        get_backend(), siblings, index, value
+    )
+
+
+class BaseMerkleTree:
+    """
+    The operations shared by all trees, computed from the nodes returned by `node`:
+    merkle proofs, multiproofs, range proofs, delta merkle proofs and their verification.
+
+    Subclasses store the nodes, and implement `node`.
+    """
+
+    __slots__ = ("height", "hasher", "__weakref__")
+
+    def node(self, level, index):
+        """
+        Get the value of a node given its level and index, where level 0 is the root and level `height` the leaves.
+        """
+        raise NotImplementedError
+
+    @backend_method(_static_hash)
+    def hash(self, left_node, right_node):
+        return self.hasher.hash(left_node, right_node)
+
+    def encode_leaf(self, value):
+        """
+        Encode a leaf value in the tree's node format.
+
+        In binary mode leaves are encoded as 32 byte nodes, in hex mode they are used as they are.
+        """
+        return self.hasher.encode_leaf(value)
 
     @staticmethod
     def get_merkle_path_of_node(level, index):
@@ -52,44 +93,16 @@ class MerkleTree:
             # if node is odd, its sibling is at index-1
             return {"level": level, "index": index - 1}
 
-    def node(self, level, index):
+    def _check_leaf_indices(self, indices):
         """
-        Compute the value of a node in the Merkle tree given its level and index.
-
-        Parameters:
-        - level (int): The level of the node in the tree.
-          Level 0 represents the root node, while the maximum level (equal to the height of the tree) represents the leaves.
-        - index (int): The index of the node at the given level.
-          The index starts from 0 and increases from left to right.
-
-        Returns:
-        - str: The value of the node. This could either be a hash value (for non-leaf nodes) or actual data (for leaf nodes).
-
-        Logic:
-        - If the node is a leaf (i.e., level equals the height of the tree), return the corresponding data from the leaves list.
-        - Otherwise, the value of the node is computed by hashing the values of its two child nodes.
-          The left child node is at [level + 1, index * 2] and the right child node is at [level + 1, index * 2 + 1].
-
-        Example:
-        Given the tree:
-            Level 0:    N(0,0)
-            Level 1:  N(1,0)   N(1,1)
-            Level 2: N(2,0) N(2,1) N(2,2) N(2,3)
-
-        To compute the value of node N(1,1), the method will hash the values of N(2,2) and N(2,3).
-
-        Refer to the Merkle Tree Diagram Cheat Sheet for a visual representation.
+        Raise a ValueError if a leaf index is out of range, before anything is written.
         """
-        if level == self.height:
-            # if level == height, the node is a leaf,
-            # so just return the value from our dataset
-            return self.leaves[index]
-        else:
-            # if the node is not a leaf, use:
-            # N(level, index) = Hash(N(level+1, index*2), N(level+1, index*2+1))
-            return self.hash(
-                self.node(level + 1, 2 * index), self.node(level + 1, 2 * index + 1)
-            )
+        leaf_count = 2**self.height
+        for index in indices:
+            if not 0 <= index < leaf_count:
+                raise ValueError(
+                    f"Leaf index {index} is out of range for height {self.height}"
+                )
 
     def root(self):
         return self.node(0, 0)
@@ -136,8 +149,275 @@ class MerkleTree:
             "value": leaf_value,  # the value of our leaf
         }
 
-    @staticmethod
-    def compute_merkle_root_from_proof(siblings, index, value):
+    def get_merkle_proofs(self, level, indices):
+        """
+        Generate the merkle proofs of many nodes.
+
+        See `parallel.get_merkle_proofs` to shard the indices across worker processes.
+
+        Parameters:
+        - level (int): The level of the nodes in the tree.
+        - indices (iterable): The indexes of the nodes at the given level.
+
+        Returns:
+        list: The merkle proof of every node, in the order of `indices`.
+        """
+        return [self.get_merkle_proof(level, index) for index in indices]
+
+    def get_multiproof(self, level, indices):
+        """
+        Generate a single merkle proof for many nodes on the same level.
+
+        Separate merkle proofs for nearby nodes repeat the siblings they have in common,
+        and contain siblings that can be computed from the other proven nodes.
+        A multiproof only contains the minimal set of sibling nodes needed to compute the root:
+        walking up the tree level by level, a sibling is included only if it can't be computed
+        from the nodes below it.
+
+        The siblings are ordered level by level, from the bottom of the tree up,
+        and by index within each level, which is the order in which `verify_multiproof` consumes them.
+
+        Parameters:
+        - level (int): The level of the nodes in the tree.
+        - indices (iterable): The indexes of the nodes at the given level.
+
+        Returns:
+        dict: A dictionary containing the components of the multiproof.
+        """
+        indices = sorted(set(indices))
+        values = [self.node(level, index) for index in indices]
+        siblings = []
+
+        known_indices = indices
+        for current_level in range(level, 0, -1):
+            known = set(known_indices)
+            for index in known_indices:
+                sibling_index = index ^ 1
+                if sibling_index not in known:
+                    siblings.append(self.node(current_level, sibling_index))
+            # the parents of the known nodes can be computed, so they become the known nodes of the next level
+            known_indices = sorted({index // 2 for index in known_indices})
+
+        return {
+            "root": self.root(),  # the root we claim to be our tree's root
+            "level": level,  # the level of the proven nodes
+            "indices": indices,  # the indexes of the proven nodes, in ascending order
+            "values": values,  # the values of the proven nodes
+            "siblings": siblings,  # the siblings that can't be computed from the proven nodes
+        }
+
+    def compute_merkle_root_from_multiproof(self, level, indices, values, siblings):
+        """
+        Computes the merkle root using the provided multiproof.
+
+        The proven nodes are hashed together level by level in a single bottom-up pass,
+        taking a sibling from the proof whenever a node's sibling isn't already known.
+
+        Parameters:
+        - level (int): The level of the proven nodes.
+        - indices (list): The indexes of the proven nodes, in ascending order.
+        - values (list): The values of the proven nodes.
+        - siblings (list): The siblings of the multiproof, in the order they were generated.
+
+        Returns:
+        str: The computed merkle root, or None if the proof doesn't contain the expected number of siblings.
+        """
+        nodes = dict(zip(indices, values))
+        sibling_values = iter(siblings)
+
+        for _ in range(level):
+            parents = {}
+            for index in sorted(nodes):
+                parent_index = index // 2
+                if parent_index in parents:
+                    # the parent was already computed from its left hand child
+                    continue
+                try:
+                    if index % 2 == 0:
+                        right = (
+                            nodes[index + 1]
+                            if index + 1 in nodes
+                            else next(sibling_values)
+                        )
+                        parents[parent_index] = self.hasher.hash(nodes[index], right)
+                    else:
+                        parents[parent_index] = self.hasher.hash(
+                            next(sibling_values), nodes[index]
+                        )
+                except StopIteration:
+                    return None
+            nodes = parents
+
+        if next(sibling_values, None) is not None or list(nodes) != [0]:
+            return None
+        return nodes[0]
+
+    def verify_multiproof(self, proof):
+        """
+        Verify a multiproof generated by `get_multiproof`.
+
+        Parameters:
+        - proof (dict): The multiproof dictionary.
+
+        Returns:
+        bool: True if the proven nodes and siblings hash up to the proof's root, False otherwise.
+        """
+        indices = proof["indices"]
+        if not indices or indices != sorted(set(indices)):
+            return False
+        if len(indices) != len(proof["values"]):
+            return False
+        return proof["root"] == self.compute_merkle_root_from_multiproof(
+            proof["level"], proof["indices"], proof["values"], proof["siblings"]
+        )
+
+    def get_range_proof(self, start, end):
+        """
+        Generate a single merkle proof for the contiguous span of leaves [start, end).
+
+        Only the siblings of the span's boundaries are needed: walking up the tree, a level has a left sibling
+        if the span's first node is a right hand node, and a right sibling if its last node is a left hand node.
+        The proof costs O(span + height) instead of the O(span * height) of separate proofs.
+
+        Only the non-empty leaves of the span are included. Subtrees whose root is a zero hash are skipped
+        without reading their leaves, so a sparse span only costs reading the paths of its non-empty leaves.
+
+        Parameters:
+        - start (int): The index of the first leaf of the span.
+        - end (int): The index after the last leaf of the span.
+
+        Returns:
+        dict: A dictionary containing the components of the range proof.
+        """
+        height = self.height
+        if not 0 <= start < end <= 2**height:
+            raise ValueError(
+                f"Leaf range [{start}, {end}) is empty or out of range for height {height}"
+            )
+        values = self._range_values(start, end)
+        left_siblings = []
+        right_siblings = []
+        first, last = start, end - 1
+        for level in range(height, 0, -1):
+            if first % 2 == 1:
+                left_siblings.append(self.node(level, first - 1))
+            if last % 2 == 0:
+                right_siblings.append(self.node(level, last + 1))
+            first //= 2
+            last //= 2
+
+        return {
+            "root": self.root(),  # the root we claim to be our tree's root
+            "start": start,  # the index of the first leaf of the span
+            "end": end,  # the index after the last leaf of the span
+            "values": values,  # the non-empty leaves of the span, by index
+            "leftSiblings": left_siblings,  # the siblings left of the span, from the bottom of the tree up
+            "rightSiblings": right_siblings,  # the siblings right of the span, from the bottom of the tree up
+        }
+
+    def _range_values(self, start, end):
+        """
+        Get the non-empty leaves in [start, end), in ascending index order, descending only into non-empty subtrees.
+        """
+        height = self.height
+        zero_hash_values = zero_hashes(self.hasher, height)
+        values = {}
+        # the right child is pushed first, so the leaves are found from left to right
+        stack = [(0, 0)]
+        while stack:
+            level, index = stack.pop()
+            depth = height - level
+            if (index + 1) << depth <= start or index << depth >= end:
+                continue
+            value = self.node(level, index)
+            if value == zero_hash_values[depth]:
+                continue
+            if depth == 0:
+                values[index] = value
+            else:
+                stack.append((level + 1, 2 * index + 1))
+                stack.append((level + 1, 2 * index))
+        return values
+
+    def compute_merkle_root_from_range_proof(
+        self, start, end, values, left_siblings, right_siblings
+    ):
+        """
+        Computes the merkle root using the provided range proof.
+
+        The span is hashed level by level in a single bottom-up pass. Missing leaves are empty, and parents
+        of two zero hashes are zero hashes, so only the nodes above non-empty leaves are hashed.
+
+        Parameters:
+        - start (int): The index of the first leaf of the span.
+        - end (int): The index after the last leaf of the span.
+        - values (dict): The non-empty leaves of the span, by index.
+        - left_siblings (list): The siblings left of the span, from the bottom of the tree up.
+        - right_siblings (list): The siblings right of the span, from the bottom of the tree up.
+
+        Returns:
+        str: The computed merkle root, or None if the proof doesn't contain the expected number of siblings.
+        """
+        height = self.height
+        zero_hash_values = zero_hashes(self.hasher, height)
+        nodes = dict(values)
+        left_values = iter(left_siblings)
+        right_values = iter(right_siblings)
+        first, last = start, end - 1
+
+        try:
+            for level in range(height, 0, -1):
+                if first % 2 == 1:
+                    nodes[first - 1] = next(left_values)
+                if last % 2 == 0:
+                    nodes[last + 1] = next(right_values)
+                zero_hash = zero_hash_values[height - level]
+                parents = {}
+                for index in nodes:
+                    parent_index = index // 2
+                    if parent_index in parents:
+                        continue
+                    left = nodes.get(2 * parent_index, zero_hash)
+                    right = nodes.get(2 * parent_index + 1, zero_hash)
+                    if left == zero_hash and right == zero_hash:
+                        # an empty subtree, whose root is the next zero hash
+                        continue
+                    parents[parent_index] = self.hasher.hash(left, right)
+                nodes = parents
+                first //= 2
+                last //= 2
+        except StopIteration:
+            return None
+
+        if next(left_values, None) is not None or next(right_values, None) is not None:
+            return None
+        return nodes.get(0, zero_hash_values[height])
+
+    def verify_range_proof(self, proof):
+        """
+        Verify a range proof generated by `get_range_proof`.
+
+        Parameters:
+        - proof (dict): The range proof dictionary.
+
+        Returns:
+        bool: True if the span and its boundary siblings hash up to the proof's root, False otherwise.
+        """
+        start, end = proof["start"], proof["end"]
+        if not 0 <= start < end <= 2**self.height:
+            return False
+        if any(not start <= index < end for index in proof["values"]):
+            return False
+        return proof["root"] == self.compute_merkle_root_from_range_proof(
+            start,
+            end,
+            proof["values"],
+            proof["leftSiblings"],
+            proof["rightSiblings"],
+        )
+
+    @backend_method(_static_compute_merkle_root_from_proof)
+    def compute_merkle_root_from_proof(self, siblings, index, value):
         """
         Computes the merkle root using the provided proof.
 
@@ -152,25 +432,9 @@ class MerkleTree:
         Returns:
         str: The computed merkle root.
         """
-        merkle_path_node_value = value
-        merkle_path_node_index = index
-
-        for sibling in siblings:
-            if merkle_path_node_index % 2 == 0:
-                # if the current index of the node on our merkle path is even
-                merkle_path_node_value = MerkleTree.hash(
-                    merkle_path_node_value, sibling
-                )
-            else:
-                # if the current index of the node on our merkle path is odd
-                merkle_path_node_value = MerkleTree.hash(
-                    sibling, merkle_path_node_value
-                )
-
-            # Compute the index for the parent node
-            merkle_path_node_index //= 2
-
-        return merkle_path_node_value
+        return verification.compute_merkle_root_from_proof(
+            self.hasher, siblings, index, value
+        )
 
     def compute_merkle_path_from_proof(self, siblings, index, value):
         # Start our merkle node path at the leaf node
@@ -188,7 +452,7 @@ class MerkleTree:
                 # - merkle_path_node_value is the left-hand node,
                 # - merkle_path_node_sibling is the right-hand node,
                 # - parent node's value is hash(merkle_path_node_value, merkle_path_node_sibling)
-                merkle_path_node_value = self.hash(
+                merkle_path_node_value = self.hasher.hash(
                     merkle_path_node_value, merkle_path_node_sibling
                 )
             else:
@@ -196,7 +460,7 @@ class MerkleTree:
                 # - merkle_path_node_sibling is the left-hand node,
                 # - merkle_path_node_value is the right-hand node,
                 # - parent node's value is hash(merkle_path_node_sibling, merkle_path_node_value)
-                merkle_path_node_value = self.hash(
+                merkle_path_node_value = self.hasher.hash(
                     merkle_path_node_sibling, merkle_path_node_value
                 )
 
@@ -207,8 +471,8 @@ class MerkleTree:
         return merkle_path
 
     def verify_merkle_proof(self, proof):
-        return proof["root"] == self.compute_merkle_root_from_proof(
-            proof["siblings"], proof["index"], proof["value"]
+        return proof["root"] == verification.compute_merkle_root_from_proof(
+            self.hasher, proof["siblings"], proof["index"], proof["value"]
         )
 
     def get_delta_merkle_proof(self, level, index, new_value):
@@ -223,9 +487,11 @@ class MerkleTree:
         Returns:
         dict: A dictionary containing the index, siblings, old root, old value, new root, and new value.
         """
+        if level == self.height:
+            new_value = self.encode_leaf(new_value)
         old_leaf_proof = self.get_merkle_proof(level, index)
-        new_root = self.compute_merkle_root_from_proof(
-            old_leaf_proof["siblings"], index, new_value
+        new_root = verification.compute_merkle_root_from_proof(
+            self.hasher, old_leaf_proof["siblings"], index, new_value
         )
 
         return {
@@ -241,26 +507,169 @@ class MerkleTree:
         """
         Verify the delta merkle proof.
 
+        The old and new roots are computed in a single walk up the path, see `verification.compute_delta_roots`.
+        To verify many proofs, e.g. the chained updates of a block, use `verification.first_invalid_delta_proof`.
+
         Parameters:
         - delta_merkle_proof (dict): The delta merkle proof dictionary.
 
         Returns:
         bool: True if both the old and new merkle proofs are valid, False otherwise.
         """
-        old_proof = {
-            "siblings": delta_merkle_proof["siblings"],
-            "index": delta_merkle_proof["index"],
-            "root": delta_merkle_proof["oldRoot"],
-            "value": delta_merkle_proof["oldValue"],
-        }
+        return verification.verify_delta_merkle_proof(delta_merkle_proof, self.hasher)
 
-        new_proof = {
-            "siblings": delta_merkle_proof["siblings"],
-            "index": delta_merkle_proof["index"],
-            "root": delta_merkle_proof["newRoot"],
-            "value": delta_merkle_proof["newValue"],
-        }
 
-        return self.verify_merkle_proof(old_proof) and self.verify_merkle_proof(
-            new_proof
+class MerkleTree(BaseMerkleTree):
+    __slots__ = ("leaves", "layers", "_dirty")
+
+    def __init__(self, height, leaves, binary=False, hash_backend=None, processes=None):
+        """
+        Parameters:
+        - height (int): The height of the tree.
+        - leaves (list): The 2**height leaves of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+          Otherwise nodes are hex strings, which is the default.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        - processes (int): If more than 1, the tree is built by this many worker processes, see `parallel.build_layers`.
+        """
+        if len(leaves) != 2**height:
+            raise ValueError(
+                f"A tree of height {height} needs {2**height} leaves, got {len(leaves)}"
+            )
+        self.height = height
+        self.hasher = get_backend(hash_backend, binary)
+        self.leaves = (
+            [self.encode_leaf(leaf) for leaf in leaves]
+            if self.hasher.binary
+            else leaves
         )
+        if processes and processes > 1:
+            self.layers = parallel.build_layers(
+                height, self.leaves, self.hasher, processes
+            )
+        else:
+            self.layers = self._build_layers()
+        # the leaves are updated in place, in the bottom layer
+        self.leaves = self.layers[height]
+        # indexes of the leaves updated since the layers above them were last rehashed
+        self._dirty = set()
+
+    def _build_layers(self):
+        """
+        Build every level of the tree once, bottom-up.
+
+        Each level is computed from the one below it by hashing consecutive pairs in a single `hash_many` call,
+        so building the whole tree costs exactly one hash per internal node.
+
+        Returns:
+        list: A list of levels, where layers[level][index] is the value of N(level, index).
+        """
+        layers = [None] * (self.height + 1)
+        layers[self.height] = list(self.leaves)
+        for level in range(self.height - 1, -1, -1):
+            children = layers[level + 1]
+            layers[level] = self.hasher.hash_many(zip(children[0::2], children[1::2]))
+        return layers
+
+    def node(self, level, index):
+        """
+        Get the value of a node in the Merkle tree given its level and index.
+
+        Parameters:
+        - level (int): The level of the node in the tree.
+          Level 0 represents the root node, while the maximum level (equal to the height of the tree) represents the leaves.
+        - index (int): The index of the node at the given level.
+          The index starts from 0 and increases from left to right.
+
+        Returns:
+        - str: The value of the node. This could either be a hash value (for non-leaf nodes) or actual data (for leaf nodes).
+
+        Logic:
+        - If the node is a leaf (i.e., level equals the height of the tree), its value is the corresponding data from the leaves list.
+        - Otherwise, the value of the node is the hash of the values of its two child nodes.
+          The left child node is at [level + 1, index * 2] and the right child node is at [level + 1, index * 2 + 1].
+        - All levels are computed once when the tree is built, so this is a constant time lookup.
+
+        Example:
+        Given the tree:
+            Level 0:    N(0,0)
+            Level 1:  N(1,0)   N(1,1)
+            Level 2: N(2,0) N(2,1) N(2,2) N(2,3)
+
+        The value of node N(1,1) is the hash of the values of N(2,2) and N(2,3).
+
+        Refer to the Merkle Tree Diagram Cheat Sheet for a visual representation.
+        """
+        if self._dirty:
+            self._rehash_dirty()
+        return self.layers[level][index]
+
+    def update_leaf(self, index, value):
+        """
+        Update a leaf and the nodes on its merkle path.
+
+        Costs `height` hashes: the new merkle path is computed from the siblings of the leaf and written to the layers.
+
+        Parameters:
+        - index (int): The index of the leaf to update.
+        - value: The new value of the leaf.
+
+        Returns:
+        dict: The delta merkle proof of the update.
+        """
+        self._check_leaf_indices((index,))
+        value = self.encode_leaf(value)
+        old_proof = self.get_merkle_proof(self.height, index)
+        merkle_path = self.compute_merkle_path_from_proof(
+            old_proof["siblings"], index, value
+        )
+        for position, node in enumerate(merkle_path):
+            self.layers[self.height - position][index >> position] = node
+        return {
+            "index": index,
+            "siblings": old_proof["siblings"],
+            "oldRoot": old_proof["root"],
+            "oldValue": old_proof["value"],
+            "newRoot": merkle_path[-1],
+            "newValue": value,
+        }
+
+    def update_leaves(self, leaves, return_proofs=False):
+        """
+        Update many leaves.
+
+        Without proofs, the leaves are only marked dirty, and their ancestors are rehashed level by level on the next read,
+        e.g. `root()` or `get_merkle_proof`, so an ancestor shared by many updated leaves, even across many calls, is hashed once.
+
+        Parameters:
+        - leaves (dict): Mapping of leaf index to the new value of that leaf.
+        - return_proofs (bool): If True, the updates are applied one by one with `update_leaf`,
+          and their delta merkle proofs are returned in the order of `leaves`.
+
+        Returns:
+        list: The delta merkle proofs if return_proofs is True, otherwise None.
+        """
+        self._check_leaf_indices(leaves)
+        if return_proofs:
+            return [self.update_leaf(index, value) for index, value in leaves.items()]
+        bottom_layer = self.layers[self.height]
+        for index, value in leaves.items():
+            bottom_layer[index] = self.encode_leaf(value)
+            self._dirty.add(index)
+
+    def _rehash_dirty(self):
+        """
+        Rehash the ancestors of the dirty leaves, each exactly once, level by level.
+        """
+        dirty = self._dirty
+        self._dirty = set()
+        for level in range(self.height, 0, -1):
+            children = self.layers[level]
+            parents = list({index // 2 for index in dirty})
+            values = self.hasher.hash_many(
+                (children[2 * parent], children[2 * parent + 1]) for parent in parents
+            )
+            layer = self.layers[level - 1]
+            for parent, value in zip(parents, values):
+                layer[parent] = value
+            dirty = parents
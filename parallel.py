@@ -0,0 +1,185 @@
+"""
+Multi-process tree construction and proof generation.
+
+The leaves of a tree of height h split into 2**s independent subtrees of height h - s,
+so their levels can be hashed by different processes. The subtrees are then merged level by level,
+and the top s levels are hashed in the parent process. Results are identical to the serial code paths.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+_worker_tree = None
+
+
+def _split_level(height: int, processes: int) -> int:
+    """
+    The level at which the tree is split into subtrees: the smallest power of two subtrees that
+    gives every process a subtree, without splitting below the leaves.
+    """
+    return min(height, max(0, processes - 1).bit_length())
+
+
+def _build_subtree_layers(hasher, leaves):
+    """
+    Build the levels above the leaves of a dense subtree, from the bottom up.
+    """
+    layers = []
+    nodes = leaves
+    while len(nodes) > 1:
+        nodes = hasher.hash_many(zip(nodes[0::2], nodes[1::2]))
+        layers.append(nodes)
+    return layers
+
+
+def build_layers(height: int, leaves: list, hasher, processes: int = None) -> list:
+    """
+    Build every level of a MerkleTree, hashing independent subtrees in parallel.
+
+    Args:
+    - height (int): The height of the tree.
+    - leaves (list): The 2**height leaves of the tree, in the tree's node format.
+    - hasher (HashBackend): The hash backend of the tree.
+    - processes (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    - list: The levels of the tree, where layers[level][index] is the value of N(level, index).
+    """
+    processes = processes or os.cpu_count() or 1
+    split_level = _split_level(height, processes)
+    subtree_size = 2 ** (height - split_level)
+    chunks = [leaves[i : i + subtree_size] for i in range(0, len(leaves), subtree_size)]
+
+    layers = [None] * (height + 1)
+    layers[height] = list(leaves)
+    with ProcessPoolExecutor(processes) as executor:
+        subtree_layers = list(
+            executor.map(_build_subtree_layers, [hasher] * len(chunks), chunks)
+        )
+    # merge the levels of the subtrees, which are side by side in the tree
+    for offset in range(height - split_level):
+        layers[height - offset - 1] = [
+            node for subtree in subtree_layers for node in subtree[offset]
+        ]
+    for level in range(split_level - 1, -1, -1):
+        children = layers[level + 1]
+        layers[level] = hasher.hash_many(zip(children[0::2], children[1::2]))
+    return layers
+
+
+def build_sparse_levels(hasher, zero_hashes, height, nodes, level=None, top_level=0):
+    """
+    Compute the non-empty nodes of a sparse tree from its non-empty nodes on one level, bottom-up.
+
+    Each non-empty node is hashed exactly once, and missing siblings are zero hashes.
+
+    Args:
+    - hasher (HashBackend): The hash backend of the tree.
+    - zero_hashes (list): The zero hashes of the tree.
+    - height (int): The height of the tree.
+    - nodes (dict): Mapping of node index to node value of the non-empty nodes, in the tree's node format.
+    - level (int): The level of the nodes. Defaults to the leaves.
+    - top_level (int): The highest level to compute.
+
+    Returns:
+    - dict: Mapping of level to the {index: value} mapping of the non-empty nodes of that level.
+    """
+    if level is None:
+        level = height
+    levels = {level: nodes}
+    for current_level in range(level, top_level, -1):
+        zero_hash = zero_hashes[height - current_level]
+        parent_indices = sorted({index // 2 for index in nodes})
+        pairs = [
+            (
+                nodes.get(2 * parent_index, zero_hash),
+                nodes.get(2 * parent_index + 1, zero_hash),
+            )
+            for parent_index in parent_indices
+        ]
+        nodes = dict(zip(parent_indices, hasher.hash_many(pairs)))
+        levels[current_level - 1] = nodes
+    return levels
+
+
+def load_sparse_levels(hasher, zero_hashes, height, leaves, processes=None):
+    """
+    Compute the non-empty nodes of a sparse tree, hashing independent subtrees in parallel.
+
+    Args:
+    - hasher (HashBackend): The hash backend of the tree.
+    - zero_hashes (list): The zero hashes of the tree.
+    - height (int): The height of the tree.
+    - leaves (dict): Mapping of leaf index to leaf value, in the tree's node format.
+    - processes (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    - dict: Mapping of level to the {index: value} mapping of the non-empty nodes of that level.
+    """
+    processes = processes or os.cpu_count() or 1
+    split_level = _split_level(height, processes)
+    shift = height - split_level
+    shards = {}
+    for index, value in leaves.items():
+        shards.setdefault(index >> shift, {})[index] = value
+
+    shard_leaves = list(shards.values())
+    count = len(shard_leaves)
+    with ProcessPoolExecutor(processes) as executor:
+        shard_levels = list(
+            executor.map(
+                build_sparse_levels,
+                [hasher] * count,
+                [zero_hashes] * count,
+                [height] * count,
+                shard_leaves,
+                [height] * count,
+                [split_level] * count,
+            )
+        )
+
+    levels = {level: {} for level in range(split_level, height + 1)}
+    for subtree_levels in shard_levels:
+        for level, nodes in subtree_levels.items():
+            levels[level].update(nodes)
+    levels.update(
+        build_sparse_levels(
+            hasher, zero_hashes, height, levels[split_level], split_level
+        )
+    )
+    return levels
+
+
+def _init_proof_worker(tree):
+    global _worker_tree
+    _worker_tree = tree
+
+
+def _get_merkle_proofs(level, indices):
+    return _worker_tree.get_merkle_proofs(level, indices)
+
+
+def get_merkle_proofs(tree, level: int, indices: list, processes: int = None) -> list:
+    """
+    Generate the merkle proofs of many nodes, sharding the indices across worker processes.
+
+    Every worker receives a copy of the tree once, so the tree and its node store must be picklable.
+
+    Args:
+    - tree (MerkleTree): The tree to prove nodes of.
+    - level (int): The level of the nodes in the tree.
+    - indices (list): The indexes of the nodes at the given level.
+    - processes (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    - list: The merkle proof of every node, in the order of `indices`.
+    """
+    processes = processes or os.cpu_count() or 1
+    indices = list(indices)
+    chunk_size = max(1, -(-len(indices) // processes))
+    chunks = [indices[i : i + chunk_size] for i in range(0, len(indices), chunk_size)]
+    with ProcessPoolExecutor(
+        processes, initializer=_init_proof_worker, initargs=(tree,)
+    ) as executor:
+        results = executor.map(_get_merkle_proofs, [level] * len(chunks), chunks)
+        return [proof for proofs in results for proof in proofs]
@@ -0,0 +1,313 @@
+"""
+A compact binary wire format for merkle proofs and delta merkle proofs.
+
+Most siblings of a proof of a sparse tree are zero hashes, which the verifier can compute itself.
+A proof is encoded as:
+- a kind byte: MERKLE_PROOF or DELTA_MERKLE_PROOF,
+- the index and the number of siblings, as varints,
+- a bitmap with a bit set for every sibling that is a zero hash, from the first sibling up,
+- the siblings that aren't zero hashes,
+- the root and value of a merkle proof, or the old root, new root, old value and new value of a delta merkle proof.
+
+In binary mode nodes are their 32 bytes. In hex mode, where leaves can be any integer or text,
+every node starts with a tag byte: a hex digest is written as its 32 bytes, an integer as a zigzag varint,
+and text as its varint length and UTF-8 bytes. Decoding gives back proofs equal to the encoded ones.
+
+A stream of proofs is a sequence of encoded proofs, each prefixed by its varint length.
+"""
+
+from hashing import NODE_SIZE, get_backend, zero_hashes
+
+MERKLE_PROOF = 0
+DELTA_MERKLE_PROOF = 1
+
+_TAG_DIGEST = 0
+_TAG_INT = 1
+_TAG_TEXT = 2
+
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buffer, offset: int):
+    value = shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _is_hex_digest(node) -> bool:
+    return (
+        isinstance(node, str)
+        and len(node) == 2 * NODE_SIZE
+        and _HEX_DIGITS.issuperset(node)
+    )
+
+
+class ProofCodec:
+    """
+    Encodes and decodes the proofs of the trees of one height, node format and hash backend.
+    """
+
+    def __init__(self, height, binary=False, hash_backend=None):
+        """
+        Args:
+        - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests, otherwise they are hex mode nodes.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        """
+        hasher = get_backend(hash_backend, binary)
+        self.height = height
+        self.binary = hasher.binary
+        self.zero_hashes = zero_hashes(hasher, height)
+
+    def _write_node(self, out: bytearray, node):
+        if self.binary:
+            if len(node) != NODE_SIZE:
+                raise ValueError(
+                    f"Binary nodes must be {NODE_SIZE} bytes, got {len(node)}"
+                )
+            out += node
+        elif _is_hex_digest(node):
+            out.append(_TAG_DIGEST)
+            out += bytes.fromhex(node)
+        elif isinstance(node, int) and not isinstance(node, bool):
+            out.append(_TAG_INT)
+            # zigzag encoding maps negative integers to odd varints
+            _write_varint(out, node * 2 if node >= 0 else -node * 2 - 1)
+        elif isinstance(node, str):
+            data = node.encode("utf-8")
+            out.append(_TAG_TEXT)
+            _write_varint(out, len(data))
+            out += data
+        else:
+            raise TypeError(f"Can't encode a node of type {type(node).__name__}")
+
+    def _read_node(self, buffer, offset: int):
+        if self.binary:
+            end = offset + NODE_SIZE
+            if end > len(buffer):
+                raise ValueError("The proof is truncated")
+            return bytes(buffer[offset:end]), end
+        tag = buffer[offset]
+        offset += 1
+        if tag == _TAG_DIGEST:
+            end = offset + NODE_SIZE
+            if end > len(buffer):
+                raise ValueError("The proof is truncated")
+            return buffer[offset:end].hex(), end
+        if tag == _TAG_INT:
+            value, offset = _read_varint(buffer, offset)
+            return (value >> 1 if value % 2 == 0 else -((value + 1) >> 1)), offset
+        if tag == _TAG_TEXT:
+            length, offset = _read_varint(buffer, offset)
+            end = offset + length
+            if end > len(buffer):
+                raise ValueError("The proof is truncated")
+            return str(buffer[offset:end], "utf-8"), end
+        raise ValueError(f"Unknown node tag {tag}")
+
+    def encode(self, proof: dict) -> bytes:
+        """
+        Encode a merkle proof or a delta merkle proof.
+
+        Args:
+        - proof (dict): The proof, as returned by `get_merkle_proof`, `get_delta_merkle_proof` or `set_leaf`.
+
+        Returns:
+        - bytes: The encoded proof.
+        """
+        out = bytearray()
+        self._encode_into(out, proof)
+        return bytes(out)
+
+    def _encode_into(self, out: bytearray, proof: dict):
+        siblings = proof["siblings"]
+        if len(siblings) > self.height:
+            raise ValueError(
+                f"A proof of a tree of height {self.height} has at most {self.height} siblings"
+            )
+        delta = "newRoot" in proof
+        out.append(DELTA_MERKLE_PROOF if delta else MERKLE_PROOF)
+        _write_varint(out, proof["index"])
+        _write_varint(out, len(siblings))
+
+        # a proof of a node above the leaves has fewer siblings, starting at a higher level
+        offset = self.height - len(siblings)
+        bitmap = bytearray((len(siblings) + 7) // 8)
+        nodes = bytearray()
+        for position, sibling in enumerate(siblings):
+            zero_hash = self.zero_hashes[offset + position]
+            # compare the types too, so that e.g. False or 0.0 aren't encoded as the zero leaf 0 of hex mode
+            if type(sibling) is type(zero_hash) and sibling == zero_hash:
+                bitmap[position // 8] |= 1 << (position % 8)
+            else:
+                self._write_node(nodes, sibling)
+        out += bitmap
+        out += nodes
+
+        if delta:
+            keys = ("oldRoot", "newRoot", "oldValue", "newValue")
+        else:
+            keys = ("root", "value")
+        for key in keys:
+            self._write_node(out, proof[key])
+
+    def decode(self, buffer, offset: int = 0):
+        """
+        Decode a proof without copying the buffer, e.g. a memory map of many proofs.
+
+        Args:
+        - buffer (bytes-like): The buffer the proof is in.
+        - offset (int): The position of the proof in the buffer.
+
+        Returns:
+        - tuple: The proof, and the position right after it in the buffer.
+        """
+        buffer = memoryview(buffer)
+        try:
+            kind = buffer[offset]
+            index, offset = _read_varint(buffer, offset + 1)
+            count, offset = _read_varint(buffer, offset)
+        except IndexError:
+            raise ValueError("The proof is truncated") from None
+        if kind not in (MERKLE_PROOF, DELTA_MERKLE_PROOF):
+            raise ValueError(f"Unknown proof kind {kind}")
+        if count > self.height:
+            raise ValueError(
+                f"A proof of a tree of height {self.height} has at most {self.height} siblings"
+            )
+
+        bitmap = buffer[offset : offset + (count + 7) // 8]
+        offset += len(bitmap)
+        zero_offset = self.height - count
+        siblings = []
+        try:
+            for position in range(count):
+                if bitmap[position // 8] >> (position % 8) & 1:
+                    siblings.append(self.zero_hashes[zero_offset + position])
+                else:
+                    sibling, offset = self._read_node(buffer, offset)
+                    siblings.append(sibling)
+
+            if kind == DELTA_MERKLE_PROOF:
+                old_root, offset = self._read_node(buffer, offset)
+                new_root, offset = self._read_node(buffer, offset)
+                old_value, offset = self._read_node(buffer, offset)
+                new_value, offset = self._read_node(buffer, offset)
+                proof = {
+                    "index": index,
+                    "siblings": siblings,
+                    "oldRoot": old_root,
+                    "oldValue": old_value,
+                    "newValue": new_value,
+                    "newRoot": new_root,
+                }
+            else:
+                root, offset = self._read_node(buffer, offset)
+                value, offset = self._read_node(buffer, offset)
+                proof = {
+                    "root": root,
+                    "siblings": siblings,
+                    "index": index,
+                    "value": value,
+                }
+        except IndexError:
+            raise ValueError("The proof is truncated") from None
+        return proof, offset
+
+    def encode_stream(self, proofs) -> bytes:
+        """
+        Encode many proofs as a stream.
+
+        Args:
+        - proofs (iterable): The proofs.
+
+        Returns:
+        - bytes: The length-prefixed encoded proofs.
+        """
+        out = bytearray()
+        for record in self.iter_encode(proofs):
+            out += record
+        return bytes(out)
+
+    def iter_encode(self, proofs):
+        """
+        Encode proofs one at a time, e.g. to write them to a file or socket as they are generated.
+
+        Args:
+        - proofs (iterable): The proofs.
+
+        Yields:
+        - bytes: Every proof, encoded and prefixed by its varint length.
+        """
+        for proof in proofs:
+            encoded = bytearray()
+            self._encode_into(encoded, proof)
+            record = bytearray()
+            _write_varint(record, len(encoded))
+            record += encoded
+            yield bytes(record)
+
+    def iter_decode(self, buffer):
+        """
+        Decode a stream of proofs one at a time, without copying the buffer.
+
+        Args:
+        - buffer (bytes-like): The stream, e.g. the result of `encode_stream` or a memory map of a file of proofs.
+
+        Yields:
+        - dict: The proofs, in order.
+        """
+        buffer = memoryview(buffer)
+        offset = 0
+        while offset < len(buffer):
+            length, offset = _read_varint(buffer, offset)
+            end = offset + length
+            if end > len(buffer):
+                raise ValueError("The stream ends with a truncated proof")
+            proof, proof_end = self.decode(buffer[:end], offset)
+            if proof_end != end:
+                raise ValueError(f"The proof at offset {offset} has trailing bytes")
+            offset = end
+            yield proof
+
+    def read_proofs(self, file):
+        """
+        Decode a stream of proofs from a binary file, reading one proof at a time.
+
+        Args:
+        - file: A file opened in binary mode.
+
+        Yields:
+        - dict: The proofs, in order.
+        """
+        while True:
+            length = shift = 0
+            while True:
+                byte = file.read(1)
+                if not byte:
+                    if shift:
+                        raise ValueError("The stream ends with a truncated proof")
+                    return
+                length |= (byte[0] & 0x7F) << shift
+                shift += 7
+                if byte[0] < 0x80:
+                    break
+            record = file.read(length)
+            if len(record) != length:
+                raise ValueError("The stream ends with a truncated proof")
+            proof, end = self.decode(record)
+            if end != length:
+                raise ValueError("A proof of the stream has trailing bytes")
+            yield proof
@@ -0,0 +1,190 @@
+"""
+An asyncio front end that serves the proofs and updates of a ZeroMerkleTree to many concurrent clients.
+
+Requests are queued and handled by a single worker task in arrival order, in batches:
+- consecutive writes are applied with one `set_leaves(..., return_proofs=True)` call,
+  which hashes each node once per update but writes it to the node store once per batch,
+- consecutive reads are all against the same root, and are served by the tree's own `get_leaf`,
+  so they use its proof cache, snapshot isolation or fast paths, if it has any.
+Every request still gets its own result, exactly as the equivalent sequence of `set_leaf` and `get_leaf` calls returns it.
+
+The queue is bounded, so clients wait to submit requests when the worker falls behind.
+The tree is updated on the event loop thread, so it must not be used by anything else while the service runs.
+"""
+
+import asyncio
+
+_READ = 0
+_WRITE = 1
+
+
+class ProofService:
+    """
+    Serve `get_leaf` and `set_leaf` requests against a tree, coalescing concurrent requests into batches.
+    """
+
+    def __init__(
+        self,
+        tree,
+        batch_window: float = 0.0,
+        max_batch_size: int = 1024,
+        max_pending: int = 10_000,
+    ):
+        """
+        Args:
+        - tree (ZeroMerkleTree): The tree to serve.
+        - batch_window (float): Seconds to keep collecting requests after the first request of a batch was submitted.
+          The default batches the requests that are already queued, which adds no latency.
+        - max_batch_size (int): Maximum number of requests handled in one batch.
+        - max_pending (int): Maximum number of queued requests, beyond which submitting a request waits.
+        """
+        self.tree = tree
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_pending = max_pending
+        self._queue = None
+        self._worker = None
+        self.batches = 0
+        self.requests = 0
+
+    async def start(self):
+        """
+        Start the worker task. Must be called from the event loop that submits requests.
+        """
+        if self._worker is not None:
+            raise RuntimeError("The service is already running")
+        self._queue = asyncio.Queue(self.max_pending)
+        self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Handle the queued requests and stop the worker task.
+        """
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _submit(self, kind, index, value=None):
+        if self._worker is None:
+            raise RuntimeError("The service isn't running")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((kind, index, value, future, loop.time()))
+        return await future
+
+    async def get_leaf(self, index: int) -> dict:
+        """
+        Get the merkle proof of a leaf.
+
+        Args:
+        - index (int): The index of the leaf.
+
+        Returns:
+        - dict: The merkle proof, against the root after every write submitted before it.
+        """
+        return await self._submit(_READ, index)
+
+    async def set_leaf(self, index: int, value) -> dict:
+        """
+        Set a leaf.
+
+        Args:
+        - index (int): The index of the leaf to set.
+        - value: The value to set for the leaf.
+
+        Returns:
+        - dict: The delta merkle proof of the update.
+        """
+        return await self._submit(_WRITE, index, value)
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        # the window starts when the first request was submitted, so requests that queued up
+        # while the worker was busy don't wait any longer
+        deadline = batch[0][4] + self.batch_window
+        while len(batch) < self.max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                self._handle(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            self.batches += 1
+            self.requests += len(batch)
+
+    def _handle(self, batch: list):
+        """
+        Split a batch into runs of reads and runs of writes to distinct leaves, and handle every run in one call.
+        """
+        run = []
+        run_kind = None
+        run_indices = set()
+        for request in batch:
+            kind, index = request[0], request[1]
+            # a write run ends at a second write to the same leaf, since set_leaves takes one value per leaf
+            if run and (kind != run_kind or (kind == _WRITE and index in run_indices)):
+                self._handle_run(run_kind, run)
+                run, run_indices = [], set()
+            run.append(request)
+            run_kind = kind
+            run_indices.add(index)
+        if run:
+            self._handle_run(run_kind, run)
+
+    def _handle_run(self, kind, run: list):
+        try:
+            if kind == _WRITE:
+                results = self.tree.set_leaves(
+                    {index: value for _, index, value, _, _ in run}, return_proofs=True
+                )
+            else:
+                results = self._read_proofs([index for _, index, _, _, _ in run])
+        except Exception as error:
+            if len(run) == 1:
+                future = run[0][3]
+                if not future.done():
+                    future.set_exception(error)
+                return
+            # handle the requests one by one, so only the failing ones get the error
+            for request in run:
+                self._handle_run(kind, [request])
+            return
+        for request, result in zip(run, results):
+            future = request[3]
+            if not future.done():
+                future.set_result(result)
+
+    def _read_proofs(self, indices: list) -> list:
+        """
+        Get the merkle proofs of many leaves with the tree's `get_leaf`.
+        """
+        get_leaf = self.tree.get_leaf
+        return [get_leaf(index) for index in indices]
@@ -0,0 +1,197 @@
+import sqlite3
+
+from zero_merkle_tree import NodeStore
+
+# Integers outside this range don't fit in an SQLite integer.
+_SQLITE_INT_MIN, _SQLITE_INT_MAX = -(2**63), 2**63 - 1
+
+
+class SqliteNodeStore(NodeStore):
+    """
+    A node store persisted in an SQLite database file.
+
+    Writes are buffered in memory and written to the database in a single transaction by `commit`,
+    which the trees call once per `set_leaf` or `set_leaves` batch.
+    Reads go through SQLite's page cache and, for the first `mmap_size` bytes of the database, a memory map,
+    so the tree doesn't have to fit in memory.
+
+    Missing nodes fall back to the zero hashes, exactly like the in-memory NodeStore,
+    and nodes set back to their zero hash are deleted from the database.
+    """
+
+    def __init__(
+        self,
+        path,
+        height,
+        binary=False,
+        hash_backend=None,
+        mmap_size=256 * 1024 * 1024,
+        cache_size_kib=64 * 1024,
+    ):
+        """
+        Args:
+        - path (str): Path of the database file. It is created if it doesn't exist.
+        - height (int): The height of the tree. Must match the height the database was created with.
+        - binary (bool): If True, nodes are raw 32 byte digests, otherwise they are hex strings.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        - mmap_size (int): Number of bytes of the database file to memory-map for reads.
+        - cache_size_kib (int): Size of SQLite's page cache in KiB.
+        """
+        super().__init__(height, binary, hash_backend)
+        # node indexes can be larger than SQLite integers, so they are stored as fixed-width big-endian blobs
+        self.index_size = max(1, (height + 7) // 8)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        self.connection.execute(f"PRAGMA cache_size = {-int(cache_size_kib)}")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS nodes ("
+                "level INTEGER NOT NULL, idx BLOB NOT NULL, value, "
+                "PRIMARY KEY (level, idx)) WITHOUT ROWID"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)"
+            )
+        try:
+            self._check_meta()
+        except ValueError:
+            self.connection.close()
+            raise
+
+    def _check_meta(self):
+        """
+        Record the tree's parameters in a new database, or check they match the ones of an existing database.
+        """
+        expected = {
+            "height": self.height,
+            "hash_backend": self.hasher.name,
+            "binary": int(self.hasher.binary),
+        }
+        stored = dict(self.connection.execute("SELECT key, value FROM meta"))
+        if not stored:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO meta (key, value) VALUES (?, ?)", expected.items()
+                )
+        elif stored != expected:
+            raise ValueError(
+                f"The node store was created with {stored}, but opened with {expected}"
+            )
+
+    def _key(self, index: int) -> bytes:
+        return index.to_bytes(self.index_size, "big")
+
+    @staticmethod
+    def _encode_value(value):
+        # Integers that don't fit in SQLite are stored as their decimal text, which hashes the same in hex mode.
+        if isinstance(value, int) and not _SQLITE_INT_MIN <= value <= _SQLITE_INT_MAX:
+            return str(value)
+        return value
+
+    def set(self, level: int, index: int, value: str):
+        """
+        Buffer the value of the node until the next commit. A node set to its zero hash is deleted on commit.
+
+        Args:
+        - level (int): Level of the node.
+        - index (int): Index of the node.
+        - value (str): Value to set.
+        """
+        if value == self.zero_hashes[self.height - level]:
+            value = None
+        self.nodes[(level, index)] = value
+
+    def set_many(self, level: int, values: dict):
+        """
+        Buffer the values of many nodes on the same level until the next commit.
+
+        Args:
+        - level (int): Level of the nodes.
+        - values (dict): Mapping of node index to the value to set.
+        """
+        zero_hash = self.zero_hashes[self.height - level]
+        self.nodes.update(
+            ((level, index), None if value == zero_hash else value)
+            for index, value in values.items()
+        )
+
+    def get(self, level: int, index: int) -> str:
+        """
+        Get the value of the node, looking at the uncommitted writes first,
+        or return the correct zero hash if it doesn't exist.
+
+        Args:
+        - level (int): Level of the node.
+        - index (int): Index of the node.
+
+        Returns:
+        - str: Node value.
+        """
+        key = (level, index)
+        if key in self.nodes:
+            value = self.nodes[key]
+            # None marks a node that is deleted on commit
+            return self.zero_hashes[self.height - level] if value is None else value
+        row = self.connection.execute(
+            "SELECT value FROM nodes WHERE level = ? AND idx = ?",
+            (level, self._key(index)),
+        ).fetchone()
+        if row is None:
+            return self.zero_hashes[self.height - level]
+        return row[0]
+
+    def level_items(self, level: int):
+        """
+        Get the stored nodes of a level, in ascending index order, committing the buffered nodes first.
+
+        Args:
+        - level (int): Level of the nodes.
+
+        Returns:
+        - iterable: (index, value) pairs of the stored nodes of the level, read lazily from the database.
+        """
+        self.commit()
+        rows = self.connection.execute(
+            "SELECT idx, value FROM nodes WHERE level = ? ORDER BY idx", (level,)
+        )
+        return ((int.from_bytes(index, "big"), value) for index, value in rows)
+
+    def commit(self):
+        """
+        Write the buffered nodes to the database in a single transaction.
+        """
+        if not self.nodes:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM nodes WHERE level = ? AND idx = ?",
+                (
+                    (level, self._key(index))
+                    for (level, index), value in self.nodes.items()
+                    if value is None
+                ),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO nodes (level, idx, value) VALUES (?, ?, ?)",
+                (
+                    (level, self._key(index), self._encode_value(value))
+                    for (level, index), value in self.nodes.items()
+                    if value is not None
+                ),
+            )
+        self.nodes = {}
+
+    def close(self):
+        """
+        Commit the buffered nodes and close the database.
+        """
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,274 @@
+"""
+Compute merkle roots over streams of leaves that don't fit in memory.
+
+The builder consumes leaves one at a time and keeps a frontier of at most one pending node per level,
+so it needs O(height) memory. Inputs shorter than 2**height are padded with the zero hashes.
+Optionally every level is spilled to disk as it is built, so that proofs can be served later by a SpilledMerkleTree.
+"""
+
+import json
+import mmap
+import os
+from array import array
+
+from hashing import NODE_SIZE, get_backend, zero_hashes
+from merkle_tree import BaseMerkleTree
+
+_META_FILE = "meta.json"
+
+
+def read_leaves(path, record_size=None):
+    """
+    Read the leaves of a file one at a time.
+
+    Args:
+    - path (str): Path of the file.
+    - record_size (int): If set, the file is a sequence of fixed-width binary records of this many bytes,
+      which are yielded as bytes. Otherwise every line is a leaf, yielded as text without its line ending.
+
+    Yields:
+    - The leaves of the file, in order.
+    """
+    if record_size is None:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                yield line.rstrip("\r\n")
+        return
+    with open(path, "rb") as file:
+        while True:
+            record = file.read(record_size)
+            if not record:
+                return
+            if len(record) != record_size:
+                raise ValueError(
+                    f"{path} ends with a partial record of {len(record)} bytes"
+                )
+            yield record
+
+
+class _LevelWriter:
+    """
+    Appends the nodes of one level to a file.
+
+    Hashes are written as 32 byte records. Leaves of binary mode trees are 32 bytes too,
+    but leaves of hex mode trees can be any text, so they are written as lines along with an index of their offsets.
+    """
+
+    def __init__(self, directory, level, fixed_width):
+        self.fixed_width = fixed_width
+        self.file = open(os.path.join(directory, f"level_{level}.bin"), "wb")
+        self.offsets = None if fixed_width else array("Q", [0])
+        self.index_path = os.path.join(directory, f"level_{level}.idx")
+        self.count = 0
+
+    def write(self, node):
+        if self.fixed_width:
+            self.file.write(node if isinstance(node, bytes) else bytes.fromhex(node))
+        else:
+            line = f"{node}\n".encode("utf-8")
+            self.file.write(line)
+            self.offsets.append(self.offsets[-1] + len(line))
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+        if self.offsets is not None:
+            with open(self.index_path, "wb") as index_file:
+                self.offsets.tofile(index_file)
+
+
+class StreamingMerkleBuilder:
+    """
+    Build the root of a MerkleTree from a stream of leaves, using O(height) memory.
+    """
+
+    def __init__(self, height, binary=False, hash_backend=None, spill_directory=None):
+        """
+        Args:
+        - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        - spill_directory (str): If set, every level is written to this directory as it is built,
+          so the tree can be opened with SpilledMerkleTree to serve proofs.
+        """
+        self.height = height
+        self.hasher = get_backend(hash_backend, binary)
+        self.zero_hashes = zero_hashes(self.hasher, height)
+        # frontier[level] is the pending left hand node of the level, counting levels from the leaves up
+        self.frontier = [None] * height
+        self.leaf_count = 0
+        self._root = None
+        self._complete_root = None
+        self.spill_directory = spill_directory
+        self._writers = None
+        if spill_directory is not None:
+            os.makedirs(spill_directory, exist_ok=True)
+            self._writers = [
+                _LevelWriter(
+                    spill_directory,
+                    height - level,
+                    fixed_width=level > 0 or self.hasher.binary,
+                )
+                for level in range(height + 1)
+            ]
+
+    def _spill(self, level, node):
+        if self._writers is not None:
+            self._writers[level].write(node)
+
+    def add_leaf(self, value):
+        """
+        Add the next leaf of the tree.
+
+        Args:
+        - value: The value of the leaf.
+        """
+        if self._root is not None:
+            raise ValueError("Leaves can't be added after the root was computed")
+        if self.leaf_count == 2**self.height:
+            raise ValueError(f"A tree of height {self.height} is full")
+        node = self.hasher.encode_leaf(value)
+        self.leaf_count += 1
+        self._spill(0, node)
+
+        # hash the new node with the pending left hand nodes it completes, from the leaves up
+        level = 0
+        while level < self.height and self.frontier[level] is not None:
+            node = self.hasher.hash(self.frontier[level], node)
+            self.frontier[level] = None
+            level += 1
+            self._spill(level, node)
+        if level < self.height:
+            self.frontier[level] = node
+        else:
+            self._complete_root = node
+
+    def add_leaves(self, values):
+        """
+        Add the next leaves of the tree.
+
+        Args:
+        - values (iterable): The values of the leaves.
+        """
+        for value in values:
+            self.add_leaf(value)
+
+    def root(self):
+        """
+        Compute the root, padding the leaves added so far with empty leaves.
+
+        No leaves can be added afterwards. If the levels are spilled, the spill is completed.
+
+        Returns:
+        - The root of the tree.
+        """
+        if self._root is not None:
+            return self._root
+        if self.leaf_count == 2**self.height:
+            # the last leaf of a full tree completed every level up to the root
+            self._root = self._complete_root
+        else:
+            node = None
+            for level in range(self.height):
+                left = self.frontier[level]
+                if left is not None:
+                    right = node if node is not None else self.zero_hashes[level]
+                    node = self.hasher.hash(left, right)
+                elif node is not None:
+                    node = self.hasher.hash(node, self.zero_hashes[level])
+                else:
+                    # there are no pending nodes on this level or below it
+                    continue
+                self._spill(level + 1, node)
+            self._root = node if node is not None else self.zero_hashes[self.height]
+        self._close_spill()
+        return self._root
+
+    def _close_spill(self):
+        if self._writers is None:
+            return
+        for writer in self._writers:
+            writer.close()
+        meta = {
+            "height": self.height,
+            "hash_backend": self.hasher.name,
+            "binary": self.hasher.binary,
+            "counts": [writer.count for writer in reversed(self._writers)],
+        }
+        with open(os.path.join(self.spill_directory, _META_FILE), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+
+def merkle_root(height, leaves, binary=False, hash_backend=None, spill_directory=None):
+    """
+    Compute the root of a MerkleTree over an iterable of at most 2**height leaves, using O(height) memory.
+
+    Args:
+    - height (int): The height of the tree.
+    - leaves (iterable): The leaves, e.g. `read_leaves(path)`. Missing leaves are empty.
+    - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+    - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+    - spill_directory (str): If set, the levels are written to this directory, see SpilledMerkleTree.
+
+    Returns:
+    - The root of the tree.
+    """
+    builder = StreamingMerkleBuilder(height, binary, hash_backend, spill_directory)
+    builder.add_leaves(leaves)
+    return builder.root()
+
+
+class SpilledMerkleTree(BaseMerkleTree):
+    """
+    A read-only MerkleTree whose levels were spilled to disk by a StreamingMerkleBuilder.
+
+    Nodes are read from memory-mapped level files, so only the pages that are read are loaded in memory.
+    Nodes after the last leaf added to the builder are empty, so they are read from the zero hashes.
+    It supports the read operations of MerkleTree, such as `root`, `node` and `get_merkle_proof`.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+        - directory (str): The spill directory passed to the StreamingMerkleBuilder.
+        """
+        with open(os.path.join(directory, _META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        self.height = meta["height"]
+        self.hasher = get_backend(meta["hash_backend"], meta["binary"])
+        self.zero_hashes = zero_hashes(self.hasher, self.height)
+        self.counts = meta["counts"]
+        self._maps = [
+            self._open_map(os.path.join(directory, f"level_{level}.bin"))
+            for level in range(self.height + 1)
+        ]
+        self._leaf_offsets = None
+        if not self.hasher.binary:
+            self._leaf_offsets = array("Q")
+            with open(
+                os.path.join(directory, f"level_{self.height}.idx"), "rb"
+            ) as index:
+                self._leaf_offsets.frombytes(index.read())
+
+    @staticmethod
+    def _open_map(path):
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def node(self, level, index):
+        if index >= self.counts[level]:
+            return self.zero_hashes[self.height - level]
+        level_map = self._maps[level]
+        if level == self.height and self._leaf_offsets is not None:
+            start, end = self._leaf_offsets[index], self._leaf_offsets[index + 1]
+            # drop the line ending
+            return level_map[start : end - 1].decode("utf-8")
+        node = level_map[index * NODE_SIZE : (index + 1) * NODE_SIZE]
+        return node if self.hasher.binary else node.hex()
+
+    def close(self):
+        for level_map in self._maps:
+            if isinstance(level_map, mmap.mmap):
+                level_map.close()
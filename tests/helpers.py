@@ -0,0 +1,22 @@
+from hashing import Sha256Backend
+
+
+class CountingBackend(Sha256Backend):
+    """
+    The sha256 backend, counting the hashes it computes.
+
+    Shared by the tests and `benchmarks.suite`, so both count hashes the same way.
+    """
+
+    def __init__(self, binary=False):
+        super().__init__(binary)
+        self.hashes = 0
+
+    def hash(self, left_node, right_node):
+        self.hashes += 1
+        return super().hash(left_node, right_node)
+
+    def hash_many(self, pairs):
+        parents = super().hash_many(pairs)
+        self.hashes += len(parents)
+        return parents
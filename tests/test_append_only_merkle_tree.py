@@ -1,5 +1,6 @@
 import unittest
 from append_only_merkle_tree import AppendOnlyMerkleTree
+from zero_merkle_tree import ZeroMerkleTree
 
 
 class TestAppendOnlyMerkleTree(unittest.TestCase):
@@ -19,3 +20,104 @@ class TestAppendOnlyMerkleTree(unittest.TestCase):
             self.assertTrue(
                 self.tree.verify_delta_merkle_proof(self.tree.append_leaf(i))
             )
+
+    def test_empty_tree_is_lightweight(self):
+        tree = AppendOnlyMerkleTree(50)
+        self.assertFalse(hasattr(tree, "__dict__"))
+        # the dense tree's slots aren't inherited
+        self.assertFalse(hasattr(AppendOnlyMerkleTree, "layers"))
+        self.assertIs(tree.node_store.zero_hashes, self.tree.node_store.zero_hashes)
+        self.assertEqual(tree.last_proof["index"], -1)
+        self.assertEqual(tree.last_proof["root"], tree.root())
+        self.assertEqual(tree.last_proof["siblings"], tree.node_store.zero_hashes[:50])
+
+    def test_append_leaf_binary_mode(self):
+        tree = AppendOnlyMerkleTree(50, binary=True)
+        for i in range(5):
+            delta = tree.append_leaf(i + 1)
+            self.assertEqual(delta["oldValue"], bytes(32))
+            self.assertTrue(tree.verify_delta_merkle_proof(delta))
+
+    def test_append_leaves_matches_zero_merkle_tree(self):
+        tree = ZeroMerkleTree(50)
+        values = range(1, 40)
+        proofs = self.tree.append_leaves(values)
+        self.assertFalse(isinstance(proofs, list))
+
+        for index, (value, proof) in enumerate(zip(values, proofs)):
+            self.assertEqual(proof, tree.set_leaf(index, value))
+        self.assertEqual(self.tree.last_proof["root"], tree.root())
+
+    def test_append_leaves_continues_append_leaf(self):
+        tree = AppendOnlyMerkleTree(50)
+        expected = [tree.append_leaf(i) for i in range(10)]
+
+        proofs = [self.tree.append_leaf(i) for i in range(3)]
+        proofs.extend(self.tree.append_leaves(range(3, 10)))
+        self.assertEqual(proofs, expected)
+
+    def test_append_batch(self):
+        tree = AppendOnlyMerkleTree(50)
+        tree.append_leaf(1)
+        self.tree.append_leaf(1)
+
+        for batch in ([2], [3, 4, 5], list(range(6, 20))):
+            proof = self.tree.append_batch(batch)
+            deltas = list(tree.append_leaves(batch))
+
+            self.assertEqual(proof["startIndex"], deltas[0]["index"])
+            self.assertEqual(proof["siblings"], deltas[0]["siblings"])
+            self.assertEqual(proof["oldRoot"], deltas[0]["oldRoot"])
+            self.assertEqual(proof["newRoot"], deltas[-1]["newRoot"])
+            self.assertTrue(self.tree.verify_batch_append_proof(proof))
+
+        # appending after a batch continues from the batch's last leaf
+        self.assertEqual(self.tree.append_leaf(20), tree.append_leaf(20))
+
+    def test_update_leaf_is_not_supported(self):
+        self.tree.append_leaf(1)
+        with self.assertRaises(TypeError):
+            self.tree.update_leaf(0, 2)
+        with self.assertRaises(TypeError):
+            self.tree.update_leaves({0: 2})
+
+    def test_append_leaf_beyond_capacity(self):
+        tree = AppendOnlyMerkleTree(2)
+        list(tree.append_leaves([1, 2, 3, 4]))
+        nodes = dict(tree.node_store.nodes)
+        last_proof = tree.last_proof
+        with self.assertRaises(ValueError):
+            tree.append_leaf(5)
+        with self.assertRaises(ValueError):
+            list(tree.append_leaves([5]))
+        self.assertEqual(tree.node_store.nodes, nodes)
+        self.assertIs(tree.last_proof, last_proof)
+
+    def test_append_batch_beyond_capacity(self):
+        tree = AppendOnlyMerkleTree(2)
+        with self.assertRaises(ValueError):
+            tree.append_batch([1, 2, 3, 4, 5])
+        self.assertEqual(tree.last_proof["index"], -1)
+
+        tree.append_leaf(1)
+        root = tree.root()
+        with self.assertRaises(ValueError):
+            tree.append_batch([2, 3, 4, 5])
+        self.assertEqual(tree.root(), root)
+        self.assertTrue(tree.verify_batch_append_proof(tree.append_batch([2, 3, 4])))
+
+    def test_batch_append_proof_verification_fails(self):
+        list(self.tree.append_leaves([1, 2, 3]))
+        proof = self.tree.append_batch([4, 5])
+
+        self.assertFalse(
+            self.tree.verify_batch_append_proof(dict(proof, newValues=[4, 6]))
+        )
+        self.assertFalse(self.tree.verify_batch_append_proof(dict(proof, startIndex=4)))
+
+        # a right hand sibling would mean the old tree already had leaves after the start index
+        siblings = list(proof["siblings"])
+        siblings[2] = proof["oldRoot"]
+        self.assertFalse(
+            self.tree.verify_batch_append_proof(dict(proof, siblings=siblings))
+        )
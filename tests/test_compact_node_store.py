@@ -0,0 +1,62 @@
+import random
+import unittest
+from compact_node_store import CompactNodeStore, _NodeTable, memory_report
+from zero_merkle_tree import ZeroMerkleTree
+
+
+class TestNodeTable(unittest.TestCase):
+    def test_set_get_delete_and_grow(self):
+        table = _NodeTable(bits=2)
+        values = {key: key.to_bytes(32, "big") for key in range(1, 200)}
+        for key, value in values.items():
+            table.set(key, value)
+        self.assertEqual(len(table), len(values))
+        for key, value in values.items():
+            self.assertEqual(table.get(key), value)
+
+        for key in range(1, 100):
+            table.delete(key)
+        self.assertIsNone(table.get(50))
+        self.assertEqual(table.get(150), values[150])
+        self.assertEqual(dict(table.items()), {k: values[k] for k in range(100, 200)})
+
+        table.set(150, bytes(32))
+        self.assertEqual(table.get(150), bytes(32))
+        self.assertEqual(len(table), 100)
+
+    def test_rejects_values_of_the_wrong_size(self):
+        with self.assertRaises(ValueError):
+            _NodeTable().set(1, b"short")
+
+
+class TestCompactNodeStore(unittest.TestCase):
+    def test_set_and_get(self):
+        node_store = CompactNodeStore(height=4)
+        node_store.set(2, 3, b"\x01" * 32)
+        self.assertEqual(node_store.get(2, 3), b"\x01" * 32)
+
+        # Ensure we get the correct zero hash for non-existent nodes.
+        self.assertEqual(node_store.get(1, 1), node_store.zero_hashes[3])
+
+    def test_height_limit(self):
+        with self.assertRaises(ValueError):
+            CompactNodeStore(height=63)
+
+    def test_tree_matches_dict_store(self):
+        leaves = {index: index for index in random.Random(1).sample(range(2**32), 50)}
+        tree = ZeroMerkleTree(32, binary=True)
+        compact_tree = ZeroMerkleTree(32, node_store=CompactNodeStore(32))
+        tree.set_leaves(leaves)
+        compact_tree.set_leaves(leaves)
+        delta = compact_tree.set_leaf(7, 99)
+
+        self.assertEqual(delta, tree.set_leaf(7, 99))
+        self.assertEqual(compact_tree.root(), tree.root())
+
+        report = memory_report(
+            {"dict": tree.node_store, "compact": compact_tree.node_store}
+        )
+        self.assertEqual(report["dict"]["nodes"], report["compact"]["nodes"])
+        self.assertLess(
+            report["compact"]["bytes_per_node"], report["dict"]["bytes_per_node"]
+        )
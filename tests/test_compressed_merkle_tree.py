@@ -0,0 +1,52 @@
+import random
+import unittest
+from compressed_merkle_tree import CompressedZeroMerkleTree
+from zero_merkle_tree import ZeroMerkleTree
+
+
+class TestCompressedZeroMerkleTree(unittest.TestCase):
+    def test_matches_zero_merkle_tree(self):
+        for binary in (False, True):
+            rng = random.Random(3)
+            tree = CompressedZeroMerkleTree(12, binary)
+            expected = ZeroMerkleTree(12, binary)
+            indices = [rng.randrange(2**12) for _ in range(20)]
+            for _ in range(200):
+                index, value = rng.choice(indices), rng.choice([0, rng.randrange(100)])
+                self.assertEqual(
+                    tree.set_leaf(index, value), expected.set_leaf(index, value)
+                )
+                other = rng.randrange(2**12)
+                self.assertEqual(
+                    tree.get_merkle_proof(12, other),
+                    expected.get_merkle_proof(12, other),
+                )
+                level = rng.randrange(13)
+                index = rng.randrange(2**level)
+                self.assertEqual(tree.node(level, index), expected.node(level, index))
+            self.assertEqual(list(tree.iter_leaves()), list(expected.iter_leaves()))
+
+    def test_stores_nodes_per_leaf_independently_of_height(self):
+        tree = CompressedZeroMerkleTree(50)
+        leaves = {index * 2**40: index + 1 for index in range(10)}
+        proofs = tree.set_leaves(leaves, return_proofs=True)
+        self.assertEqual(len(tree.nodes), 2 * len(leaves) - 1)
+        for proof in proofs:
+            self.assertTrue(tree.verify_delta_merkle_proof(proof))
+
+        for index in leaves:
+            tree.set_leaf(index, 0)
+        self.assertEqual(tree.nodes, {})
+        self.assertEqual(tree.root(), ZeroMerkleTree(50).root())
+
+    def test_from_leaves(self):
+        leaves = {3: 1, 40: 2, 41: 3, 900: 4}
+        tree = CompressedZeroMerkleTree.from_leaves(10, sorted(leaves.items()), True)
+        expected = ZeroMerkleTree(10, True)
+        expected.set_leaves(leaves)
+        self.assertEqual(tree.root(), expected.root())
+        self.assertEqual(list(tree.iter_leaves()), list(expected.iter_leaves()))
+
+        for items in ([(40, 2), (3, 1)], [(3, 1), (3, 2)], [(2**10, 1)]):
+            with self.assertRaises(ValueError):
+                CompressedZeroMerkleTree.from_leaves(10, items)
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from hashing import (
+    BACKENDS,
+    NODE_SIZE,
+    Blake2bBackend,
+    Sha256Backend,
+    encode_leaf,
+    get_backend,
+    load_zero_hashes,
+    proof_from_hex,
+    proof_to_hex,
+    save_zero_hashes,
+    zero_hashes,
+)
+from helpers import CountingBackend
+from merkle_tree import MerkleTree
+from zero_merkle_tree import NodeStore, ZeroMerkleTree
+
+
+def available_backends():
+    for backend in BACKENDS.values():
+        try:
+            yield backend()
+        except ImportError:
+            continue
+
+
+class TestHashing(unittest.TestCase):
+    def test_sha256_hex(self):
+        backend = Sha256Backend()
+        self.assertEqual(backend.hash(1, "ab"), hashlib.sha256(b"1ab").hexdigest())
+
+    def test_sha256_binary(self):
+        backend = Sha256Backend(binary=True)
+        left, right = bytes(NODE_SIZE), b"\x01" * NODE_SIZE
+        self.assertEqual(
+            backend.hash(left, right), hashlib.sha256(left + right).digest()
+        )
+        self.assertEqual(len(backend.hash(left, right)), NODE_SIZE)
+
+    def test_hash_many_matches_hash(self):
+        for available_backend in available_backends():
+            for binary in (False, True):
+                backend = get_backend(available_backend.name, binary)
+                pairs = [(encode_leaf(i), encode_leaf(i + 1)) for i in range(4)]
+                self.assertEqual(
+                    backend.hash_many(pairs),
+                    [backend.hash(left, right) for left, right in pairs],
+                )
+
+    def test_get_backend(self):
+        self.assertEqual(get_backend(), Sha256Backend())
+        self.assertEqual(get_backend("blake2b", binary=True), Blake2bBackend(True))
+
+        backend = Blake2bBackend(binary=True)
+        self.assertIs(get_backend(backend, binary=True), backend)
+
+        with self.assertRaises(ValueError):
+            get_backend("md5")
+        with self.assertRaises(ValueError):
+            get_backend(Blake2bBackend(), binary=True)
+
+    def test_trees_agree_on_every_backend(self):
+        for backend in available_backends():
+            tree = ZeroMerkleTree(3, hash_backend=backend.name)
+            tree.set_leaf(2, 5)
+            self.assertEqual(
+                MerkleTree(
+                    3, [0, 0, 5, 0, 0, 0, 0, 0], hash_backend=backend.name
+                ).root(),
+                tree.root(),
+            )
+
+    def test_encode_leaf(self):
+        self.assertEqual(encode_leaf(0), bytes(NODE_SIZE))
+        self.assertEqual(encode_leaf(258), bytes(NODE_SIZE - 2) + b"\x01\x02")
+        self.assertEqual(encode_leaf(b"\x07" * NODE_SIZE), b"\x07" * NODE_SIZE)
+
+        with self.assertRaises(ValueError):
+            encode_leaf(-1)
+        with self.assertRaises(ValueError):
+            encode_leaf(b"short")
+        with self.assertRaises(TypeError):
+            encode_leaf("text")
+
+    def test_proof_hex_round_trip(self):
+        tree = MerkleTree(2, [1, 2, 3, 4], binary=True)
+        proof = tree.get_merkle_proof(2, 1)
+
+        hex_proof = proof_to_hex(proof)
+        self.assertEqual(hex_proof["root"], tree.root().hex())
+        self.assertEqual(hex_proof["index"], 1)
+        self.assertTrue(all(isinstance(node, str) for node in hex_proof["siblings"]))
+
+        self.assertEqual(proof_from_hex(hex_proof), proof)
+        self.assertTrue(tree.verify_merkle_proof(proof_from_hex(hex_proof)))
+
+    def test_range_proof_hex_round_trip(self):
+        tree = ZeroMerkleTree(8, binary=True)
+        tree.set_leaves({3: 1, 9: 2})
+        for start, end in [(2, 12), (100, 200)]:
+            proof = tree.get_range_proof(start, end)
+            hex_proof = proof_to_hex(proof)
+            self.assertEqual(
+                hex_proof["values"],
+                {index: value.hex() for index, value in proof["values"].items()},
+            )
+            self.assertTrue(
+                all(
+                    isinstance(node, str)
+                    for node in hex_proof["leftSiblings"] + hex_proof["rightSiblings"]
+                )
+            )
+            self.assertEqual(proof_from_hex(hex_proof), proof)
+            self.assertTrue(tree.verify_range_proof(proof_from_hex(hex_proof)))
+
+    def test_proof_hex_conversion_rejects_other_nodes(self):
+        binary_proof = MerkleTree(2, [1, 2, 3, 4], binary=True).get_merkle_proof(2, 1)
+        hex_mode_tree = ZeroMerkleTree(4)
+        hex_mode_tree.set_leaf(3, 7)
+        # a hex mode proof has the int leaf 0 among its siblings
+        hex_mode_proof = hex_mode_tree.get_merkle_proof(4, 3)
+        self.assertIn(0, hex_mode_proof["siblings"])
+
+        with self.assertRaises(ValueError):
+            proof_from_hex(hex_mode_proof)
+        with self.assertRaises(ValueError):
+            proof_to_hex(hex_mode_proof)
+        with self.assertRaises(ValueError):
+            proof_from_hex(binary_proof)
+        with self.assertRaises(ValueError):
+            proof_from_hex(dict(proof_to_hex(binary_proof), root="zz" * 32))
+
+    def test_zero_hashes_are_shared_and_extended(self):
+        # a backend type of its own, whose zero hashes no other test computed yet
+        class FreshBackend(CountingBackend):
+            pass
+
+        hasher = FreshBackend(binary=True)
+        table = zero_hashes(hasher, 4)
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table[1], hashlib.sha256(bytes(64)).digest())
+        other = FreshBackend(binary=True)
+        self.assertIs(zero_hashes(other, 4), table)
+        self.assertEqual((hasher.hashes, other.hashes), (4, 0))
+
+        # a taller table only computes the missing levels
+        self.assertEqual(zero_hashes(hasher, 10)[:5], table)
+        self.assertEqual(hasher.hashes, 10)
+        self.assertEqual(NodeStore(10, hash_backend=hasher).zero_hashes[4], table[4])
+        self.assertEqual(hasher.hashes, 10)
+
+    def test_zero_hash_table_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "zero_hashes.txt")
+            for binary in (False, True):
+                hasher = get_backend("blake2b", binary)
+                save_zero_hashes(path, hasher, 16)
+                self.assertEqual(load_zero_hashes(path, hasher), 16)
+                self.assertEqual(
+                    NodeStore(16, binary, "blake2b").zero_hashes,
+                    zero_hashes(hasher, 16),
+                )
+                with self.assertRaises(ValueError):
+                    load_zero_hashes(path, get_backend("sha256", binary))
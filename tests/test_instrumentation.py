@@ -0,0 +1,89 @@
+import unittest
+import instrumentation
+from append_only_merkle_tree import AppendOnlyMerkleTree
+from hashing import Sha256Backend
+from zero_merkle_tree import NodeStore, ZeroMerkleTree
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled_by_default(self):
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertNotIn("__wrapped__", vars(Sha256Backend.hash))
+        ZeroMerkleTree(4).set_leaf(3, 10)
+        self.assertEqual(instrumentation.snapshot(), {})
+
+    def test_disable_restores_methods(self):
+        original = (Sha256Backend.hash, NodeStore.get, ZeroMerkleTree.set_leaf)
+        instrumentation.enable()
+        self.assertNotEqual(ZeroMerkleTree.set_leaf, original[2])
+        instrumentation.disable()
+        self.assertEqual(
+            (Sha256Backend.hash, NodeStore.get, ZeroMerkleTree.set_leaf), original
+        )
+
+    def test_set_leaf_counters(self):
+        tree = ZeroMerkleTree(8)
+        instrumentation.enable()
+        tree.set_leaf(3, 10)
+        stats = instrumentation.snapshot()["set_leaf"]
+        self.assertEqual(stats["calls"], 1)
+        self.assertEqual(stats["hashes"], 8)
+        self.assertEqual(stats["node_sets"], 9)
+        # the leaf and all its siblings are empty
+        self.assertGreaterEqual(stats["zero_gets"], 9)
+        self.assertGreaterEqual(stats["node_gets"], stats["zero_gets"])
+        self.assertEqual(stats["latency_histogram"][float("inf")], 1)
+
+    def test_nested_operations_count_once(self):
+        tree = ZeroMerkleTree(8)
+        tree.set_leaf(3, 10)
+        instrumentation.enable()
+        tree.get_leaf(3)
+        stats = instrumentation.snapshot()
+        self.assertEqual(stats["get_leaf"]["calls"], 1)
+        self.assertNotIn("get_merkle_proof", stats)
+
+    def test_append_leaf(self):
+        tree = AppendOnlyMerkleTree(8)
+        instrumentation.enable()
+        for value in range(1, 5):
+            tree.append_leaf(value)
+        stats = instrumentation.snapshot()["append_leaf"]
+        self.assertEqual(stats["calls"], 4)
+        self.assertGreater(stats["hashes"], 0)
+
+    def test_scope(self):
+        tree = ZeroMerkleTree(8)
+        with instrumentation.scope() as first:
+            tree.set_leaf(3, 10)
+        self.assertFalse(instrumentation.is_enabled())
+        instrumentation.enable()
+        tree.set_leaf(4, 10)
+        with instrumentation.scope() as second:
+            tree.set_leaves({5: 1, 6: 2})
+        self.assertTrue(instrumentation.is_enabled())
+        self.assertEqual(set(first.snapshot()), {"set_leaf"})
+        self.assertEqual(set(second.snapshot()), {"set_leaves"})
+        # the global stats record everything done while enabled
+        self.assertEqual(instrumentation.snapshot()["set_leaf"]["calls"], 2)
+
+    def test_prometheus(self):
+        instrumentation.enable()
+        ZeroMerkleTree(4).set_leaf(3, 10)
+        text = instrumentation.to_prometheus()
+        self.assertIn('merkle_hashes_total{operation="set_leaf"} 4\n', text)
+        self.assertIn('merkle_operation_seconds_count{operation="set_leaf"} 1\n', text)
+        self.assertIn(
+            'merkle_operation_seconds_bucket{operation="set_leaf",le="+Inf"} 1\n', text
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,10 @@
+import hashlib
 import unittest
+from hashing import get_backend
+from helpers import CountingBackend
 from merkle_tree import MerkleTree
+from verification import compute_merkle_root_from_proof
+from zero_merkle_tree import NodeStore, ZeroMerkleTree
 
 
 class TestMerkleTree(unittest.TestCase):
@@ -22,6 +27,25 @@ class TestMerkleTree(unittest.TestCase):
 
         self.assertNotEqual(self.tree.root(), tree_2.root())
 
+    def test_layers_match_recursive_definition(self):
+        def recursive_node(level, index):
+            if level == self.height:
+                return self.leaves[index]
+            return self.tree.hash(
+                recursive_node(level + 1, 2 * index),
+                recursive_node(level + 1, 2 * index + 1),
+            )
+
+        for level in range(self.height + 1):
+            for index in range(2**level):
+                self.assertEqual(
+                    self.tree.node(level, index), recursive_node(level, index)
+                )
+
+    def test_leaves_must_fill_the_tree(self):
+        with self.assertRaises(ValueError):
+            MerkleTree(self.height, self.leaves[:-1])
+
     def test_merkle_path(self):
         expected_path = [
             {"level": 3, "index": 5},
@@ -69,6 +93,83 @@ class TestMerkleTree(unittest.TestCase):
         # The computed root should match the tree's root
         self.assertEqual(computed_root, self.tree.root())
 
+    def test_static_hex_methods_on_class(self):
+        # hash and compute_merkle_root_from_proof were static methods, and still compute hex sha256 nodes on the class
+        proof = self.tree.get_merkle_proof(3, 5)
+        with self.assertWarns(DeprecationWarning):
+            self.assertEqual(MerkleTree.hash(1, 2), hashlib.sha256(b"12").hexdigest())
+        with self.assertWarns(DeprecationWarning):
+            self.assertEqual(NodeStore.hash(1, 2), get_backend().hash(1, 2))
+        for cls in (MerkleTree, ZeroMerkleTree):
+            with self.assertWarns(DeprecationWarning):
+                root = cls.compute_merkle_root_from_proof(
+                    proof["siblings"], proof["index"], proof["value"]
+                )
+            self.assertEqual(root, self.tree.root())
+        self.assertEqual(
+            compute_merkle_root_from_proof(
+                get_backend(), proof["siblings"], proof["index"], proof["value"]
+            ),
+            self.tree.root(),
+        )
+
+    def test_multiproof(self):
+        proof = self.tree.get_multiproof(3, [5, 0, 4, 1])
+        self.assertEqual(proof["indices"], [0, 1, 4, 5])
+        self.assertEqual(proof["values"], [1, 3, 4, 2])
+        # N(2,1) and N(2,3) are the only nodes that can't be computed from the proven leaves
+        self.assertEqual(
+            proof["siblings"], [self.tree.node(2, 1), self.tree.node(2, 3)]
+        )
+        self.assertTrue(self.tree.verify_multiproof(proof))
+
+    def test_multiproof_of_single_leaf_matches_merkle_proof(self):
+        proof = self.tree.get_multiproof(3, [6])
+        self.assertEqual(
+            proof["siblings"], self.tree.get_merkle_proof(3, 6)["siblings"]
+        )
+        self.assertTrue(self.tree.verify_multiproof(proof))
+
+    def test_multiproof_verification_fails(self):
+        proof = self.tree.get_multiproof(3, [2, 7])
+
+        tampered = dict(proof, values=[proof["values"][0], 100])
+        self.assertFalse(self.tree.verify_multiproof(tampered))
+
+        truncated = dict(proof, siblings=proof["siblings"][:-1])
+        self.assertFalse(self.tree.verify_multiproof(truncated))
+
+        extended = dict(proof, siblings=proof["siblings"] + [proof["root"]])
+        self.assertFalse(self.tree.verify_multiproof(extended))
+
+    def test_range_proof(self):
+        proof = self.tree.get_range_proof(3, 7)
+        # leaf 6 is empty
+        self.assertEqual(proof["values"], {3: 7, 4: 4, 5: 2})
+        self.assertEqual(proof["leftSiblings"], [3, self.tree.node(2, 0)])
+        self.assertEqual(proof["rightSiblings"], [6])
+        self.assertTrue(self.tree.verify_range_proof(proof))
+
+        for start, end in [(0, 8), (0, 1), (7, 8), (2, 6)]:
+            proof = self.tree.get_range_proof(start, end)
+            self.assertTrue(self.tree.verify_range_proof(proof))
+
+        with self.assertRaises(ValueError):
+            self.tree.get_range_proof(4, 4)
+        with self.assertRaises(ValueError):
+            self.tree.get_range_proof(0, 9)
+
+    def test_range_proof_verification_fails(self):
+        proof = self.tree.get_range_proof(1, 6)
+        for tampered in [
+            dict(proof, values={**proof["values"], 2: 100}),
+            dict(proof, values={**proof["values"], 0: 1}),
+            dict(proof, end=7),
+            dict(proof, leftSiblings=[]),
+            dict(proof, rightSiblings=proof["rightSiblings"] + [proof["root"]]),
+        ]:
+            self.assertFalse(self.tree.verify_range_proof(tampered))
+
     def test_get_delta_merkle_proof(self):
         level, index, new_value = 3, 5, 100
 
@@ -80,7 +181,57 @@ class TestMerkleTree(unittest.TestCase):
         self.assertEqual(delta_proof["newValue"], new_value)
         self.assertEqual(delta_proof["siblings"], proof["siblings"])
 
+    def test_binary_mode(self):
+        tree = MerkleTree(self.height, self.leaves, binary=True)
+        self.assertEqual(len(tree.root()), 32)
+        self.assertNotEqual(tree.root(), self.tree.root())
+
+        proof = tree.get_merkle_proof(3, 5)
+        self.assertEqual(proof["value"], (2).to_bytes(32, "big"))
+        self.assertTrue(tree.verify_merkle_proof(proof))
+        self.assertTrue(
+            tree.verify_delta_merkle_proof(tree.get_delta_merkle_proof(3, 5, 100))
+        )
+
     def test_verify_delta_merkle_proof(self):
         level, index, new_value = 3, 5, 100
         delta_proof = self.tree.get_delta_merkle_proof(level, index, new_value)
         self.assertTrue(self.tree.verify_delta_merkle_proof(delta_proof))
+
+    def test_update_leaf(self):
+        leaves = list(range(16))
+        backend = CountingBackend()
+        tree = MerkleTree(4, leaves, hash_backend=backend)
+        expected = tree.get_delta_merkle_proof(4, 5, 50)
+
+        backend.hashes = 0
+        self.assertEqual(tree.update_leaf(5, 50), expected)
+        self.assertEqual(backend.hashes, 4)
+        leaves[5] = 50
+        self.assertEqual(tree.layers, MerkleTree(4, leaves).layers)
+
+    def test_update_leaves_rehashes_lazily(self):
+        leaves = list(range(16))
+        backend = CountingBackend(binary=True)
+        tree = MerkleTree(4, leaves, binary=True, hash_backend=backend)
+
+        backend.hashes = 0
+        tree.update_leaves({4: 40, 5: 50})
+        tree.update_leaves({6: 60})
+        self.assertEqual(backend.hashes, 0)
+        leaves[4:7] = [40, 50, 60]
+        self.assertEqual(tree.root(), MerkleTree(4, leaves, binary=True).root())
+        # the ancestors shared by the updated leaves are hashed once
+        self.assertEqual(backend.hashes, 5)
+
+        proofs = tree.update_leaves({0: 1, 15: 2}, return_proofs=True)
+        self.assertEqual(proofs[0]["newRoot"], proofs[1]["oldRoot"])
+        self.assertTrue(all(tree.verify_delta_merkle_proof(proof) for proof in proofs))
+        root = tree.root()
+        for return_proofs in (False, True):
+            with self.assertRaises(ValueError):
+                tree.update_leaves({0: 9, 16: 1}, return_proofs)
+            # nothing is written when an index is out of range
+            self.assertEqual(tree.root(), root)
+        with self.assertRaises(ValueError):
+            tree.update_leaf(-1, 1)
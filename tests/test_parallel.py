@@ -0,0 +1,54 @@
+import random
+import unittest
+import parallel
+from merkle_tree import MerkleTree
+from zero_merkle_tree import ZeroMerkleTree
+
+
+class TestParallel(unittest.TestCase):
+    def test_build_layers_matches_serial(self):
+        leaves = list(range(2**6))
+        tree = MerkleTree(6, leaves)
+        for processes in (2, 3, 4):
+            parallel_tree = MerkleTree(6, leaves, processes=processes)
+            self.assertEqual(parallel_tree.layers, tree.layers)
+
+    def test_build_layers_of_tiny_tree(self):
+        tree = MerkleTree(1, [1, 2], binary=True)
+        self.assertEqual(
+            MerkleTree(1, [1, 2], binary=True, processes=4).layers, tree.layers
+        )
+
+    def test_load_leaves_matches_set_leaf(self):
+        leaves = {
+            index: index + 1 for index in random.Random(2).sample(range(2**20), 40)
+        }
+        tree = ZeroMerkleTree(20)
+        for index, value in leaves.items():
+            tree.set_leaf(index, value)
+
+        for processes in (None, 3):
+            loaded = ZeroMerkleTree(20)
+            loaded.load_leaves(leaves, processes=processes)
+            self.assertEqual(loaded.node_store.nodes, tree.node_store.nodes)
+
+    def test_load_leaves_requires_empty_tree(self):
+        tree = ZeroMerkleTree(4)
+        tree.set_leaf(1, 1)
+        with self.assertRaises(ValueError):
+            tree.load_leaves({2: 2})
+
+    def test_get_merkle_proofs(self):
+        tree = MerkleTree(5, list(range(32)))
+        indices = [31, 0, 7, 7, 12]
+        self.assertEqual(
+            parallel.get_merkle_proofs(tree, 5, indices, processes=2),
+            tree.get_merkle_proofs(5, indices),
+        )
+
+        zero_tree = ZeroMerkleTree(16)
+        zero_tree.set_leaves({3: 1, 4000: 2})
+        self.assertEqual(
+            parallel.get_merkle_proofs(zero_tree, 16, [3, 4000, 5], processes=2),
+            zero_tree.get_merkle_proofs(16, [3, 4000, 5]),
+        )
@@ -0,0 +1,53 @@
+import io
+import unittest
+from append_only_merkle_tree import AppendOnlyMerkleTree
+from proof_codec import ProofCodec
+from zero_merkle_tree import ZeroMerkleTree
+
+
+class TestProofCodec(unittest.TestCase):
+    def test_round_trip(self):
+        for binary in (False, True):
+            tree = ZeroMerkleTree(50, binary=binary)
+            codec = ProofCodec(50, binary)
+            proofs = [tree.set_leaf(index * 7919, index + 1) for index in range(20)]
+            proofs += [tree.get_merkle_proof(50, 7919), tree.get_merkle_proof(10, 3)]
+            for proof in proofs:
+                encoded = codec.encode(proof)
+                self.assertEqual(codec.decode(encoded), (proof, len(encoded)))
+                # the zero hash siblings are replaced by bits of the bitmap
+                self.assertLess(len(encoded), 450)
+
+    def test_hex_mode_leaves(self):
+        codec = ProofCodec(3)
+        for value in (0, 7, -300, 2**70, "", "leaf", "AB" * 32, "ab" * 32):
+            proof = {
+                "root": "ab" * 32,
+                "siblings": [value, 0, "cd" * 32],
+                "index": 5,
+                "value": value,
+            }
+            self.assertEqual(codec.decode(codec.encode(proof))[0], proof)
+
+    def test_zero_siblings_keep_their_type(self):
+        codec = ProofCodec(3)
+        proof = {"root": "ab" * 32, "siblings": [0, 0, 0], "index": 5, "value": 1}
+        decoded = codec.decode(codec.encode(proof))[0]
+        self.assertEqual(decoded, proof)
+        self.assertIs(type(decoded["siblings"][0]), int)
+        for sibling in (False, 0.0):
+            with self.assertRaises(TypeError):
+                codec.encode(dict(proof, siblings=[sibling, 0, 0]))
+
+    def test_streams(self):
+        tree = AppendOnlyMerkleTree(16)
+        codec = ProofCodec(16)
+        proofs = list(tree.append_leaves(range(1, 40)))
+        stream = codec.encode_stream(proofs)
+        self.assertEqual(list(codec.iter_decode(stream)), proofs)
+        self.assertEqual(list(codec.read_proofs(io.BytesIO(stream))), proofs)
+
+        with self.assertRaises(ValueError):
+            list(codec.iter_decode(stream[:-1]))
+        with self.assertRaises(ValueError):
+            ProofCodec(15).decode(codec.encode(proofs[0]))
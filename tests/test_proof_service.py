@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from proof_service import ProofService
+from zero_merkle_tree import ZeroMerkleTree
+
+
+class TestProofService(unittest.TestCase):
+    def test_results_match_sequential_calls(self):
+        requests = [("set", 3, 1), ("get", 3), ("set", 5, 2), ("set", 3, 4)]
+        requests += [("get", 5), ("get", 3), ("get", 200), ("set", 200, 9)]
+        expected_tree = ZeroMerkleTree(8)
+        expected = [
+            (
+                expected_tree.set_leaf(*request[1:])
+                if request[0] == "set"
+                else expected_tree.get_leaf(request[1])
+            )
+            for request in requests
+        ]
+
+        async def run():
+            async with ProofService(ZeroMerkleTree(8), max_pending=4) as service:
+                results = await asyncio.gather(
+                    *(
+                        (
+                            service.set_leaf(*request[1:])
+                            if request[0] == "set"
+                            else service.get_leaf(request[1])
+                        )
+                        for request in requests
+                    )
+                )
+                return results, service.batches
+
+        results, batches = asyncio.run(run())
+        self.assertEqual(results, expected)
+        self.assertLess(batches, len(requests))
+
+    def test_errors_are_per_request(self):
+        async def run():
+            async with ProofService(ZeroMerkleTree(4, binary=True)) as service:
+                return await asyncio.gather(
+                    service.set_leaf(1, 5),
+                    service.set_leaf(2, "not a leaf"),
+                    service.set_leaf(3, 6),
+                    return_exceptions=True,
+                )
+
+        first, error, last = asyncio.run(run())
+        self.assertIsInstance(error, TypeError)
+        self.assertEqual(first["index"], 1)
+        self.assertEqual(last["oldRoot"], first["newRoot"])
+
+    def test_reads_use_the_proof_cache(self):
+        tree = ZeroMerkleTree(8, proof_cache_size=4)
+        tree.set_leaf(3, 1)
+
+        async def run():
+            async with ProofService(tree) as service:
+                return await asyncio.gather(*(service.get_leaf(3) for _ in range(3)))
+
+        proofs = asyncio.run(run())
+        self.assertEqual(proofs, [tree.get_merkle_proof(8, 3)] * 3)
+        self.assertTrue(tree.verify_merkle_proof(proofs[0]))
+        self.assertEqual(tree.proof_cache_stats()["hits"], 2)
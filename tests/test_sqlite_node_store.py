@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from append_only_merkle_tree import AppendOnlyMerkleTree
+from sqlite_node_store import SqliteNodeStore
+from zero_merkle_tree import ZeroMerkleTree
+
+
+class TestSqliteNodeStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "nodes.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_set_and_get(self):
+        with SqliteNodeStore(self.path, height=4) as node_store:
+            node_store.set(2, 3, "test_value")
+            self.assertEqual(node_store.get(2, 3), "test_value")
+            node_store.commit()
+            self.assertEqual(node_store.get(2, 3), "test_value")
+
+            # Ensure we get the correct zero hash for non-existent nodes.
+            self.assertEqual(node_store.get(1, 1), node_store.zero_hashes[3])
+
+    def test_values_keep_their_type(self):
+        with SqliteNodeStore(self.path, height=70) as node_store:
+            node_store.set_many(70, {2**69: 7, 1: b"\x01" * 32, 2: "ab", 3: 2**100})
+            node_store.commit()
+            self.assertEqual(node_store.get(70, 2**69), 7)
+            self.assertEqual(node_store.get(70, 1), b"\x01" * 32)
+            self.assertEqual(node_store.get(70, 2), "ab")
+            self.assertEqual(node_store.get(70, 3), str(2**100))
+
+    def test_level_items(self):
+        with SqliteNodeStore(self.path, height=16) as node_store:
+            node_store.set_many(16, {900: "c", 7: "a"})
+            node_store.commit()
+            node_store.set(16, 8, "b")
+            self.assertEqual(
+                list(node_store.level_items(16)), [(7, "a"), (8, "b"), (900, "c")]
+            )
+
+    def test_tree_survives_restart(self):
+        tree = ZeroMerkleTree(16, node_store=SqliteNodeStore(self.path, 16))
+        tree.set_leaf(3, 10)
+        tree.set_leaves({7: 1, 8: 2, 900: 3})
+        root = tree.root()
+        tree.node_store.close()
+
+        expected = ZeroMerkleTree(16)
+        expected.set_leaves({3: 10, 7: 1, 8: 2, 900: 3})
+        self.assertEqual(expected.root(), root)
+
+        with SqliteNodeStore(self.path, 16) as node_store:
+            tree = ZeroMerkleTree(16, node_store=node_store)
+            self.assertEqual(tree.root(), root)
+            proof = tree.get_leaf(900)
+            self.assertEqual(proof["value"], 3)
+            self.assertTrue(tree.verify_merkle_proof(proof))
+
+    def test_clearing_leaves_deletes_nodes(self):
+        with SqliteNodeStore(self.path, 16) as node_store:
+            tree = ZeroMerkleTree(16, node_store=node_store)
+            tree.set_leaves({7: 1, 900: 3})
+            tree.set_leaf(900, 0)
+            tree.set_leaf(7, 0)
+            count = node_store.connection.execute("SELECT COUNT(*) FROM nodes")
+            self.assertEqual(count.fetchone()[0], 0)
+            self.assertEqual(tree.root(), ZeroMerkleTree(16).root())
+
+    def test_parameters_must_match(self):
+        SqliteNodeStore(self.path, 16).close()
+        with self.assertRaises(ValueError):
+            SqliteNodeStore(self.path, 17)
+        with self.assertRaises(ValueError):
+            SqliteNodeStore(self.path, 16, binary=True)
+
+    def test_binary_append_only_tree(self):
+        with SqliteNodeStore(self.path, 32, binary=True) as node_store:
+            tree = AppendOnlyMerkleTree(32, node_store=node_store)
+            for i in range(4):
+                self.assertTrue(tree.verify_delta_merkle_proof(tree.append_leaf(i)))
+            self.assertEqual(tree.root(), tree.last_proof["root"])
+
+    def test_append_only_tree_reopen(self):
+        in_memory = AppendOnlyMerkleTree(16, binary=True)
+        with SqliteNodeStore(self.path, 16, binary=True) as node_store:
+            tree = AppendOnlyMerkleTree(16, node_store=node_store)
+            for value in range(1, 5):
+                self.assertEqual(tree.append_leaf(value), in_memory.append_leaf(value))
+            tree.append_batch(range(5, 8))
+            in_memory.append_batch(range(5, 8))
+            self.assertEqual(tree.root(), in_memory.root())
+
+        with SqliteNodeStore(self.path, 16, binary=True) as node_store:
+            tree = AppendOnlyMerkleTree(16, node_store=node_store)
+            self.assertEqual(tree.last_proof, in_memory.last_proof)
+            self.assertEqual(tree.append_leaf(8), in_memory.append_leaf(8))
+            self.assertEqual(tree.get_leaf(3), in_memory.get_leaf(3))
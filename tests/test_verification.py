@@ -0,0 +1,70 @@
+import unittest
+import verification
+from zero_merkle_tree import ZeroMerkleTree
+
+
+class TestVerification(unittest.TestCase):
+    def setUp(self):
+        self.tree = ZeroMerkleTree(8, binary=True)
+        self.proofs = [
+            self.tree.set_leaf(index, value)
+            for index, value in [(3, 1), (4, 2), (3, 5), (200, 7), (201, 8)]
+        ]
+
+    def test_compute_delta_roots(self):
+        proof = self.proofs[2]
+        memo = {}
+        roots = verification.compute_delta_roots(
+            self.tree.hasher,
+            proof["siblings"],
+            proof["index"],
+            proof["oldValue"],
+            proof["newValue"],
+            memo,
+        )
+        self.assertEqual(roots, (proof["oldRoot"], proof["newRoot"]))
+        self.assertEqual(len(memo), 2 * len(proof["siblings"]))
+
+    def test_valid_batch(self):
+        for processes in (None, 2):
+            self.assertIsNone(
+                verification.first_invalid_delta_proof(
+                    self.proofs, binary=True, height=8, processes=processes
+                )
+            )
+        self.assertTrue(verification.verify_delta_merkle_proofs([]))
+
+    def test_reports_first_failing_index(self):
+        tampered = dict(self.proofs[3], newValue=bytes(32))
+        proofs = self.proofs[:3] + [tampered] + self.proofs[4:]
+        for processes in (None, 2):
+            self.assertEqual(
+                verification.first_invalid_delta_proof(
+                    proofs, binary=True, processes=processes
+                ),
+                3,
+            )
+
+    def test_chaining(self):
+        proofs = [self.proofs[0], self.proofs[2], self.proofs[1]]
+        self.assertEqual(verification.first_invalid_delta_proof(proofs, binary=True), 1)
+        self.assertIsNone(
+            verification.first_invalid_delta_proof(proofs, binary=True, chained=False)
+        )
+        self.assertEqual(
+            verification.first_invalid_delta_proof(self.proofs, binary=True, height=7),
+            0,
+        )
+
+    def test_memo_distinguishes_equal_values_that_hash_differently(self):
+        tree = ZeroMerkleTree(8)
+        first = tree.set_leaf(3, 1)
+        second = tree.set_leaf(3, 1)
+        # 1.0 == True == 1, but they are hashed as "1.0", "True" and "1"
+        forged = dict(second, oldValue=1.0, newValue=True)
+        self.assertFalse(tree.verify_delta_merkle_proof(forged))
+        self.assertFalse(
+            verification.verify_delta_merkle_proof(forged, tree.hasher, memo={})
+        )
+        self.assertIsNone(verification.first_invalid_delta_proof([first, second]))
+        self.assertEqual(verification.first_invalid_delta_proof([first, forged]), 1)
@@ -0,0 +1,122 @@
+import gc
+import random
+import threading
+import unittest
+from versioned_merkle_tree import ConcurrentZeroMerkleTree, VersionedZeroMerkleTree
+from zero_merkle_tree import ZeroMerkleTree
+
+
+class TestVersionedZeroMerkleTree(unittest.TestCase):
+    def setUp(self):
+        self.tree = VersionedZeroMerkleTree(4)
+
+    def history_sizes(self):
+        return sum(len(history) for history in self.tree.node_store.nodes.values())
+
+    def test_matches_zero_merkle_tree(self):
+        tree = ZeroMerkleTree(4)
+        for index, value in [(3, 1), (9, 2), (3, 5)]:
+            self.assertEqual(
+                self.tree.set_leaf(index, value), tree.set_leaf(index, value)
+            )
+        self.tree.set_leaves({0: 1, 15: 2})
+        tree.set_leaves({0: 1, 15: 2})
+        self.assertEqual(self.tree.root(), tree.root())
+
+    def test_snapshot_serves_old_proofs(self):
+        self.tree.set_leaf(3, 1)
+        snapshot = self.tree.snapshot()
+        old_root = self.tree.root()
+        old_proof = self.tree.get_leaf(4)
+
+        self.tree.set_leaf(3, 2)
+        self.tree.set_leaves({4: 7, 12: 8})
+
+        self.assertEqual(snapshot.root(), old_root)
+        self.assertEqual(snapshot.get_leaf(4), old_proof)
+        self.assertEqual(snapshot.get_leaf(3)["value"], 1)
+        self.assertTrue(snapshot.verify_merkle_proof(snapshot.get_leaf(12)))
+        self.assertNotEqual(self.tree.root(), old_root)
+        self.assertEqual(self.tree.get_leaf(4)["value"], 7)
+
+    def test_writes_without_snapshots_do_not_grow_history(self):
+        self.tree.set_leaf(3, 1)
+        size = self.history_sizes()
+        for value in range(5):
+            self.tree.set_leaf(3, value)
+        self.assertEqual(self.history_sizes(), size)
+
+    def test_released_versions_are_pruned(self):
+        self.tree.set_leaf(3, 1)
+        size = self.history_sizes()
+        first = self.tree.snapshot()
+        self.tree.set_leaf(3, 2)
+        second = self.tree.snapshot()
+        self.tree.set_leaf(3, 3)
+        # the leaf's path is stored once per version
+        self.assertEqual(self.history_sizes(), 3 * size)
+
+        first.release()
+        self.assertEqual(self.history_sizes(), 2 * size)
+        self.assertEqual(second.get_leaf(3)["value"], 2)
+
+        del second
+        gc.collect()
+        self.assertEqual(self.history_sizes(), size)
+        self.assertEqual(self.tree.node_store.retained, {})
+
+
+class TestConcurrentZeroMerkleTree(unittest.TestCase):
+    def test_readers_see_committed_roots_only(self):
+        rng = random.Random(5)
+        updates = [(rng.randrange(2**10), rng.randrange(1, 100)) for _ in range(300)]
+        expected = ZeroMerkleTree(10)
+        committed_roots = {expected.root()}
+        for index, value in updates:
+            committed_roots.add(expected.set_leaf(index, value)["newRoot"])
+
+        tree = ConcurrentZeroMerkleTree(10)
+        done = threading.Event()
+        errors = []
+
+        def read(seed):
+            reader_rng = random.Random(seed)
+            while not done.is_set():
+                proof = tree.get_leaf(reader_rng.choice(updates)[0])
+                if proof["root"] not in committed_roots:
+                    errors.append(("uncommitted root", proof["root"]))
+                if not tree.verify_merkle_proof(proof):
+                    errors.append(("torn proof", proof))
+
+        readers = [threading.Thread(target=read, args=(seed,)) for seed in range(4)]
+        for reader in readers:
+            reader.start()
+        for start in range(0, len(updates), 10):
+            tree.set_leaf(*updates[start])
+            tree.set_leaves(dict(updates[start + 1 : start + 10]))
+        done.set()
+        for reader in readers:
+            reader.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(tree.root(), expected.root())
+        # versions unpinned by readers are pruned by the next write
+        tree.set_leaves({})
+        # only the published version is left, with a single value per node
+        self.assertEqual(tree.node_store.retained, {tree.published: 1})
+        self.assertEqual(tree.node_store._history_keys, set())
+
+    def test_readers_dont_wait_for_the_writer(self):
+        tree = ConcurrentZeroMerkleTree(8)
+        tree.set_leaf(1, 2)
+        root = tree.root()
+        proofs = []
+        with tree._write_lock:
+            # a write in progress, which isn't published yet
+            tree.node_store.set(8, 1, 5)
+            reader = threading.Thread(target=lambda: proofs.append(tree.get_leaf(1)))
+            reader.start()
+            reader.join(timeout=5)
+            self.assertFalse(reader.is_alive())
+        self.assertEqual(proofs[0]["root"], root)
+        self.assertEqual(proofs[0]["value"], 2)
@@ -1,5 +1,7 @@
+import os
+import tempfile
 import unittest
-from zero_merkle_tree import NodeStore, ZeroMerkleTree
+from zero_merkle_tree import NodeStore, ZeroMerkleTree, read_leaf_dump
 from merkle_tree import MerkleTree
 
 
@@ -39,3 +41,176 @@ class TestZeroMerkleTree(unittest.TestCase):
         for level in range(3):
             for index in range(2**level):
                 self.assertEqual(tree.node(level, index), self.tree.node(level, index))
+
+    def test_set_leaves_matches_set_leaf(self):
+        updates = {5: 7, 4: 2, 0: 1, 7: 3}
+        tree = ZeroMerkleTree(3)
+        for index, value in updates.items():
+            tree.set_leaf(index, value)
+
+        self.tree.set_leaves(updates)
+        self.assertEqual(tree.root(), self.tree.root())
+        self.assertEqual(tree.node_store.nodes, self.tree.node_store.nodes)
+
+    def test_update_leaf(self):
+        tree = ZeroMerkleTree(3)
+        proof = tree.update_leaf(1, 5)
+        self.assertEqual(proof, self.tree.set_leaf(1, 5))
+        tree.update_leaves({2: 6, 7: 1})
+        self.tree.set_leaves({2: 6, 7: 1})
+        self.assertEqual(tree.root(), self.tree.root())
+
+    def test_leaf_index_out_of_range(self):
+        tree = ZeroMerkleTree(3)
+        for index in (8, -1):
+            with self.assertRaises(ValueError):
+                tree.set_leaf(index, 1)
+            with self.assertRaises(ValueError):
+                tree.set_leaves({0: 1, index: 1})
+            with self.assertRaises(ValueError):
+                tree.set_leaves({0: 1, index: 1}, return_proofs=True)
+            with self.assertRaises(ValueError):
+                tree.load_leaves({index: 1})
+        self.assertEqual(tree.node_store.nodes, {})
+
+    def test_set_leaves_returns_delta_proofs(self):
+        self.tree.set_leaf(1, 4)
+        tree = ZeroMerkleTree(3)
+        tree.set_leaf(1, 4)
+
+        updates = {6: 1, 7: 2, 1: 5}
+        proofs = self.tree.set_leaves(updates, return_proofs=True)
+        expected = [tree.set_leaf(index, value) for index, value in updates.items()]
+
+        self.assertEqual(proofs, expected)
+        self.assertEqual(tree.root(), self.tree.root())
+        for proof in proofs:
+            self.assertTrue(self.tree.verify_delta_merkle_proof(proof))
+
+    def test_clearing_leaves_prunes_nodes(self):
+        self.tree.set_leaf(5, 1)
+        self.tree.set_leaves({2: 3, 6: 4})
+        self.tree.set_leaves({2: 0, 6: 0})
+        self.tree.set_leaf(5, 0)
+        self.assertEqual(self.tree.node_store.nodes, {})
+        self.assertEqual(self.tree.root(), ZeroMerkleTree(3).root())
+
+    def test_proof_cache(self):
+        tree = ZeroMerkleTree(8, proof_cache_size=2)
+        tree.set_leaves({3: 1, 200: 2})
+        self.assertEqual(tree.get_leaf(3), tree.get_merkle_proof(8, 3))
+        tree.get_leaf(200)
+
+        # writes are logged, and the cached proofs are updated when they are served
+        tree.set_leaf(2, 7)
+        tree.set_leaves({3: 5, 201: 6})
+        for index in (3, 200):
+            self.assertEqual(tree.get_leaf(index), tree.get_merkle_proof(8, index))
+
+        tree.get_leaf(9)
+        self.assertEqual(
+            tree.proof_cache_stats(),
+            {
+                "size": 2,
+                "capacity": 2,
+                "hits": 2,
+                "misses": 3,
+                "evictions": 1,
+                # sibling 7 of leaf 200 changed twice, but is read once
+                "updates": 4,
+            },
+        )
+        self.assertIsNone(self.tree.proof_cache_stats())
+
+    def test_proof_cache_after_many_writes(self):
+        tree = ZeroMerkleTree(8, proof_cache_size=4)
+        tree.set_leaves({3: 1, 200: 2})
+        for index in (3, 200):
+            tree.get_leaf(index)
+        for value in range(1, 30):
+            tree.set_leaf(value * 7 % 256, value)
+            # the log of writes stays bounded whatever the number of writes
+            self.assertLessEqual(len(tree.proof_cache.log), 16)
+            if value % 10 == 0:
+                self.assertEqual(tree.get_leaf(3), tree.get_merkle_proof(8, 3))
+        self.assertEqual(tree.get_leaf(3), tree.get_merkle_proof(8, 3))
+        self.assertEqual(tree.get_leaf(200), tree.get_merkle_proof(8, 200))
+
+    def test_multiproof(self):
+        self.tree.set_leaves({1: 4, 2: 8, 6: 5})
+        proof = self.tree.get_multiproof(3, [1, 2, 3])
+        self.assertEqual(proof["root"], self.tree.root())
+        self.assertEqual(len(proof["siblings"]), 2)
+        self.assertTrue(self.tree.verify_multiproof(proof))
+
+    def test_range_proof(self):
+        tree = ZeroMerkleTree(32)
+        leaves = {5: 1, 1000: 2, 1001: 3, 70000: 4}
+        tree.set_leaves(leaves)
+        proof = tree.get_range_proof(1000, 2**20)
+        self.assertEqual(proof["values"], {1000: 2, 1001: 3, 70000: 4})
+        # 1000 has 6 one bits, and the span is the first of 2**12 aligned subtrees of 2**20 leaves
+        self.assertEqual(len(proof["leftSiblings"]), 6)
+        self.assertEqual(len(proof["rightSiblings"]), 12)
+        self.assertTrue(tree.verify_range_proof(proof))
+        self.assertTrue(tree.verify_range_proof(tree.get_range_proof(6, 1000)))
+        self.assertFalse(
+            tree.verify_range_proof(dict(proof, values={1000: 2, 70000: 4}))
+        )
+
+        dense = MerkleTree(
+            4, [leaves.get(index, 0) for index in range(16)], binary=True
+        )
+        sparse = ZeroMerkleTree(4, binary=True)
+        sparse.set_leaves({5: 1})
+        self.assertEqual(sparse.get_range_proof(3, 11), dense.get_range_proof(3, 11))
+
+    def test_binary_mode(self):
+        tree = ZeroMerkleTree(3, binary=True)
+        self.assertEqual(MerkleTree(3, [0] * 8, binary=True).root(), tree.root())
+
+        delta_merkle_proof = tree.set_leaf(6, 10)
+        self.assertEqual(
+            MerkleTree(3, [0] * 6 + [10, 0], binary=True).root(), tree.root()
+        )
+        self.assertTrue(tree.verify_delta_merkle_proof(delta_merkle_proof))
+
+    def test_from_leaves_matches_set_leaves(self):
+        leaves = {0: 3, 1: 9, 4: 2, 7: 6}
+        self.tree.set_leaves(leaves)
+        tree = ZeroMerkleTree.from_leaves(3, sorted(leaves.items()))
+        self.assertEqual(tree.root(), self.tree.root())
+        self.assertEqual(tree.node_store.nodes, self.tree.node_store.nodes)
+
+        for items in ([], [(5, 1)], [(0, 1), (7, 2)]):
+            tree = ZeroMerkleTree.from_leaves(3, items, binary=True, batch_size=2)
+            expected = ZeroMerkleTree(3, binary=True)
+            expected.set_leaves(dict(items))
+            self.assertEqual(tree.root(), expected.root())
+
+        # batches whose boundaries split subtrees, and zero leaves, which leave no node behind
+        items = [(index, index % 3) for index in range(0, 200, 7)]
+        expected = ZeroMerkleTree(8)
+        expected.set_leaves(dict(items))
+        for batch_size in (1, 2, 3, 1000):
+            tree = ZeroMerkleTree.from_leaves(8, items, batch_size=batch_size)
+            self.assertEqual(tree.node_store.nodes, expected.node_store.nodes)
+
+        with self.assertRaises(ValueError):
+            ZeroMerkleTree.from_leaves(3, [(4, 1), (2, 1)])
+        with self.assertRaises(ValueError):
+            ZeroMerkleTree.from_leaves(3, [(8, 1)])
+
+    def test_dump_and_restore(self):
+        for binary in (False, True):
+            tree = ZeroMerkleTree(8, binary=binary)
+            tree.set_leaves({200: 5, 3: 1, 77: 9})
+            tree.set_leaf(3, 0)
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "leaves.txt")
+                self.assertEqual(tree.dump_leaves(path), 2)
+                restored = ZeroMerkleTree.from_leaves(
+                    8, read_leaf_dump(path, binary), binary=binary
+                )
+            self.assertEqual(restored.root(), tree.root())
+            self.assertEqual([index for index, _ in restored.iter_leaves()], [77, 200])
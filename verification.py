@@ -0,0 +1,215 @@
+"""
+Stateless verification of delta merkle proofs, one at a time or in batches.
+
+A delta merkle proof proves that a leaf changed from `oldValue` to `newValue` while the root changed
+from `oldRoot` to `newRoot`. Both roots are computed in a single walk up the leaf's path.
+A batch, such as the updates of a block, is verified in order: every proof must be valid and,
+when the batch is chained, must start from the root the previous proof ended at.
+
+Consecutive proofs of a chain share most of their paths, since the old path of a proof is built from the
+nodes the previous proof wrote, so verifiers memoize the parents they computed and reuse them.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+from hashing import get_backend
+
+# Number of memoized parents after which a verifier starts over with an empty memo.
+MEMO_SIZE = 4096
+
+
+def _memo_hash(hasher, binary, memo, pair):
+    """
+    Hash a pair of nodes, or get its parent from the memo.
+
+    The memo is keyed by the hash input rather than by the pair, since nodes that compare equal
+    can hash differently: in hex mode 1, 1.0 and True are equal but are hashed as "1", "1.0" and "True".
+    """
+    left, right = pair
+    key = left + right if binary else f"{left}{right}"
+    parent = memo.get(key)
+    if parent is None:
+        parent = memo[key] = hasher.hash(left, right)
+    return parent
+
+
+def compute_merkle_root_from_proof(hasher, siblings, index, value):
+    """
+    Compute the root of a merkle proof by walking up the leaf's path, hashing it with a sibling at every level.
+
+    Args:
+    - hasher (HashBackend): The hash backend of the tree.
+    - siblings (list): The siblings of the leaf's merkle path, from the leaf level up.
+    - index (int): The index of the leaf.
+    - value: The value of the leaf, in the tree's node format.
+
+    Returns:
+    - The computed root.
+    """
+    hash = hasher.hash
+    node = value
+    for sibling in siblings:
+        if index % 2 == 0:
+            # the node on the path is the left hand child
+            node = hash(node, sibling)
+        else:
+            node = hash(sibling, node)
+        index //= 2
+    return node
+
+
+def compute_delta_roots(hasher, siblings, index, old_value, new_value, memo=None):
+    """
+    Compute the old and new roots of a delta merkle proof in a single walk up the leaf's path.
+
+    Args:
+    - hasher (HashBackend): The hash backend of the tree.
+    - siblings (list): The siblings of the leaf's merkle path, from the leaf level up.
+    - index (int): The index of the leaf.
+    - old_value: The old value of the leaf, in the tree's node format.
+    - new_value: The new value of the leaf, in the tree's node format.
+    - memo (dict): Parents computed so far, keyed by the exact bytes or text that was hashed.
+      Pairs found in it aren't hashed again, and the new parents are added to it.
+
+    Returns:
+    - tuple: The old root and the new root.
+    """
+    if memo is None:
+        memo = {}
+    binary = hasher.binary
+    old_node, new_node = old_value, new_value
+    for sibling in siblings:
+        if index % 2 == 0:
+            old_pair, new_pair = (old_node, sibling), (new_node, sibling)
+        else:
+            old_pair, new_pair = (sibling, old_node), (sibling, new_node)
+
+        old_node = _memo_hash(hasher, binary, memo, old_pair)
+        # above the level where the paths meet, the new pair is the old pair and is found in the memo
+        new_node = _memo_hash(hasher, binary, memo, new_pair)
+
+        index //= 2
+    return old_node, new_node
+
+
+def verify_delta_merkle_proof(delta_merkle_proof, hasher, height=None, memo=None):
+    """
+    Verify a delta merkle proof without a tree.
+
+    Args:
+    - delta_merkle_proof (dict): The delta merkle proof.
+    - hasher (HashBackend): The hash backend of the tree.
+    - height (int): If set, the proof must have exactly this many siblings.
+    - memo (dict): Parents computed so far, see `compute_delta_roots`.
+
+    Returns:
+    - bool: True if both the old and new merkle proofs are valid, False otherwise.
+    """
+    siblings = delta_merkle_proof["siblings"]
+    if height is not None and len(siblings) != height:
+        return False
+    old_root, new_root = compute_delta_roots(
+        hasher,
+        siblings,
+        delta_merkle_proof["index"],
+        delta_merkle_proof["oldValue"],
+        delta_merkle_proof["newValue"],
+        memo,
+    )
+    return (
+        old_root == delta_merkle_proof["oldRoot"]
+        and new_root == delta_merkle_proof["newRoot"]
+    )
+
+
+def _first_invalid(proofs, hasher, height, chained):
+    memo = {}
+    previous_root = None
+    for position, proof in enumerate(proofs):
+        if chained and position > 0 and proof["oldRoot"] != previous_root:
+            return position
+        if len(memo) > MEMO_SIZE:
+            memo = {}
+        if not verify_delta_merkle_proof(proof, hasher, height, memo):
+            return position
+        previous_root = proof["newRoot"]
+    return None
+
+
+def first_invalid_delta_proof(
+    proofs,
+    binary=False,
+    hash_backend=None,
+    height=None,
+    chained=True,
+    processes=None,
+):
+    """
+    Find the first delta merkle proof of a batch that doesn't verify.
+
+    With more than 1 process, the batch is split in contiguous chunks that are verified by worker processes,
+    and the chaining between chunks is checked in this process.
+
+    Args:
+    - proofs (iterable): The delta merkle proofs, in the order they were applied.
+    - binary (bool): If True, nodes are raw 32 byte digests, otherwise they are hex strings.
+    - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+    - height (int): If set, every proof must have exactly this many siblings.
+    - chained (bool): If True, every proof's `oldRoot` must be the previous proof's `newRoot`.
+    - processes (int): Number of worker processes. Defaults to verifying in this process.
+
+    Returns:
+    - int: The position of the first proof that is invalid or doesn't chain to the previous one,
+      or None if the whole batch is valid.
+    """
+    hasher = get_backend(hash_backend, binary)
+    if not processes or processes <= 1:
+        return _first_invalid(proofs, hasher, height, chained)
+
+    proofs = list(proofs)
+    if not proofs:
+        return None
+    chunk_size = max(1, -(-len(proofs) // processes))
+    starts = range(0, len(proofs), chunk_size)
+    chunks = [proofs[start : start + chunk_size] for start in starts]
+    count = len(chunks)
+    with ProcessPoolExecutor(min(processes, count)) as executor:
+        results = executor.map(
+            _first_invalid,
+            chunks,
+            [hasher] * count,
+            [height] * count,
+            [chained] * count,
+        )
+        for start, result in zip(starts, results):
+            if (
+                chained
+                and start > 0
+                and proofs[start]["oldRoot"] != proofs[start - 1]["newRoot"]
+            ):
+                return start
+            if result is not None:
+                return start + result
+    return None
+
+
+def verify_delta_merkle_proofs(
+    proofs,
+    binary=False,
+    hash_backend=None,
+    height=None,
+    chained=True,
+    processes=None,
+):
+    """
+    Verify a batch of delta merkle proofs, see `first_invalid_delta_proof` for the arguments.
+
+    Returns:
+    - bool: True if every proof is valid, and chained if requested, False otherwise.
+    """
+    return (
+        first_invalid_delta_proof(
+            proofs, binary, hash_backend, height, chained, processes
+        )
+        is None
+    )
@@ -0,0 +1,353 @@
+import threading
+import weakref
+from bisect import bisect_right
+from operator import itemgetter
+
+from merkle_tree import BaseMerkleTree
+from zero_merkle_tree import NodeStore, ZeroMerkleTree
+
+_entry_version = itemgetter(0)
+
+
+class VersionedNodeStore(NodeStore):
+    """
+    A node store that keeps the old values of the nodes needed by retained snapshots.
+
+    Every node maps to its history, a list of (version, value) entries in ascending version order.
+    Writes happen in the current version. Taking a snapshot freezes the current version and starts a new one,
+    so all versions share the nodes they have in common, and a write only adds an entry to a node's history
+    when a retained snapshot still needs the value it replaces.
+    Releasing a snapshot drops the entries that no retained snapshot can see anymore, so memory grows with the
+    number of nodes changed between retained versions rather than with the size of the tree.
+    """
+
+    __slots__ = ("version", "retained", "newest_retained", "_history_keys")
+
+    def __init__(self, height, binary=False, hash_backend=None):
+        """
+        Args:
+        - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests, otherwise they are hex strings.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        """
+        super().__init__(height, binary, hash_backend)
+        # the version that writes go to
+        self.version = 0
+        # number of live snapshots of each retained version
+        self.retained = {}
+        self.newest_retained = -1
+        # nodes with more than one entry in their history, the only ones pruning can shrink
+        self._history_keys = set()
+
+    def set(self, level: int, index: int, value: str):
+        """
+        Set the value of the node in the current version.
+
+        Args:
+        - level (int): Level of the node.
+        - index (int): Index of the node.
+        - value (str): Value to set.
+        """
+        key = (level, index)
+        history = self.nodes.get(key)
+        if history is None:
+            self.nodes[key] = [(self.version, value)]
+        elif history[-1][0] > self.newest_retained:
+            # no retained snapshot can see the latest value, so it can be overwritten in place
+            history[-1] = (self.version, value)
+        else:
+            history.append((self.version, value))
+            self._history_keys.add(key)
+
+    def set_many(self, level: int, values: dict):
+        """
+        Set the values of many nodes on the same level in the current version.
+
+        Args:
+        - level (int): Level of the nodes.
+        - values (dict): Mapping of node index to the value to set.
+        """
+        for index, value in values.items():
+            self.set(level, index, value)
+
+    def get(self, level: int, index: int) -> str:
+        """
+        Get the current value of the node or return the correct zero hash if it doesn't exist.
+
+        Args:
+        - level (int): Level of the node.
+        - index (int): Index of the node.
+
+        Returns:
+        - str: Node value.
+        """
+        history = self.nodes.get((level, index))
+        if history is None:
+            return self.zero_hashes[self.height - level]
+        return history[-1][1]
+
+    def level_items(self, level: int):
+        """
+        Get the current values of the stored nodes of a level, in ascending index order.
+
+        Args:
+        - level (int): Level of the nodes.
+
+        Returns:
+        - iterable: (index, value) pairs of the stored nodes of the level.
+        """
+        return sorted(
+            (index, history[-1][1])
+            for (node_level, index), history in self.nodes.items()
+            if node_level == level
+        )
+
+    def get_at(self, level: int, index: int, version: int) -> str:
+        """
+        Get the value the node had in a version or return the correct zero hash if it didn't exist then.
+
+        Args:
+        - level (int): Level of the node.
+        - index (int): Index of the node.
+        - version (int): A retained version.
+
+        Returns:
+        - str: Node value.
+        """
+        history = self.nodes.get((level, index))
+        if history is not None:
+            position = bisect_right(history, version, key=_entry_version)
+            if position:
+                return history[position - 1][1]
+        return self.zero_hashes[self.height - level]
+
+    def retain(self, version: int = None) -> int:
+        """
+        Freeze the current version so it can be read until it is released, and start a new version.
+
+        Args:
+        - version (int): If set, retain this already retained version once more instead, so it is kept
+          until it is released as many times as it was retained.
+
+        Returns:
+        - int: The frozen version.
+        """
+        if version is not None:
+            if version not in self.retained:
+                raise ValueError(f"Version {version} isn't retained")
+            self.retained[version] += 1
+            return version
+        version = self.version
+        self.retained[version] = self.retained.get(version, 0) + 1
+        self.newest_retained = version
+        self.version += 1
+        return version
+
+    def release(self, version: int, prune: bool = True):
+        """
+        Release a version frozen by `retain` and drop the node values no retained version needs anymore.
+
+        Args:
+        - version (int): The version to release.
+        - prune (bool): If False, the node values are only dropped by the next `prune`.
+        """
+        self.retained[version] -= 1
+        if self.retained[version] == 0:
+            del self.retained[version]
+            self.newest_retained = max(self.retained, default=-1)
+            if prune:
+                self.prune()
+
+    def prune(self, retained=None):
+        """
+        Drop the history entries that neither the current version nor any retained version can see.
+
+        An entry is visible to the versions from its own version up to, excluding, the version of the next entry.
+
+        Args:
+        - retained (iterable): The retained versions. Defaults to the versions retained now.
+        """
+        retained = sorted(self.retained if retained is None else retained)
+        for key in list(self._history_keys):
+            history = self.nodes[key]
+            kept = []
+            for position, entry in enumerate(history[:-1]):
+                # the first retained version at or after this entry must come before the next entry
+                first_visible = bisect_right(retained, entry[0] - 1)
+                if (
+                    first_visible < len(retained)
+                    and retained[first_visible] < history[position + 1][0]
+                ):
+                    kept.append(entry)
+            kept.append(history[-1])
+            self.nodes[key] = kept
+            if len(kept) == 1:
+                self._history_keys.discard(key)
+
+
+class ZeroMerkleTreeSnapshot(BaseMerkleTree):
+    """
+    A read-only view of a VersionedZeroMerkleTree as it was when the snapshot was taken.
+
+    It supports the read operations of the tree, such as `root`, `node`, `get_merkle_proof` and `get_leaf`.
+    The snapshot's version is released when the snapshot is garbage collected, or explicitly with `release`.
+    """
+
+    def __init__(self, tree: "VersionedZeroMerkleTree"):
+        self.height = tree.height
+        self.hasher = tree.hasher
+        self.node_store = tree.node_store
+        self.version = tree._retain()
+        self._finalizer = weakref.finalize(self, tree._release, self.version)
+
+    def node(self, level, index):
+        return self.node_store.get_at(level, index, self.version)
+
+    def get_leaf(self, index):
+        return self.get_merkle_proof(self.height, index)
+
+    def release(self):
+        """
+        Release the snapshot's version. The snapshot can't be read afterwards.
+        """
+        self._finalizer()
+
+
+class VersionedZeroMerkleTree(ZeroMerkleTree):
+    """
+    A ZeroMerkleTree that can take cheap, structurally shared snapshots of its state,
+    and serve proofs against any retained snapshot while the tree keeps changing.
+    """
+
+    def __init__(self, height: int, binary: bool = False, hash_backend=None):
+        """
+        Args:
+        - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        """
+        super().__init__(
+            height, node_store=VersionedNodeStore(height, binary, hash_backend)
+        )
+
+    def snapshot(self) -> ZeroMerkleTreeSnapshot:
+        """
+        Take a snapshot of the tree. It doesn't copy any node.
+
+        Returns:
+        - ZeroMerkleTreeSnapshot: A read-only view of the tree's current state.
+        """
+        return ZeroMerkleTreeSnapshot(self)
+
+    def _retain(self) -> int:
+        return self.node_store.retain()
+
+    def _release(self, version: int):
+        self.node_store.release(version)
+
+
+class ConcurrentZeroMerkleTree(VersionedZeroMerkleTree):
+    """
+    A VersionedZeroMerkleTree that many threads can read while a writer updates it.
+
+    Writers are serialized by a lock and write to the current version, which readers never see.
+    Once a write is complete, the version is frozen and published in a single step, so readers always
+    see a root that was committed, along with the nodes of that root.
+    Reads pin the published version for their duration. They only take a lock for the few instructions
+    it takes to pin and unpin a version, never while the writer hashes, so they don't wait for writes.
+    """
+
+    def __init__(self, height: int, binary: bool = False, hash_backend=None):
+        """
+        Args:
+        - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        """
+        super().__init__(height, binary, hash_backend)
+        self._write_lock = threading.Lock()
+        # guards the retained versions, which readers and the writer both change
+        self._version_lock = threading.Lock()
+        self.published = self.node_store.retain()
+
+    def _retain(self) -> int:
+        with self._version_lock:
+            return self.node_store.retain(self.published)
+
+    def _release(self, version: int):
+        # unpinning never prunes, since pruning rewrites histories that the writer may be appending to
+        with self._version_lock:
+            self.node_store.release(version, prune=False)
+
+    def _publish(self):
+        """
+        Publish the current version to readers, and drop the node values only older versions needed.
+
+        Must be called by the writer, with the write lock held.
+        """
+        node_store = self.node_store
+        with self._version_lock:
+            version = node_store.retain()
+            node_store.release(self.published, prune=False)
+            self.published = version
+            retained = list(node_store.retained)
+        node_store.prune(retained)
+
+    def set_leaf(self, index: int, value: str) -> dict:
+        with self._write_lock:
+            delta_merkle_proof = super().set_leaf(index, value)
+            self._publish()
+        return delta_merkle_proof
+
+    def set_leaves(self, leaves: dict, return_proofs: bool = False):
+        with self._write_lock:
+            proofs = super().set_leaves(leaves, return_proofs)
+            self._publish()
+        return proofs
+
+    def load_leaves(self, leaves: dict, processes: int = None):
+        with self._write_lock:
+            super().load_leaves(leaves, processes)
+            self._publish()
+
+    def _load_sorted_leaves(self, sorted_items, batch_size: int):
+        with self._write_lock:
+            super()._load_sorted_leaves(sorted_items, batch_size)
+            self._publish()
+
+    def snapshot(self) -> ZeroMerkleTreeSnapshot:
+        """
+        Take a snapshot of the last published state of the tree.
+
+        Returns:
+        - ZeroMerkleTreeSnapshot: A read-only view of the tree, which stays consistent while the tree is written.
+        """
+        return ZeroMerkleTreeSnapshot(self)
+
+    def _read(self, method: str, *args):
+        snapshot = self.snapshot()
+        try:
+            return getattr(snapshot, method)(*args)
+        finally:
+            snapshot.release()
+
+    def root(self):
+        return self._read("root")
+
+    def node(self, level, index):
+        return self._read("node", level, index)
+
+    def get_merkle_proof(self, level, index):
+        return self._read("get_merkle_proof", level, index)
+
+    def get_merkle_proofs(self, level, indices):
+        return self._read("get_merkle_proofs", level, indices)
+
+    def get_multiproof(self, level, indices):
+        return self._read("get_multiproof", level, indices)
+
+    def get_leaf(self, index):
+        return self._read("get_leaf", index)
+
+    def get_range_proof(self, start, end):
+        return self._read("get_range_proof", start, end)
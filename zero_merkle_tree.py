@@ -1,41 +1,91 @@
-import hashlib
-from merkle_tree import MerkleTree
+import warnings
+from collections import OrderedDict
 
+import parallel
+from hashing import backend_method, get_backend, zero_hashes
+from merkle_tree import BaseMerkleTree
 
-class NodeStore:
-    def __init__(self, height):
-        self.nodes = {}
-        self.height = height
-        self.zero_hashes = self._compute_zero_hashes()
 
-    @staticmethod
-    def hash(left_node, right_node):
-        hasher = hashlib.sha256()
-        concatenated_nodes = f"{left_node}{right_node}".encode("utf-8")
-        hasher.update(concatenated_nodes)
-        return hasher.hexdigest()
+def read_leaf_dump(path, binary=False):
+    """
+    Read the leaves of a file written by `ZeroMerkleTree.dump_leaves`, one at a time.
+
+    Args:
+    - path (str): Path of the dump.
+    - binary (bool): If True, the values are hex encoded 32 byte leaves and are yielded as bytes,
+      otherwise they are yielded as text, which hashes the same as the original hex mode leaves.
+
+    Yields:
+    - (index, value) pairs of the non-empty leaves, in ascending index order.
+    """
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            index, value = line.rstrip("\r\n").split(" ", 1)
+            yield int(index), bytes.fromhex(value) if binary else value
+
+
+def _static_hash(left_node, right_node):
+    warnings.warn(
+        "NodeStore.hash is deprecated, use hashing.get_backend().hash or the hash of a node store",
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    return get_backend().hash(left_node, right_node)
+
 
-    def _compute_zero_hashes(self):
+class NodeStore:
+    __slots__ = ("nodes", "height", "hasher", "zero_hashes")
+
+    def __init__(self, height, binary=False, hash_backend=None):
         """
-        Compute zero hashes for a given height.
+        Args:
+        - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests, otherwise they are hex strings.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
         """
-        current_zero_hash = 0
-        zero_hashes = [current_zero_hash]
-        for _ in range(1, self.height + 1):
-            current_zero_hash = self.hash(current_zero_hash, current_zero_hash)
-            zero_hashes.append(current_zero_hash)
-        return zero_hashes
+        self.nodes = {}
+        self.height = height
+        self.hasher = get_backend(hash_backend, binary)
+        # shared with every tree of the same hash backend and height, see `hashing.zero_hashes`.
+        # The empty leaf is 0 in hex mode and 32 zero bytes in binary mode.
+        self.zero_hashes = zero_hashes(self.hasher, height)
+
+    @backend_method(_static_hash)
+    def hash(self, left_node, right_node):
+        return self.hasher.hash(left_node, right_node)
 
     def set(self, level: int, index: int, value: str):
         """
         Set the value of the node in the data store.
 
+        A node set back to its zero hash is removed, since missing nodes read as zero hashes,
+        so clearing leaves frees the nodes of their paths.
+
         Args:
         - level (int): Level of the node.
         - index (int): Index of the node.
         - value (str): Value to set.
         """
-        self.nodes[(level, index)] = value
+        if value == self.zero_hashes[self.height - level]:
+            self.nodes.pop((level, index), None)
+        else:
+            self.nodes[(level, index)] = value
+
+    def set_many(self, level: int, values: dict):
+        """
+        Set the values of many nodes on the same level of the data store, removing the nodes set to their zero hash.
+
+        Args:
+        - level (int): Level of the nodes.
+        - values (dict): Mapping of node index to the value to set.
+        """
+        zero_hash = self.zero_hashes[self.height - level]
+        nodes = self.nodes
+        for index, value in values.items():
+            if value == zero_hash:
+                nodes.pop((level, index), None)
+            else:
+                nodes[(level, index)] = value
 
     def get(self, level: int, index: int) -> str:
         """
@@ -50,17 +100,187 @@ class NodeStore:
         """
         return self.nodes.get((level, index), self.zero_hashes[self.height - level])
 
+    def level_items(self, level: int):
+        """
+        Get the stored nodes of a level, in ascending index order.
+
+        Args:
+        - level (int): Level of the nodes.
+
+        Returns:
+        - iterable: (index, value) pairs of the stored nodes of the level.
+        """
+        return sorted(
+            (index, value)
+            for (node_level, index), value in self.nodes.items()
+            if node_level == level
+        )
+
+    def commit(self):
+        """
+        Persist the nodes set since the last commit. The in-memory store has nothing to persist.
+        """
+
+
+class _NodeOverlay:
+    """
+    Buffers node writes on top of a node store, so that nodes written many times are stored once.
+    """
+
+    def __init__(self, node_store: NodeStore):
+        self.node_store = node_store
+        self.levels = {}
+
+    def set(self, level: int, index: int, value: str):
+        self.levels.setdefault(level, {})[index] = value
+
+    def get(self, level: int, index: int) -> str:
+        nodes = self.levels.get(level)
+        if nodes is not None and index in nodes:
+            return nodes[index]
+        return self.node_store.get(level, index)
+
+    def flush(self):
+        for level, nodes in self.levels.items():
+            self.node_store.set_many(level, nodes)
+        self.levels = {}
+
+
+class _ProofCache:
+    """
+    A bounded LRU cache of the leaf proofs of a tree, kept up to date as leaves change.
+
+    Entries hold a leaf's value and siblings, but not the root, which is read when a proof is served.
+    Writes only log the indices of the leaves they change, so a write costs the same whatever the size of the cache.
+    A cached proof is brought up to date when it is served: a leaf x changing only changes the sibling at
+    position `(x ^ y).bit_length() - 1` of the proof of another leaf y, where their paths meet, so only the siblings
+    changed since the proof was last served are read again. A proof that fell behind by more than `height` writes
+    is re-read in full instead, which costs the same as a proof that isn't cached, so the log keeps at most
+    the last `2 * height` writes.
+    """
 
-class ZeroMerkleTree(MerkleTree):
-    def __init__(self, height: int):
+    def __init__(self, capacity: int, height: int):
+        self.capacity = capacity
+        self.height = height
+        # index -> [value, siblings, number of writes the entry is up to date with]
+        self.entries = OrderedDict()
+        # the leaf indices of the last writes, where log[i] is write number log_start + i
+        self.log = []
+        self.log_start = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.updates = 0
+
+    def get(self, node_store, index: int):
+        entry = self.entries.get(index)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(index)
+        self.hits += 1
+        self._refresh(node_store, index, entry)
+        return entry
+
+    def _refresh(self, node_store, cached_index: int, entry: list):
+        """
+        Re-read the value and siblings of a cached proof that the writes since it was last served changed.
+        """
+        height = self.height
+        writes = self.log_start + len(self.log)
+        if entry[2] == writes:
+            return
+        siblings = entry[1]
+        if entry[2] < self.log_start or writes - entry[2] > height:
+            entry[0] = node_store.get(height, cached_index)
+            for position in range(height):
+                siblings[position] = node_store.get(
+                    height - position, (cached_index >> position) ^ 1
+                )
+            self.updates += height
+        else:
+            positions = set()
+            for index in self.log[entry[2] - self.log_start :]:
+                if index == cached_index:
+                    entry[0] = node_store.get(height, index)
+                else:
+                    positions.add((index ^ cached_index).bit_length() - 1)
+            for position in positions:
+                siblings[position] = node_store.get(
+                    height - position, (cached_index >> position) ^ 1
+                )
+            self.updates += len(positions)
+        entry[2] = writes
+
+    def put(self, index: int, value, siblings: list):
+        self.entries[index] = [value, siblings, self.log_start + len(self.log)]
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, indices):
+        """
+        Log that the leaves at `indices` were written, so the cached proofs are updated when they are served.
+        """
+        log = self.log
+        log.extend(indices)
+        if len(log) > 2 * self.height:
+            # entries further behind are re-read in full, so older writes are never replayed
+            dropped = len(log) - self.height
+            del log[:dropped]
+            self.log_start += dropped
+
+    def clear(self):
+        self.entries.clear()
+        self.log_start += len(self.log)
+        self.log = []
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "updates": self.updates,
+        }
+
+
+class ZeroMerkleTree(BaseMerkleTree):
+    __slots__ = ("node_store", "proof_cache")
+
+    def __init__(
+        self,
+        height: int,
+        binary: bool = False,
+        hash_backend=None,
+        node_store: NodeStore = None,
+        proof_cache_size: int = 0,
+    ):
         """
         Args:
         - height (int): The height of the tree.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        - node_store (NodeStore): The store of the tree's nodes, e.g. a `SqliteNodeStore`.
+          Defaults to a new in-memory NodeStore. The tree uses the node format and hash backend of the store.
+        - proof_cache_size (int): If set, `get_leaf` keeps the proofs of up to this many recently proved leaves
+          in an LRU cache, which writes keep up to date. See `proof_cache_stats`.
         """
+        if node_store is None:
+            node_store = NodeStore(height, binary, hash_backend)
+        elif node_store.height != height:
+            raise ValueError(
+                f"The node store has height {node_store.height}, expected {height}"
+            )
         self.height = height
-        self.node_store = NodeStore(height)
+        self.node_store = node_store
+        self.hasher = node_store.hasher
+        self.proof_cache = (
+            _ProofCache(proof_cache_size, height) if proof_cache_size else None
+        )
 
-    def set_leaf(self, index: int, value: str) -> None:
+    def set_leaf(self, index: int, value: str) -> dict:
         """
         Set a leaf in the Merkle tree and update corresponding nodes on the path of the leaf.
 
@@ -72,8 +292,234 @@ class ZeroMerkleTree(MerkleTree):
         Returns:
         - Delta merkle proof
         """
-        old_root = self.root()
-        old_value = self.node(self.height, index)
+        self._check_leaf_indices((index,))
+        delta_merkle_proof = self._write_leaf_path(
+            self.node_store, index, self.encode_leaf(value)
+        )
+        self.node_store.commit()
+        if self.proof_cache is not None:
+            self.proof_cache.update((index,))
+        return delta_merkle_proof
+
+    def set_leaves(self, leaves: dict, return_proofs: bool = False):
+        """
+        Set many leaves in the Merkle tree, hashing every affected ancestor exactly once.
+
+        The tree is updated level by level: the dirty nodes of a level are written in one batch,
+        and each of their parents is hashed once, no matter how many updated leaves it covers.
+
+        Args:
+        - leaves (dict): Mapping of leaf index to the value to set for that leaf.
+        - return_proofs (bool): If True, return the delta merkle proofs of the updates in the order of `leaves`,
+          exactly as consecutive `set_leaf` calls would have returned them. Every intermediate root has to be
+          computed for these proofs, so shared ancestors are hashed once per update, but each node is still
+          written to the node store only once.
+
+        Returns:
+        - List of delta merkle proofs if return_proofs is True, otherwise None.
+        """
+        self._check_leaf_indices(leaves)
+        if return_proofs:
+            overlay = _NodeOverlay(self.node_store)
+            proofs = [
+                self._write_leaf_path(overlay, index, self.encode_leaf(value))
+                for index, value in leaves.items()
+            ]
+            overlay.flush()
+            self.node_store.commit()
+            if self.proof_cache is not None:
+                self.proof_cache.update(leaves)
+            return proofs
+
+        dirty = {index: self.encode_leaf(value) for index, value in leaves.items()}
+        for level in range(self.height, 0, -1):
+            self.node_store.set_many(level, dirty)
+            parent_indices = sorted({index // 2 for index in dirty})
+            pairs = []
+            for parent_index in parent_indices:
+                left_index, right_index = 2 * parent_index, 2 * parent_index + 1
+                left = (
+                    dirty[left_index]
+                    if left_index in dirty
+                    else self.node_store.get(level, left_index)
+                )
+                right = (
+                    dirty[right_index]
+                    if right_index in dirty
+                    else self.node_store.get(level, right_index)
+                )
+                pairs.append((left, right))
+            # every dirty parent is hashed exactly once, in a single call for the whole level
+            dirty = dict(zip(parent_indices, self.hasher.hash_many(pairs)))
+        self.node_store.set_many(0, dirty)
+        self.node_store.commit()
+        if self.proof_cache is not None:
+            self.proof_cache.update(leaves)
+
+    def update_leaf(self, index: int, value) -> dict:
+        """
+        Update a leaf, see `set_leaf`. The tree has no layers, so `MerkleTree.update_leaf` doesn't apply.
+        """
+        return self.set_leaf(index, value)
+
+    def update_leaves(self, leaves: dict, return_proofs: bool = False):
+        """
+        Update many leaves, see `set_leaves`.
+        """
+        return self.set_leaves(leaves, return_proofs)
+
+    def load_leaves(self, leaves: dict, processes: int = None):
+        """
+        Load the leaves of an empty tree in bulk.
+
+        The non-empty nodes are computed bottom-up, each hashed exactly once, and written level by level.
+        With more than 1 process, independent subtrees are hashed in parallel, see `parallel.load_sparse_levels`.
+
+        Args:
+        - leaves (dict): Mapping of leaf index to the value to set for that leaf.
+        - processes (int): Number of worker processes. Defaults to hashing in this process.
+        """
+        if self.root() != self.node_store.zero_hashes[self.height]:
+            raise ValueError("Leaves can only be loaded into an empty tree")
+        self._check_leaf_indices(leaves)
+        leaves = {index: self.encode_leaf(value) for index, value in leaves.items()}
+        if processes and processes > 1:
+            levels = parallel.load_sparse_levels(
+                self.hasher, self.node_store.zero_hashes, self.height, leaves, processes
+            )
+        else:
+            levels = parallel.build_sparse_levels(
+                self.hasher, self.node_store.zero_hashes, self.height, leaves
+            )
+        for level, nodes in levels.items():
+            self.node_store.set_many(level, nodes)
+        self.node_store.commit()
+        if self.proof_cache is not None:
+            # every proof of an empty tree changes
+            self.proof_cache.clear()
+
+    @classmethod
+    def from_leaves(
+        cls,
+        height: int,
+        sorted_items,
+        binary: bool = False,
+        hash_backend=None,
+        node_store: NodeStore = None,
+        batch_size: int = 65536,
+    ):
+        """
+        Build a tree from its non-empty leaves in a single pass, e.g. from a dump written by `dump_leaves`.
+
+        The leaves are read in ascending index order, in batches of `batch_size` leaves, and every batch is hashed
+        bottom-up by `parallel.build_sparse_levels`, like `load_leaves`. On every level, the nodes whose parent can
+        still get a child from a later batch are held back until it does, so every non-empty node is hashed exactly once,
+        and only O(height + batch_size) nodes are held in memory. Every batch is written to the node store level by level.
+
+        Args:
+        - height (int): The height of the tree.
+        - sorted_items (iterable): (index, value) pairs of the leaves, in strictly ascending index order.
+        - binary (bool): If True, nodes are raw 32 byte digests and leaves are encoded with `hashing.encode_leaf`.
+        - hash_backend (str or HashBackend): The hash function of the tree, see `hashing.BACKENDS`. Defaults to sha256.
+        - node_store (NodeStore): An empty store for the tree's nodes. Defaults to a new in-memory NodeStore.
+        - batch_size (int): Number of leaves to read before hashing them and writing them to the node store.
+
+        Returns:
+        - ZeroMerkleTree: The tree.
+        """
+        if node_store is None:
+            tree = cls(height, binary, hash_backend)
+        else:
+            tree = cls(height, node_store=node_store)
+        if tree.root() != tree.node_store.zero_hashes[height]:
+            raise ValueError("Leaves can only be loaded into an empty tree")
+        tree._load_sorted_leaves(sorted_items, batch_size)
+        return tree
+
+    def _load_sorted_leaves(self, sorted_items, batch_size: int):
+        node_store = self.node_store
+        height = self.height
+        # held[level] are the nodes of the level whose parent is on the path of the last leaf read so far,
+        # so it can still get a child from the next batches
+        held = [{} for _ in range(height + 1)]
+
+        def load(leaves, last_batch):
+            nodes = leaves
+            for level in range(height, 0, -1):
+                nodes = {**held[level], **nodes}
+                held[level] = {}
+                if nodes and not last_batch:
+                    last_parent = max(nodes) // 2
+                    for index in (2 * last_parent, 2 * last_parent + 1):
+                        if index in nodes:
+                            held[level][index] = nodes.pop(index)
+                node_store.set_many(level, nodes)
+                nodes = parallel.build_sparse_levels(
+                    self.hasher, node_store.zero_hashes, height, nodes, level, level - 1
+                )[level - 1]
+            node_store.set_many(0, nodes)
+            node_store.commit()
+
+        batch = {}
+        last_index = -1
+        for index, value in sorted_items:
+            if not last_index < index < 2**height:
+                raise ValueError(
+                    f"Leaf index {index} is out of order or out of range after index {last_index}"
+                )
+            last_index = index
+            batch[index] = self.encode_leaf(value)
+            if len(batch) >= batch_size:
+                load(batch, False)
+                batch = {}
+        load(batch, True)
+
+    def iter_leaves(self):
+        """
+        Iterate over the non-empty leaves of the tree.
+
+        Yields:
+        - (index, value) pairs of the non-empty leaves, in ascending index order.
+        """
+        zero_leaf = self.node_store.zero_hashes[0]
+        for index, value in self.node_store.level_items(self.height):
+            if value != zero_leaf:
+                yield index, value
+
+    def dump_leaves(self, path) -> int:
+        """
+        Write the non-empty leaves of the tree to a file, one `index value` line per leaf in ascending index order.
+
+        Binary mode leaves are written in hex. Hex mode leaves are written as text, so they must not contain line breaks.
+        Restore the tree with `ZeroMerkleTree.from_leaves(height, read_leaf_dump(path, binary))`.
+
+        Args:
+        - path (str): Path of the dump.
+
+        Returns:
+        - int: Number of leaves written.
+        """
+        count = 0
+        with open(path, "w", encoding="utf-8") as file:
+            for index, value in self.iter_leaves():
+                file.write(f"{index} {value.hex() if self.hasher.binary else value}\n")
+                count += 1
+        return count
+
+    def _write_leaf_path(self, node_store, index: int, value: str) -> dict:
+        """
+        Write a leaf and the nodes on its path to the given node store.
+
+        Args:
+        - node_store: The store to read siblings from and write the path to.
+        - index (int): The index of the leaf to set.
+        - value (str): The value to set for the leaf.
+
+        Returns:
+        - Delta merkle proof
+        """
+        old_root = node_store.get(0, 0)
+        old_value = node_store.get(self.height, index)
         siblings = []
 
         # Start traversing the leaf's Merkle path at the leaf node.
@@ -83,24 +529,24 @@ class ZeroMerkleTree(MerkleTree):
         # Don't set the root (level = 0) in the loop, as it has no sibling.
         for level in range(self.height, 0, -1):
             # Set the current node in the tree.
-            self.node_store.set(level, current_index, current_value)
+            node_store.set(level, current_index, current_value)
 
             if current_index % 2 == 0:
                 # If the current index is even, then it has a sibling on the right (same level, index = current_index+1).
-                right_sibling = self.node_store.get(level, current_index + 1)
-                current_value = self.hash(current_value, right_sibling)
+                right_sibling = node_store.get(level, current_index + 1)
+                current_value = self.hasher.hash(current_value, right_sibling)
                 siblings.append(right_sibling)
             else:
                 # If the current index is odd, then it has a sibling on the left (same level, index = current_index-1).
-                left_sibling = self.node_store.get(level, current_index - 1)
-                current_value = self.hash(left_sibling, current_value)
+                left_sibling = node_store.get(level, current_index - 1)
+                current_value = self.hasher.hash(left_sibling, current_value)
                 siblings.append(left_sibling)
 
             # Set current index to the index of the parent node.
             current_index = current_index // 2
 
         # Set the root node (level = 0, index = 0) to current value.
-        self.node_store.set(0, 0, current_value)
+        node_store.set(0, 0, current_value)
         return {
             "index": index,
             "siblings": siblings,
@@ -114,4 +560,32 @@ class ZeroMerkleTree(MerkleTree):
         return self.node_store.get(level, index)
 
     def get_leaf(self, index):
-        return self.get_merkle_proof(self.height, index)
+        if self.proof_cache is None:
+            return self.get_merkle_proof(self.height, index)
+        entry = self.proof_cache.get(self.node_store, index)
+        if entry is None:
+            proof = self.get_merkle_proof(self.height, index)
+            self.proof_cache.put(index, proof["value"], list(proof["siblings"]))
+            return proof
+        return {
+            "root": self.root(),
+            "siblings": list(entry[1]),
+            "index": index,
+            "value": entry[0],
+        }
+
+    def proof_cache_stats(self) -> dict:
+        """
+        Get the statistics of the proof cache, to size it for a workload.
+
+        Writes only log the leaves they change, and a cached proof re-reads the siblings changed since it was
+        last served when it is served again, or all its siblings if more than `height` writes happened since.
+        So writes cost the same whatever the size of the cache, and a hit costs at most as much as a miss.
+
+        Returns:
+        - dict: The number of cached proofs, the capacity, the cache hits and misses, the proofs evicted
+          to make room for new ones, and the number of siblings re-read to serve hits. None if there is no cache.
+        """
+        if self.proof_cache is None:
+            return None
+        return self.proof_cache.stats()